@@ -6,9 +6,11 @@ This module provides the CLI interface for the coverage utility script.
 import sys
 import argparse
 
-from .extraction import extract_coverage, compare_coverage, run_coverage, set_verbose
+from .extraction import extract_coverage, compare_coverage, run_coverage, set_verbose, set_timeouts
 from .github_api import generate_comment, post_comment, set_github_output
 from .workflow import process_coverage_workflow
+from .targets import load_targets, compare_targets
+from .benchmark import benchmark_command, DEFAULT_SIZES_MB, REGRESSION_THRESHOLD
 from .util import log
 
 def setup_verbose_mode(args):
@@ -22,11 +24,37 @@ def setup_verbose_mode(args):
         set_verbose(True)
         log("Verbose mode enabled")
 
+def setup_timeouts(args):
+    """
+    Apply the coverage run timeouts given on the command line.
+    
+    Args:
+        args: Parsed command line arguments
+    """
+    set_timeouts(getattr(args, 'timeout', None), getattr(args, 'idle_timeout', None))
+
+def parse_target_coverage(value):
+    """Parse a TARGET=PCT command line value."""
+    name, separator, pct = value.partition('=')
+    try:
+        if not separator:
+            raise ValueError
+        return name, float(pct)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TARGET=PCT, got {value!r}")
+
 def main():
     # Create parent parser with common arguments
     parent_parser = argparse.ArgumentParser(add_help=False)
     parent_parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
 
+    # Timeouts of the commands that run test suites
+    timeout_parser = argparse.ArgumentParser(add_help=False)
+    timeout_parser.add_argument('--timeout', type=float,
+                                help='Stop a coverage run after this many seconds (default: 2700, 0: never)')
+    timeout_parser.add_argument('--idle-timeout', type=float,
+                                help='Stop a coverage run that prints nothing for this many seconds (default: 600, 0: never)')
+
     # Create main parser that inherits common arguments
     parser = argparse.ArgumentParser(description='Coverage utility script for GitHub Actions workflows', parents=[parent_parser])
     subparsers = parser.add_subparsers(dest='command', help='Command to run')
@@ -47,14 +75,11 @@ def main():
     
     # generate-comment command - used by process-workflow
     comment_parser = subparsers.add_parser('generate-comment', help='Generate PR comment with coverage comparison', parents=[parent_parser])
-    comment_parser.add_argument('base_ext_cov', help='Base branch extension coverage')
-    comment_parser.add_argument('pr_ext_cov', help='PR branch extension coverage')
-    comment_parser.add_argument('ext_decreased', help='Whether extension coverage decreased (true/false)')
-    comment_parser.add_argument('ext_diff', help='Extension coverage difference')
-    comment_parser.add_argument('base_web_cov', help='Base branch webview coverage')
-    comment_parser.add_argument('pr_web_cov', help='PR branch webview coverage')
-    comment_parser.add_argument('web_decreased', help='Whether webview coverage decreased (true/false)')
-    comment_parser.add_argument('web_diff', help='Webview coverage difference')
+    comment_parser.add_argument('--base', action='append', default=[], type=parse_target_coverage, metavar='TARGET=PCT',
+                                help='Base branch coverage of a target (repeat for each target)')
+    comment_parser.add_argument('--pr', action='append', default=[], type=parse_target_coverage, metavar='TARGET=PCT',
+                                help='PR branch coverage of a target (repeat for each target)')
+    comment_parser.add_argument('--targets-config', help='Coverage targets config (default: .github/coverage-targets.json)')
     
     # post-comment command - used by process-workflow
     post_parser = subparsers.add_parser('post-comment', help='Post a comment to a GitHub PR', parents=[parent_parser])
@@ -64,7 +89,7 @@ def main():
     post_parser.add_argument('--token', help='GitHub token')
     
     # run-coverage command - used by process-workflow
-    run_parser = subparsers.add_parser('run-coverage', help='Run a coverage command and extract the coverage percentage', parents=[parent_parser])
+    run_parser = subparsers.add_parser('run-coverage', help='Run a coverage command and extract the coverage percentage', parents=[parent_parser, timeout_parser])
     run_parser.add_argument('coverage_cmd', help='Command to run')
     run_parser.add_argument('output_file', help='File to save the output to')
     run_parser.add_argument('--type', choices=['extension', 'webview'], default='extension',
@@ -72,21 +97,67 @@ def main():
     run_parser.add_argument('--github-output', action='store_true', help='Output in GitHub Actions format')
     
     # process-workflow command - used directly in workflow
-    workflow_parser = subparsers.add_parser('process-workflow', help='Process the entire coverage workflow', parents=[parent_parser])
+    workflow_parser = subparsers.add_parser('process-workflow', help='Process the entire coverage workflow', parents=[parent_parser, timeout_parser])
     workflow_parser.add_argument('--base-branch', required=True, help='Base branch name')
     workflow_parser.add_argument('--pr-number', help='PR number')
     workflow_parser.add_argument('--repo', help='Repository in the format "owner/repo"')
     workflow_parser.add_argument('--token', help='GitHub token')
+    workflow_parser.add_argument('--targets-config', help='Coverage targets config (default: .github/coverage-targets.json)')
+    workflow_parser.add_argument('--sequential', action='store_true',
+                                 help='Run the coverage targets one after the other')
+    workflow_parser.add_argument('--max-cpus', type=float,
+                                 help='CPUs the concurrently running targets and shards may claim (default: all)')
+    workflow_parser.add_argument('--max-memory-mb', type=int,
+                                 help='Memory the concurrently running targets and shards may claim (default: 90%% of what is free)')
+    workflow_parser.add_argument('--cache-dir', help='Directory for cached base branch coverage (default: .coverage-cache)')
+    workflow_parser.add_argument('--no-cache', action='store_true', help='Always run base branch coverage')
+    workflow_parser.add_argument('--target-cache', action='store_true',
+                                 help='Cache each target\'s result from a green run by a fingerprint of its files, and reuse it for base targets whose files match')
+    workflow_parser.add_argument('--pr-tests-passed', action='store_true',
+                                 help='Every PR test suite passed, so --target-cache may store the PR results')
+    workflow_parser.add_argument('--worktree', action='store_true',
+                                 help='Run base branch coverage in a separate git worktree instead of checking it out in place')
+    workflow_parser.add_argument('--worktree-dir', help='Directory for the base branch worktree')
+    workflow_parser.add_argument('--shards', type=int, default=1,
+                                 help='Split each suite into this many concurrently running shards (0: one per core)')
+    workflow_parser.add_argument('--test-impact', action='store_true',
+                                 help='Rerun only the base tests affected since the last mapped base commit (needs the history)')
+    workflow_parser.add_argument('--impact-shards', type=int, default=8,
+                                 help='Shards a full run is split into to map sources to tests; more shards give a finer map')
+    workflow_parser.add_argument('--no-patch-coverage', action='store_true',
+                                 help='Skip changed-lines coverage (and skipping the base run for coverage-neutral PRs)')
+    workflow_parser.add_argument('--history-db', help='SQLite coverage history (default: .coverage-cache/coverage_history.db)')
+    workflow_parser.add_argument('--no-history', action='store_true', help='Do not record or read the coverage history')
+    workflow_parser.add_argument('--trend-commits', type=int, default=10,
+                                 help='Base commits shown in the comment\'s coverage trend')
+    workflow_parser.add_argument('--timing-file', help='Where to write the JSON phase timeline (default: coverage_timing.json)')
+    workflow_parser.add_argument('--comment-timeout', type=float,
+                                 help='Seconds to wait for the PR comment to post after the outputs are written (default: 120)')
+    workflow_parser.add_argument('--timing-in-comment', action='store_true', help='Include the phase timeline in the PR comment')
     
     # set-github-output command - used by process-workflow
     output_parser = subparsers.add_parser('set-github-output', help='Set GitHub Actions output variable', parents=[parent_parser])
     output_parser.add_argument('name', help='Output variable name')
     output_parser.add_argument('value', help='Output variable value')
     
+    # benchmark command - run by hand to measure this script's own overhead
+    benchmark_parser = subparsers.add_parser('benchmark', help='Measure parsing and workflow overhead on synthetic reports', parents=[parent_parser])
+    benchmark_parser.add_argument('--sizes', help=f"Comma-separated input sizes in MB (default: {','.join(map(str, DEFAULT_SIZES_MB))})")
+    benchmark_parser.add_argument('--cases', help='Comma-separated cases or case families to run (default: all)')
+    benchmark_parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case and size; the best counts')
+    benchmark_parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory run')
+    benchmark_parser.add_argument('--work-dir', help='Where to generate inputs (needs room for the largest size)')
+    benchmark_parser.add_argument('--output', help='Where to write the JSON results (default: coverage_benchmark.json)')
+    benchmark_parser.add_argument('--baseline', help='Earlier results to compare against')
+    benchmark_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                  help='Slowdown (fraction) against the baseline counted as a regression')
+    benchmark_parser.add_argument('--fail-on-regression', action='store_true', help='Exit with 1 if a case regressed')
+    
     args = parser.parse_args()
     
     # Set up verbose mode
     setup_verbose_mode(args)
+    setup_timeouts(args)
     
     if args.command == 'extract-coverage':
         log(f"Extracting coverage from file: {args.file_path} (type: {args.type})")
@@ -111,10 +182,8 @@ def main():
         
     elif args.command == 'generate-comment':
         log("Generating coverage comparison comment")
-        comment = generate_comment(
-            args.base_ext_cov, args.pr_ext_cov, args.ext_decreased, args.ext_diff,
-            args.base_web_cov, args.pr_web_cov, args.web_decreased, args.web_diff
-        )
+        results = compare_targets(load_targets(args.targets_config), dict(args.base), dict(args.pr))
+        comment = generate_comment(results)
         # Output the comment to stdout
         log(comment)
         
@@ -141,6 +210,9 @@ def main():
             log(f"Repository: {args.repo}")
         process_coverage_workflow(args)
         
+    elif args.command == 'benchmark':
+        sys.exit(benchmark_command(args))
+        
     elif args.command == 'set-github-output':
         log(f"Setting GitHub output: {args.name}={args.value}")
         set_github_output(args.name, args.value)
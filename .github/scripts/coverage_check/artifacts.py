@@ -0,0 +1,253 @@
+"""
+Artifact ingestion module.
+This module finds the PR test job's artifacts of every coverage target by glob, parses
+them on a thread pool and aggregates them per target. Every artifact is validated before
+anything fails, so all missing or corrupt artifacts are reported in one run.
+"""
+
+import os
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .extraction import scan_coverage_file
+from .reports import CoverageReport, load_structured_report
+from .shards import CoverageMerger, write_coverage_summary
+from .util import log
+
+# Threads parsing artifacts at once; each spends most of its time reading its file
+ARTIFACT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Errors a missing, truncated or malformed artifact raises while it is parsed
+PARSE_ERRORS = (OSError, ValueError, KeyError, TypeError, AttributeError)
+
+class ArtifactProblem:
+    """A missing or unusable artifact of one target."""
+
+    def __init__(self, target: str, path: str, message: str):
+        self.target = target
+        self.path = path
+        self.message = message
+
+    def __str__(self):
+        return f"{self.target}: {self.path}: {self.message}"
+
+class TargetArtifacts:
+    """Artifacts found for one target: console outputs and structured reports by report name."""
+
+    def __init__(self, target):
+        self.target = target
+        self.outputs: List[str] = []
+        self.reports: Dict[str, List[str]] = {}
+
+    @property
+    def report_name(self) -> Optional[str]:
+        """
+        Report name the target's coverage is read from: the preferred one (per the target's
+        report_format) with artifacts, unless there are several of it and coverage-final.json,
+        which merges per statement, is there as well.
+        """
+        names = [name for name in self.target.report_names() if self.reports.get(name)]
+        if not names:
+            return None
+        if len(self.reports[names[0]]) > 1 and 'coverage-final.json' in names:
+            return 'coverage-final.json'
+        return names[0]
+
+def find_artifacts(pattern: str, root: Optional[str] = None) -> List[str]:
+    """Files matching a repository-relative glob (** spans directories), sorted."""
+    matches = glob.glob(os.path.join(root or '.', pattern), recursive=True)
+    return sorted(os.path.normpath(path) for path in matches if os.path.isfile(path))
+
+def discover_artifacts(target, root: Optional[str] = None) -> Tuple[TargetArtifacts, List[ArtifactProblem]]:
+    """
+    Find a target's artifacts.
+
+    Args:
+        target: CoverageTarget; artifact globs its console outputs, artifact_reports its structured reports
+        root: Directory the artifacts were downloaded to (default: current directory)
+
+    Returns:
+        Tuple of (TargetArtifacts, problems); a target without any console output is a problem,
+        structured reports are optional
+    """
+    found = TargetArtifacts(target)
+    problems = []
+    found.outputs = find_artifacts(target.artifact, root)
+    if not found.outputs:
+        problems.append(ArtifactProblem(target.name, target.artifact, "no file matches"))
+    names = target.report_names()
+    for pattern in target.artifact_reports:
+        for path in find_artifacts(pattern, root):
+            name = os.path.basename(path)
+            if name in names and path not in found.reports.get(name, []):
+                found.reports.setdefault(name, []).append(path)
+    return found, problems
+
+def parse_artifact(path: str, kind: str, coverage_type: str):
+    """
+    Parse one artifact.
+
+    Args:
+        path: Artifact file
+        kind: Report name (see REPORT_FILES), or "output" for console output
+        coverage_type: Parser of the console output (extension or webview)
+
+    Returns:
+        CoverageMerger holding a coverage-final.json, CoverageReport of another report,
+        or the line coverage percentage of console output
+
+    Raises:
+        ValueError: If the artifact is empty or holds no coverage
+        OSError: If it can't be read
+    """
+    if os.path.getsize(path) == 0:
+        raise ValueError("empty file")
+    if kind == 'output':
+        pct = scan_coverage_file(path, coverage_type).coverage_pct
+        if pct is None:
+            raise ValueError("no coverage summary in the output")
+        return pct
+    if kind == 'coverage-final.json':
+        merger = CoverageMerger()
+        merger.add_report(path)
+        if not merger.files:
+            raise ValueError("report covers no files")
+        return merger
+    report = load_structured_report(path)
+    if report.lines_pct() is None:
+        raise ValueError("report has no lines to cover")
+    return report
+
+def combine_reports(target_name: str, paths: List[str], parsed: List[CoverageReport]) -> Tuple[Optional[CoverageReport], List[ArtifactProblem]]:
+    """
+    Combine summary or lcov reports of one target, which only add up when they cover different files.
+
+    Returns:
+        Tuple of (combined report or None, problems)
+    """
+    combined = CoverageReport(f"{len(paths)} reports")
+    owners: Dict[str, str] = {}
+    problems = []
+    for path, report in zip(paths, parsed):
+        overlap = sorted(set(report.files) & set(owners))
+        if overlap:
+            problems.append(ArtifactProblem(
+                target_name, path,
+                f"covers {overlap[0]} like {owners[overlap[0]]}; overlapping reports only merge as coverage-final.json"
+            ))
+            continue
+        for file_path, counts in report.files.items():
+            owners[file_path] = path
+            combined.add_file(file_path, counts)
+    return (None if problems else combined), problems
+
+def aggregate_target(found: TargetArtifacts, results: Dict[str, object],
+                     root: Optional[str] = None) -> Tuple[Optional[float], List[ArtifactProblem]]:
+    """
+    Line coverage of a target from its parsed artifacts.
+
+    The preferred structured report wins; several coverage-final.json reports (one per
+    shard) are merged and written to the target's coverage directory, so whatever reads
+    the reports afterwards sees the merged coverage. Console output is only the source
+    when there is no structured report, and then there must be exactly one.
+
+    Args:
+        found: The target's artifacts
+        results: Parse result of every artifact that parsed, by path
+        root: Directory the artifacts were downloaded to (default: current directory)
+
+    Returns:
+        Tuple of (percentage or None, problems)
+    """
+    target = found.target
+    name = found.report_name
+    if name is None:
+        if len(found.outputs) > 1:
+            return None, [ArtifactProblem(target.name, target.artifact,
+                                          f"{len(found.outputs)} console outputs and no structured report to merge them")]
+        return (results[found.outputs[0]] if found.outputs else None), []
+
+    paths = found.reports[name]
+    parsed = [results[path] for path in paths]
+    if name == 'coverage-final.json':
+        merger = parsed[0]
+        if len(parsed) > 1:
+            merger = CoverageMerger()
+            for shard in parsed:
+                merger.merge(shard)
+            coverage_dir = target.coverage_dir(root)
+            os.makedirs(coverage_dir, exist_ok=True)
+            merger.write_coverage_final(os.path.join(coverage_dir, 'coverage-final.json'))
+            write_coverage_summary(merger.report(), os.path.join(coverage_dir, 'coverage-summary.json'))
+            log(f"Merged {len(paths)} {target.name} coverage-final.json artifacts into {coverage_dir}")
+        report = merger.report()
+    elif len(parsed) > 1:
+        report, problems = combine_reports(target.name, paths, parsed)
+        if report is None:
+            return None, problems
+    else:
+        report = parsed[0]
+    if report.lines_pct() is None:
+        return None, [ArtifactProblem(target.name, ', '.join(paths), "reports have no lines to cover")]
+    log(f"{target.name} coverage from {len(paths)} {name} artifact(s): {report.lines_pct()}% lines "
+        f"across {len(report.files)} files")
+    return report.lines_pct(), []
+
+def ingest_artifacts(targets, root: Optional[str] = None,
+                     workers: int = ARTIFACT_WORKERS) -> Tuple[Dict[str, float], List[ArtifactProblem]]:
+    """
+    Find, validate and aggregate the PR test job's artifacts of every target.
+
+    Every structured report found is parsed, on a thread pool, whether or not it ends
+    up the target's source; console output is parsed when it is the source, and only
+    checked to be non-empty otherwise. Nothing stops at the first problem.
+
+    Args:
+        targets: Coverage targets
+        root: Directory the artifacts were downloaded to (default: current directory)
+        workers: Threads parsing artifacts at once
+
+    Returns:
+        Tuple of (line coverage by target name, for the targets whose artifacts are all
+        usable; every problem found, in target order)
+    """
+    found = {}
+    problems: Dict[str, List[ArtifactProblem]] = {}
+    jobs = []
+    for target in targets:
+        found[target.name], problems[target.name] = discover_artifacts(target, root)
+        artifacts = found[target.name]
+        for name, paths in artifacts.reports.items():
+            jobs.extend((target, path, name) for path in paths)
+        output_kind = 'output' if artifacts.report_name is None else 'output-check'
+        jobs.extend((target, path, output_kind) for path in artifacts.outputs)
+
+    def parse(job):
+        target, path, kind = job
+        if kind == 'output-check':
+            if os.path.getsize(path) == 0:
+                raise ValueError("empty file")
+            return None
+        return parse_artifact(path, kind, target.coverage_type())
+
+    results: Dict[str, Dict[str, object]] = {target.name: {} for target in targets}
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+            futures = [(job, executor.submit(parse, job)) for job in jobs]
+            for (target, path, kind), future in futures:
+                try:
+                    results[target.name][path] = future.result()
+                except PARSE_ERRORS as e:
+                    problems[target.name].append(ArtifactProblem(target.name, path, str(e) or type(e).__name__))
+    log(f"Parsed {len(jobs)} artifacts of {len(targets)} targets")
+
+    coverage = {}
+    for target in targets:
+        if problems[target.name]:
+            continue
+        pct, aggregate_problems = aggregate_target(found[target.name], results[target.name], root)
+        problems[target.name].extend(aggregate_problems)
+        if pct is not None and not aggregate_problems:
+            coverage[target.name] = pct
+    return coverage, [problem for target in targets for problem in problems[target.name]]
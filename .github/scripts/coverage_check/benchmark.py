@@ -0,0 +1,376 @@
+"""
+Benchmark module.
+This module measures coverage_check's own overhead on synthetic inputs of increasing size:
+test output with the extension and webview summaries after megabytes of log noise, and
+istanbul coverage-final.json reports. It records throughput and peak memory per case in a
+JSON file, and compares a run against an earlier one so parser changes can be judged.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from . import extraction
+from .extraction import extract_coverage, print_debug_output, EXTENSION_SUMMARY_HEADER, WEBVIEW_REPORT_HEADER
+from .reports import parse_coverage_final
+from .shards import merge_shard_reports
+from .targets import load_targets
+from .util import log, run_command
+
+# Where results are written unless --output says otherwise
+DEFAULT_BENCHMARK_FILE = 'coverage_benchmark.json'
+
+# Input sizes (MB) measured by default; pass larger ones (e.g. 1024,4096) for GB-scale logs
+DEFAULT_SIZES_MB = [1, 16, 128]
+
+# Slowdown against the baseline (fraction of its time) reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+# Percentages the synthetic reports carry, checked after every run so a parser that gets faster by being wrong shows up
+EXTENSION_LINES_PCT = 46.25
+WEBVIEW_LINES_PCT = 62.75
+
+NOISE_LINES = [
+    "  ✔ should handle the request without errors (12ms)\n",
+    "[Extension Host] [info] Loaded 128 MCP servers from settings in 3ms\n",
+    "    at Context.<anonymous> (out/src/core/task/index.test.js:214:23)\n",
+    "    at process.processImmediate (node:internal/timers:483:21)\n",
+    "stdout | src/components/chat/ChatView.spec.tsx > ChatView > renders the task header\n",
+    "Warning: An update to ChatRow inside a test was not wrapped in act(...)\n",
+    " ✓ src/utils/format.test.ts (14 tests) 9ms\n",
+    "[main 2025-01-01T00:00:00.000Z] update#setState idle\n",
+]
+
+def write_noise(f, size_bytes: int) -> None:
+    """Write log noise lines until about size_bytes have been written."""
+    block = ''.join(NOISE_LINES) * 256
+    written = 0
+    while written < size_bytes:
+        chunk = block[:size_bytes - written] if size_bytes - written < len(block) else block
+        f.write(chunk)
+        written += len(chunk.encode('utf-8'))
+    f.write('\n')
+
+def write_extension_log(path: str, size_bytes: int) -> None:
+    """Extension test output: noise, then the istanbul text-summary report."""
+    with open(path, 'w', encoding='utf-8') as f:
+        write_noise(f, size_bytes)
+        f.write(f"\n{EXTENSION_SUMMARY_HEADER}\n"
+                "Statements   : 45.10% ( 4510/10000 )\n"
+                "Branches     : 30.00% ( 300/1000 )\n"
+                "Functions    : 40.00% ( 400/1000 )\n"
+                f"Lines        : {EXTENSION_LINES_PCT:.2f}% ( 4625/10000 )\n"
+                f"{'=' * len(EXTENSION_SUMMARY_HEADER)}\n")
+
+def write_webview_log(path: str, size_bytes: int, rows: int = 500) -> None:
+    """Webview test output: noise, then the vitest v8 text report with one row per file."""
+    separator = "-------------------|---------|----------|---------|---------|-------------------\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        write_noise(f, size_bytes)
+        f.write(f"\n {WEBVIEW_REPORT_HEADER}\n{separator}"
+                "File               | % Stmts | % Branch | % Funcs | % Lines | Uncovered Line #s \n"
+                f"{separator}"
+                f"All files          |   61.50 |    70.25 |   55.00 |   {WEBVIEW_LINES_PCT:.2f} |                   \n")
+        for row in range(rows):
+            f.write(f" src/file{row}.tsx   |   50.00 |    50.00 |   50.00 |   50.00 | 10-20             \n")
+        f.write(separator)
+
+def istanbul_entry(path: str, statements: int) -> Dict:
+    """coverage-final.json entry with one statement and one function per line, every other line hit."""
+    locations = {str(i): {'start': {'line': i + 1, 'column': 0}, 'end': {'line': i + 1, 'column': 40}}
+                 for i in range(statements)}
+    return {
+        'path': path,
+        'statementMap': locations,
+        's': {str(i): i % 2 for i in range(statements)},
+        'fnMap': {str(i): {'name': f'fn{i}', 'decl': location, 'loc': location, 'line': i + 1}
+                  for i, location in enumerate(locations.values())},
+        'f': {str(i): i % 2 for i in range(statements)},
+        'branchMap': {},
+        'b': {},
+    }
+
+def write_coverage_final(path: str, size_bytes: int, statements_per_file: int = 200) -> int:
+    """
+    Write an istanbul coverage-final.json of about size_bytes.
+
+    Returns:
+        Number of source files in the report
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    files = 0
+    written = 0
+    with open(path, 'w') as f:
+        f.write('{')
+        while written < size_bytes or not files:
+            source = f"/repo/src/module{files}/index.ts"
+            entry = f"{',' if files else ''}\n{json.dumps(source)}: " + \
+                json.dumps(istanbul_entry(source, statements_per_file), separators=(',', ':'))
+            f.write(entry)
+            written += len(entry)
+            files += 1
+        f.write('\n}\n')
+    return files
+
+@contextmanager
+def quiet():
+    """Discard what the measured code prints, so the terminal isn't part of the measurement."""
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+class BenchmarkCase:
+    """
+    One measured operation.
+
+    setup(work_dir, size_bytes) writes the inputs and returns the argument run takes;
+    run returns the value check verifies.
+    """
+
+    def __init__(self, name: str, setup: Callable, run: Callable, check: Optional[Callable] = None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.check = check
+
+def setup_extension_log(work_dir, size_bytes):
+    path = os.path.join(work_dir, 'extension_coverage.txt')
+    write_extension_log(path, size_bytes)
+    return path
+
+def setup_webview_log(work_dir, size_bytes):
+    path = os.path.join(work_dir, 'webview_coverage.txt')
+    write_webview_log(path, size_bytes)
+    return path
+
+def setup_coverage_final(work_dir, size_bytes):
+    path = os.path.join(work_dir, 'coverage', 'coverage-final.json')
+    write_coverage_final(path, size_bytes)
+    return path
+
+def setup_shard_reports(work_dir, size_bytes):
+    paths = []
+    for shard in range(2):
+        path = os.path.join(work_dir, f'shard-{shard + 1}', 'coverage-final.json')
+        write_coverage_final(path, size_bytes // 2)
+        paths.append(path)
+    return paths, os.path.join(work_dir, 'merged')
+
+def setup_pr_artifacts(work_dir, size_bytes):
+    """Each target's artifact laid out under work_dir as the PR's test job leaves it."""
+    targets = load_targets()
+    for target in targets:
+        artifact = os.path.join(work_dir, target.artifact)
+        os.makedirs(os.path.dirname(artifact), exist_ok=True)
+        if target.coverage_type() == 'extension':
+            write_extension_log(artifact, size_bytes // len(targets))
+        else:
+            write_webview_log(artifact, size_bytes // len(targets))
+    return work_dir, targets
+
+def read_text(path):
+    with open(path, 'r', errors='replace') as f:
+        return f.read()
+
+def debug_output(coverage_type):
+    """print_debug_output on a log already read into memory, as verbose mode runs it."""
+    def run(content):
+        previous = extraction.verbose
+        extraction.set_verbose(True)
+        try:
+            print_debug_output(content, coverage_type)
+        finally:
+            extraction.set_verbose(previous)
+    return run
+
+def run_pr_artifacts(args):
+    # Imported here: workflow imports everything else, the benchmark only needs it for this case
+    from .workflow import extract_pr_coverage_from_artifacts
+    work_dir, targets = args
+    previous = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        return extract_pr_coverage_from_artifacts(targets)
+    finally:
+        os.chdir(previous)
+
+CASES = [
+    BenchmarkCase('extract_coverage[extension]', setup_extension_log,
+                  lambda path: extract_coverage(path, 'extension'), lambda pct: pct == EXTENSION_LINES_PCT),
+    BenchmarkCase('extract_coverage[webview]', setup_webview_log,
+                  lambda path: extract_coverage(path, 'webview'), lambda pct: pct == WEBVIEW_LINES_PCT),
+    BenchmarkCase('print_debug_output[extension]', lambda work_dir, size: read_text(setup_extension_log(work_dir, size)),
+                  debug_output('extension')),
+    BenchmarkCase('print_debug_output[webview]', lambda work_dir, size: read_text(setup_webview_log(work_dir, size)),
+                  debug_output('webview')),
+    BenchmarkCase('parse_coverage_final', setup_coverage_final,
+                  lambda path: parse_coverage_final(path).lines_pct(), lambda pct: pct == 50.0),
+    BenchmarkCase('merge_shard_reports', setup_shard_reports,
+                  lambda args: merge_shard_reports(*args).lines_pct(), lambda pct: pct == 50.0),
+    BenchmarkCase('extract_pr_coverage_from_artifacts', setup_pr_artifacts, run_pr_artifacts,
+                  lambda coverage: coverage == {'extension': EXTENSION_LINES_PCT, 'webview': WEBVIEW_LINES_PCT}),
+]
+
+def directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(parent, name)) for parent, _, names in os.walk(directory) for name in names)
+
+def measure(case: BenchmarkCase, size_bytes: int, work_dir: str, repeat: int = 3, memory: bool = True) -> Dict:
+    """
+    Measure one case at one input size.
+
+    The time is the best of repeat runs; peak memory is what Python allocated during
+    one further run under tracemalloc (which slows it down, so it isn't timed).
+
+    Returns:
+        Result dict with case, size_mb, input_bytes, seconds, mb_per_s and peak_mb
+    """
+    case_dir = tempfile.mkdtemp(prefix='case-', dir=work_dir)
+    try:
+        argument = case.setup(case_dir, size_bytes)
+        size = directory_size(case_dir)
+        times = []
+        value = None
+        for _ in range(max(1, repeat)):
+            # Every run reads its input again, as the first call of a workflow run does
+            extraction.forget_scans()
+            with quiet():
+                started = time.perf_counter()
+                value = case.run(argument)
+                times.append(time.perf_counter() - started)
+        if case.check and not case.check(value):
+            raise AssertionError(f"{case.name} returned {value!r} on the synthetic input")
+        peak_mb = None
+        if memory:
+            extraction.forget_scans()
+            tracemalloc.start()
+            try:
+                with quiet():
+                    case.run(argument)
+                peak_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            finally:
+                tracemalloc.stop()
+        seconds = min(times)
+        return {
+            'case': case.name,
+            'size_mb': round(size_bytes / (1024 * 1024), 3),
+            'input_bytes': size,
+            'seconds': round(seconds, 4),
+            'mb_per_s': round(size / (1024 * 1024) / seconds, 1) if seconds else None,
+            'peak_mb': peak_mb,
+        }
+    finally:
+        shutil.rmtree(case_dir, ignore_errors=True)
+
+def run_benchmarks(sizes_mb: List[float], case_names: Optional[List[str]] = None, repeat: int = 3,
+                   memory: bool = True, work_dir: Optional[str] = None) -> Dict:
+    """
+    Measure every selected case at every size.
+
+    Args:
+        sizes_mb: Input sizes in MB
+        case_names: Cases to run (default: all); a name matches a case or a case family, e.g. extract_coverage
+        repeat: Timed runs per case and size
+        memory: Also measure peak memory
+        work_dir: Where inputs are generated (default: a temporary directory); needs room for the largest size
+
+    Returns:
+        Benchmark record: environment and one result per case and size
+
+    Raises:
+        ValueError: If a case name matches nothing
+    """
+    cases = CASES
+    if case_names:
+        cases = [case for case in CASES if case.name in case_names or case.name.split('[')[0] in case_names]
+        unknown = set(case_names) - {case.name for case in cases} - {case.name.split('[')[0] for case in cases}
+        if unknown:
+            raise ValueError(f"Unknown benchmark cases: {', '.join(sorted(unknown))}")
+    returncode, commit, _ = run_command(['git', 'rev-parse', 'HEAD'])
+    record = {
+        'recorded_at': datetime.now().isoformat(),
+        'commit': commit.strip() if returncode == 0 else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [],
+    }
+    root = tempfile.mkdtemp(prefix='coverage-benchmark-', dir=work_dir)
+    try:
+        for size_mb in sizes_mb:
+            for case in cases:
+                result = measure(case, int(size_mb * 1024 * 1024), root, repeat, memory)
+                log(f"{case.name} @ {size_mb} MB: {result['seconds']}s, {result['mb_per_s']} MB/s, "
+                    f"peak {result['peak_mb'] if result['peak_mb'] is not None else '-'} MB")
+                record['results'].append(result)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return record
+
+def compare_benchmarks(current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Compare a benchmark record against an earlier one, case by case and size by size.
+
+    Returns:
+        Dicts with case, size_mb, both times and peaks, the time ratio and whether it regressed
+    """
+    earlier = {(result['case'], result['size_mb']): result for result in baseline.get('results', [])}
+    rows = []
+    for result in current['results']:
+        before = earlier.get((result['case'], result['size_mb']))
+        if not before or not before['seconds']:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        rows.append({
+            'case': result['case'],
+            'size_mb': result['size_mb'],
+            'baseline_seconds': before['seconds'],
+            'seconds': result['seconds'],
+            'ratio': round(ratio, 2),
+            'baseline_peak_mb': before.get('peak_mb'),
+            'peak_mb': result.get('peak_mb'),
+            'regressed': ratio > 1 + threshold,
+        })
+    return rows
+
+def format_comparison(rows: List[Dict]) -> str:
+    """Markdown table of compare_benchmarks rows."""
+    if not rows:
+        return 'No results in common with the baseline.\n'
+    table = '| Case | Size (MB) | Baseline (s) | Now (s) | Ratio | Peak MB (baseline → now) |\n'
+    table += '| --- | ---: | ---: | ---: | ---: | --- |\n'
+    for row in rows:
+        flag = ' ⚠️' if row['regressed'] else ''
+        table += (f"| {row['case']} | {row['size_mb']} | {row['baseline_seconds']} | {row['seconds']} | "
+                  f"{row['ratio']}x{flag} | {row['baseline_peak_mb']} → {row['peak_mb']} |\n")
+    return table
+
+def benchmark_command(args) -> int:
+    """
+    Run the benchmark subcommand.
+
+    Returns:
+        Exit code: 1 if --fail-on-regression is set and a case regressed, else 0
+    """
+    sizes = [float(size) for size in args.sizes.split(',')] if args.sizes else DEFAULT_SIZES_MB
+    cases = args.cases.split(',') if args.cases else None
+    record = run_benchmarks(sizes, cases, repeat=args.repeat, memory=not args.no_memory, work_dir=args.work_dir)
+    output = args.output or DEFAULT_BENCHMARK_FILE
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=2)
+    log(f"Benchmark results written to {output}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r') as f:
+        rows = compare_benchmarks(record, json.load(f), args.threshold)
+    sys.stdout.write(format_comparison(rows))
+    sys.stdout.flush()
+    regressed = [row for row in rows if row['regressed']]
+    if regressed:
+        log(f"{len(regressed)} benchmark cases are more than {args.threshold:.0%} slower than {args.baseline}")
+    return 1 if regressed and args.fail_on_regression else 0
@@ -0,0 +1,309 @@
+"""
+Base coverage cache module.
+This module stores base branch coverage results keyed by the base commit and its lockfiles,
+so PR runs against an unchanged base can skip checking out and testing it. It also stores
+each target's result from a green run keyed by a fingerprint of the files the target owns,
+so a base target whose inputs match reuses an earlier PR or base measurement instead of running.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from .impact import is_target_input
+from .targets import targets_fingerprint
+from .util import log, run_command
+
+# Bump when the cached payload or the way coverage is measured changes
+CACHE_VERSION = 4
+
+# Default cache directory, persisted between CI runs with actions/cache
+DEFAULT_CACHE_DIR = '.coverage-cache'
+
+# Lockfiles whose contents affect the measured coverage, unless the targets config names others
+LOCKFILES = ['package-lock.json', 'webview-ui/package-lock.json']
+
+# Subdirectory of the cache directory holding per-target results, as <target>/<fingerprint>.json
+TARGET_CACHE_SUBDIR = 'targets'
+
+# Per-target entries kept for each target
+TARGET_CACHE_ENTRIES = 200
+
+def resolve_commit(ref: str, cwd: Optional[str] = None) -> Optional[str]:
+    """
+    Resolve a git ref to a commit SHA.
+
+    Args:
+        ref: Git ref (branch, remote branch or SHA)
+        cwd: Repository or worktree directory (default: current directory)
+
+    Returns:
+        Full commit SHA, or None if it cannot be resolved
+    """
+    returncode, stdout, stderr = run_command(['git', 'rev-parse', '--verify', f"{ref}^{{commit}}"], cwd=cwd)
+    if returncode != 0:
+        log(f"Could not resolve {ref}: {stderr.strip()}")
+        return None
+    return stdout.strip()
+
+def lockfile_hashes(commit: str, lockfiles: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """
+    Get the git blob hash of each lockfile at a commit.
+
+    Blob hashes are content addressed, so this reads no file contents.
+
+    Args:
+        commit: Commit SHA
+        lockfiles: Repository-relative lockfile paths (default: LOCKFILES)
+
+    Returns:
+        Dict of lockfile path to blob hash (None if the file does not exist at that commit)
+    """
+    hashes = {}
+    for path in lockfiles or LOCKFILES:
+        returncode, stdout, _ = run_command(['git', 'rev-parse', '--verify', '--quiet', f"{commit}:{path}"])
+        hashes[path] = stdout.strip() if returncode == 0 else None
+    return hashes
+
+def compute_cache_key(commit: str, lockfiles: Dict[str, Optional[str]], targets: str = '') -> str:
+    """
+    Compute the cache key for a base commit.
+
+    Args:
+        commit: Base commit SHA
+        lockfiles: Lockfile blob hashes from lockfile_hashes
+        targets: Fingerprint of the coverage targets config (targets_fingerprint)
+
+    Returns:
+        Hex digest identifying the cached result
+    """
+    payload = json.dumps({'version': CACHE_VERSION, 'commit': commit, 'lockfiles': lockfiles, 'targets': targets},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def base_coverage_cache_key(branch_name: str, lockfiles: Optional[List[str]] = None, targets: str = '') -> Optional[str]:
+    """
+    Fetch the base branch and compute its cache key without checking it out.
+
+    Args:
+        branch_name: Base branch name
+        lockfiles: Lockfiles of the coverage targets (default: LOCKFILES)
+        targets: Fingerprint of the coverage targets config
+
+    Returns:
+        Cache key, or None if the base commit cannot be resolved
+    """
+    returncode, _, stderr = run_command(['git', 'fetch', 'origin', branch_name])
+    if returncode != 0:
+        log(f"Could not fetch {branch_name} for the coverage cache: {stderr.strip()}")
+        return None
+
+    commit = resolve_commit(f"origin/{branch_name}")
+    if not commit:
+        return None
+
+    key = compute_cache_key(commit, lockfile_hashes(commit, lockfiles), targets)
+    log(f"Base coverage cache key for {branch_name} ({commit[:12]}): {key[:16]}")
+    return key
+
+def cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.json")
+
+def load_cached_coverage(cache_dir: str, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a cached base coverage result.
+
+    Args:
+        cache_dir: Cache directory
+        key: Cache key from compute_cache_key
+
+    Returns:
+        Cached entry, or None on a miss or an unreadable entry
+    """
+    path = cache_path(cache_dir, key)
+    if not os.path.exists(path):
+        log(f"Base coverage cache miss: {key[:16]}")
+        return None
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+    log(f"Base coverage cache hit: {key[:16]} (stored {entry.get('created_at')})")
+    return entry
+
+def store_cached_coverage(cache_dir: str, key: str, coverage: Dict[str, Any]) -> None:
+    """
+    Store a base coverage result.
+
+    The entry is written to a temporary file and renamed, so concurrent jobs
+    sharing the directory never read a partial entry.
+
+    Args:
+        cache_dir: Cache directory
+        key: Cache key from compute_cache_key
+        coverage: Coverage values to store
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = dict(coverage, key=key, version=CACHE_VERSION, created_at=datetime.now().isoformat())
+    path = cache_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp_path, path)
+    log(f"Stored base coverage in cache: {path}")
+
+def target_input_files(commit: str, target, targets, cwd: Optional[str] = None) -> Optional[List[Tuple[str, str]]]:
+    """
+    List the files whose contents decide a target's coverage at a commit.
+
+    These are the files under the target's directory, less the directories of targets
+    nested in it, plus the files under the inputs it declares elsewhere (e.g. sources it
+    shares with another target), less files that cannot change coverage (see
+    affects_coverage). The target's lockfile is among them.
+
+    Args:
+        commit: Commit SHA or ref
+        target: CoverageTarget
+        targets: Every coverage target, to leave out the nested ones
+        cwd: Repository or worktree directory (default: current directory)
+
+    Returns:
+        Sorted (repository-relative path, blob hash) pairs, or None if git fails
+    """
+    directory = target.cwd.replace(os.sep, '/')
+    returncode, stdout, stderr = run_command(
+        ['git', 'ls-tree', '-r', '-z', '--full-tree', commit, '--', directory, *target.inputs], cwd=cwd
+    )
+    if returncode != 0:
+        log(f"Could not list the files of {target.name} at {commit[:12]}: {stderr.strip()}")
+        return None
+    files = []
+    for entry in stdout.split('\0'):
+        # <mode> SP <type> SP <object> TAB <path>
+        info, _, path = entry.partition('\t')
+        fields = info.split()
+        if len(fields) != 3 or fields[1] != 'blob':
+            continue
+        if is_target_input(path, target, targets):
+            files.append((path, fields[2]))
+    return sorted(files)
+
+def target_fingerprint(commit: str, target, targets, cwd: Optional[str] = None) -> Optional[str]:
+    """
+    Fingerprint of a target's inputs at a commit.
+
+    Git blob hashes are content addressed, so two commits whose files under the target
+    are identical (e.g. a base commit and a PR that only touched another target) get
+    the same fingerprint, and this reads no file contents.
+
+    Args:
+        commit: Commit SHA or ref
+        target: CoverageTarget
+        targets: Every coverage target
+        cwd: Repository or worktree directory (default: current directory)
+
+    Returns:
+        Hex digest, or None if the commit's files cannot be listed
+    """
+    files = target_input_files(commit, target, targets, cwd)
+    if files is None:
+        return None
+    tree = hashlib.sha256()
+    for path, blob in files:
+        tree.update(f"{blob} {path}\n".encode('utf-8'))
+    lockfile = 'package-lock.json' if target.cwd == '.' else f"{target.cwd.replace(os.sep, '/')}/package-lock.json"
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'tree': tree.hexdigest(),
+        'lockfile': dict(files).get(lockfile),
+        'target': targets_fingerprint([target]),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def target_entry_path(cache_dir: str, target_name: str, fingerprint: str) -> str:
+    return os.path.join(cache_dir, TARGET_CACHE_SUBDIR, target_name, f"{fingerprint}.json")
+
+def load_target_result(cache_dir: str, target_name: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the cached result of a target.
+
+    Only results of runs whose tests passed are reused; a failed run's coverage says
+    nothing about the suite, and an entry without the field is treated as failed.
+
+    Args:
+        cache_dir: Cache directory
+        target_name: Target name
+        fingerprint: Fingerprint from target_fingerprint
+
+    Returns:
+        Entry with the coverage and the kind ("pr" or "base") and commit it was measured
+        for, or None on a miss, an unreadable entry or one not recorded as passed
+    """
+    path = target_entry_path(cache_dir, target_name, fingerprint)
+    if not os.path.exists(path):
+        log(f"{target_name} result cache miss: {fingerprint[:16]}")
+        return None
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+    if entry.get('version') != CACHE_VERSION or not entry.get('coverage'):
+        return None
+    if entry.get('passed') is not True:
+        log(f"Ignoring {target_name} cache entry {fingerprint[:16]}: not recorded as a passing run")
+        return None
+    log(f"{target_name} result cache hit: {fingerprint[:16]} ({entry.get('kind')} run of "
+        f"{(entry.get('commit') or 'unknown')[:12]}, stored {entry.get('created_at')})")
+    return entry
+
+def store_target_result(cache_dir: str, target_name: str, fingerprint: str, coverage: float, kind: str,
+                        commit: Optional[str], passed: bool) -> bool:
+    """
+    Store a target's result, if its tests passed.
+
+    The entry is written to a temporary file and renamed, so concurrent jobs sharing
+    the cache never read a partial entry.
+
+    Args:
+        cache_dir: Cache directory
+        target_name: Target name
+        fingerprint: Fingerprint from target_fingerprint
+        coverage: Measured line coverage percentage
+        kind: "pr" or "base"
+        commit: Commit the coverage was measured for
+        passed: Whether every test of the run passed; failed runs are not stored
+
+    Returns:
+        True if the entry was stored
+    """
+    if not passed:
+        log(f"Not caching the {kind} {target_name} result: its tests did not pass")
+        return False
+    path = target_entry_path(cache_dir, target_name, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {'version': CACHE_VERSION, 'coverage': coverage, 'kind': kind, 'commit': commit, 'passed': True,
+             'created_at': datetime.now().isoformat()}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp_path, path)
+    log(f"Stored {kind} {target_name} result in cache: {path}")
+    prune_target_results(cache_dir, target_name)
+    return True
+
+def prune_target_results(cache_dir: str, target_name: str, keep: int = TARGET_CACHE_ENTRIES) -> None:
+    """Drop all but the most recently stored entries of a target."""
+    target_dir = os.path.join(cache_dir, TARGET_CACHE_SUBDIR, target_name)
+    entries = [os.path.join(target_dir, name) for name in os.listdir(target_dir) if name.endswith('.json')]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
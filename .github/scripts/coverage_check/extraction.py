@@ -6,10 +6,10 @@ This module handles extracting coverage percentages from coverage report files.
 import os
 import re
 import sys
-import shlex
-import subprocess
 import traceback
-from .util import log, file_exists, get_file_size, list_directory, is_safe_command, run_command
+from .util import (
+    log, file_exists, get_file_size, list_directory, is_safe_command, stream_command, TIMEOUT_EXIT_CODE
+)
 
 # Global verbose flag
 verbose = False
@@ -19,25 +19,262 @@ def set_verbose(value):
     global verbose
     verbose = value
 
-def print_debug_output(content, coverage_type):
+# Limits for a coverage run (seconds): total, without any output, and after the summary was printed
+COVERAGE_TIMEOUT_S = 45 * 60
+COVERAGE_IDLE_TIMEOUT_S = 10 * 60
+COVERAGE_FINISH_TIMEOUT_S = 2 * 60
+
+def set_timeouts(timeout=None, idle_timeout=None):
+    """Override the coverage run timeouts (None keeps the current value, 0 disables)."""
+    global COVERAGE_TIMEOUT_S, COVERAGE_IDLE_TIMEOUT_S
+    if timeout is not None:
+        COVERAGE_TIMEOUT_S = timeout or None
+    if idle_timeout is not None:
+        COVERAGE_IDLE_TIMEOUT_S = idle_timeout or None
+
+def coverage_timeouts():
+    """Current coverage run timeouts, as stream_command keyword arguments."""
+    return {
+        'timeout': COVERAGE_TIMEOUT_S,
+        'idle_timeout': COVERAGE_IDLE_TIMEOUT_S,
+        'finish_timeout': COVERAGE_FINISH_TIMEOUT_S,
+    }
+
+# Header and footer of the istanbul text-summary report printed by the extension tests
+EXTENSION_SUMMARY_HEADER = '=============================== Coverage summary ==============================='
+EXTENSION_SUMMARY_FOOTER = re.compile(r'^=+$')
+
+# Pattern: Lines : xx.xx% ( xxxxxxx/xxxxxxx )
+EXTENSION_LINES_PATTERN = re.compile(r'Lines\s*:\s*(\d+\.\d+)%')
+
+# Header of the vitest v8 text report printed by the webview tests
+WEBVIEW_REPORT_HEADER = '% Coverage report from v8'
+
+# Pattern: All files | xx.xx | xx.xx | xx.xx | xx.xx | -- the fourth column is % Lines
+WEBVIEW_ALL_FILES_PATTERN = re.compile(r'All files\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+(\d+\.\d+)')
+
+# Most summary lines kept for the debug output
+MAX_SUMMARY_LINES = 50
+
+# Lines a detector acts on outside the extension summary block all contain one of these;
+# a scan only decodes and feeds those lines, and the lines of the block that follow them
+SUMMARY_KEYWORDS = {
+    'extension': (b'Coverage summary', b'Lines'),
+    'webview': (b'Coverage report from v8', b'All files'),
+}
+
+# Bytes read at a time when scanning a file
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# End of the file kept by a scan, logged in place of the file when no summary is found
+SCAN_TAIL_BYTES = 64 * 1024
+
+# Percentage of each metric in the extension text-summary lines and in the webview "All files" row
+EXTENSION_METRIC_PATTERN = re.compile(r'(Statements|Branches|Functions|Lines)\s*:\s*(\d+(?:\.\d+)?)%')
+WEBVIEW_METRICS = ('statements', 'branches', 'functions', 'lines')
+
+class CoverageSummaryDetector:
     """
-    Print debug information about the coverage output.
+    Finds the coverage summary in test output fed to it one line at a time.
+    
+    Only the summary section is kept, so memory does not grow with the output,
+    and the percentage is known as soon as the summary line has been fed.
+    """
+
+    def __init__(self, coverage_type="extension"):
+        self.coverage_type = coverage_type
+        self.coverage_pct = None
+        self.summary_lines = []
+        self.in_summary = False
+        # Last part of the scanned output (set by scans, not by feed)
+        self.tail = ''
+
+    def feed(self, line):
+        """
+        Process one line of output.
+        
+        Args:
+            line: Output line, with or without its newline
+            
+        Returns:
+            True if this line yielded the coverage percentage
+        """
+        line = line.rstrip('\r\n')
+        if self.coverage_type == "extension":
+            return self._feed_extension(line)
+        return self._feed_webview(line)
+
+    def _feed_extension(self, line):
+        if EXTENSION_SUMMARY_HEADER in line:
+            self.in_summary = True
+            self.summary_lines = []
+            return False
+        if self.in_summary:
+            if EXTENSION_SUMMARY_FOOTER.match(line.strip()):
+                self.in_summary = False
+            elif len(self.summary_lines) < MAX_SUMMARY_LINES:
+                self.summary_lines.append(line)
+        return self._match(EXTENSION_LINES_PATTERN, line)
+
+    def _feed_webview(self, line):
+        if WEBVIEW_REPORT_HEADER in line:
+            self.in_summary = True
+            return False
+        found = self._match(WEBVIEW_ALL_FILES_PATTERN, line)
+        if found and self.in_summary:
+            self.summary_lines = [line]
+            self.in_summary = False
+        return found
+
+    def metrics(self):
+        """
+        Percentage of each metric in the summary found.
+        
+        Returns:
+            Dict of statements/branches/functions/lines to percentage (empty if no summary was found)
+        """
+        if self.coverage_pct is None:
+            return {}
+        if self.coverage_type == "extension":
+            found = {}
+            for line in self.summary_lines:
+                match = EXTENSION_METRIC_PATTERN.search(line)
+                if match:
+                    found[match.group(1).lower()] = float(match.group(2))
+            found.setdefault('lines', self.coverage_pct)
+            return found
+        columns = [column.strip() for column in self.summary_lines[0].split('|')[1:5]] if self.summary_lines else []
+        try:
+            return dict(zip(WEBVIEW_METRICS, map(float, columns)))
+        except ValueError:
+            return {'lines': self.coverage_pct}
+
+    def _match(self, pattern, line):
+        if self.coverage_pct is not None:
+            return False
+        match = pattern.search(line)
+        if match:
+            self.coverage_pct = float(match.group(1))
+            return True
+        return False
+
+def feed_line(detector, block, start):
+    """Feed the line of block starting at start; returns where the next line starts."""
+    end = block.find(b'\n', start)
+    if end == -1:
+        end = len(block)
+    detector.feed(block[start:end].decode('utf-8', errors='replace'))
+    return end + 1
+
+def feed_summary_lines(detector, block):
+    """
+    Feed the lines of block a detector acts on, in order.
+    
+    Lines holding a keyword are found with bytes.find, so the lines in between are
+    never split or decoded. While the detector is inside the extension summary
+    block, the lines that follow are fed one by one until the block ends.
     
     Args:
-        content: The content of the coverage file
+        detector: CoverageSummaryDetector
+        block: Bytes of whole lines
+    """
+    starts = {0} if detector.in_summary else set()
+    for keyword in SUMMARY_KEYWORDS[detector.coverage_type]:
+        index = block.find(keyword)
+        while index != -1:
+            starts.add(block.rfind(b'\n', 0, index) + 1)
+            index = block.find(keyword, index + len(keyword))
+    fed = 0
+    for start in sorted(starts):
+        if start < fed:
+            continue
+        fed = feed_line(detector, block, start)
+        following = 0
+        while detector.in_summary and detector.coverage_type == "extension" and fed < len(block) \
+                and following < MAX_SUMMARY_LINES:
+            fed = feed_line(detector, block, fed)
+            following += 1
+
+def scan_chunks(chunks, coverage_type="extension"):
+    """
+    Find the coverage summary in output given as byte chunks, in one pass.
+    
+    Args:
+        chunks: Iterable of bytes chunks of the output
         coverage_type: Type of coverage report (extension or webview)
+        
+    Returns:
+        CoverageSummaryDetector, with tail set to the end of the output
+    """
+    detector = CoverageSummaryDetector(coverage_type)
+    carry = b''
+    tail = b''
+    for chunk in chunks:
+        data = carry + chunk
+        cut = data.rfind(b'\n') + 1
+        block, carry = data[:cut], data[cut:]
+        if block:
+            feed_summary_lines(detector, block)
+            tail = block[-SCAN_TAIL_BYTES:] if len(block) >= SCAN_TAIL_BYTES else (tail + block)[-SCAN_TAIL_BYTES:]
+    if carry:
+        feed_summary_lines(detector, carry)
+        tail = (tail + carry)[-SCAN_TAIL_BYTES:]
+    detector.tail = tail.decode('utf-8', errors='replace')
+    return detector
+
+def read_chunks(file_path, chunk_size=None):
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size or SCAN_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+# (path, coverage type) -> (size, mtime, detector) of the last scan, so callers that
+# fall back to the same file one after another share one read of it
+_scans = {}
+
+def forget_scans():
+    """Drop remembered scans, so the next scan of every file reads it again."""
+    _scans.clear()
+
+def scan_coverage_file(file_path, coverage_type="extension"):
+    """
+    Scan a coverage output file for its summary in one buffered pass.
+    
+    A file that hasn't changed since it was last scanned isn't read again.
+    
+    Args:
+        file_path: Path to the coverage output file
+        coverage_type: Type of coverage report (extension or webview)
+        
+    Returns:
+        CoverageSummaryDetector with the percentage, summary lines, metrics and tail of the file
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), coverage_type)
+    cached = _scans.get(key)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    detector = scan_chunks(read_chunks(file_path), coverage_type)
+    _scans[key] = (stat.st_size, stat.st_mtime_ns, detector)
+    return detector
+
+def print_summary(detector):
+    """
+    Print the coverage summary found by a detector, if verbose.
+    
+    Args:
+        detector: CoverageSummaryDetector that has been fed the output
     """
     if not verbose:
         return
 
-    # Extract and print only the coverage summary section
-    if coverage_type == "extension":
-        # Look for the coverage summary section
-        summary_match = re.search(r'=============================== Coverage summary ===============================\n(.*?)\n=+', content, re.DOTALL)
-        if summary_match:
+    if detector.coverage_type == "extension":
+        if detector.summary_lines:
             sys.stdout.write("\n##[group]EXTENSION COVERAGE SUMMARY\n")
-            sys.stdout.write("=============================== Coverage summary ===============================\n")
-            sys.stdout.write(summary_match.group(1) + "\n")
+            sys.stdout.write(EXTENSION_SUMMARY_HEADER + "\n")
+            sys.stdout.write("\n".join(detector.summary_lines) + "\n")
             sys.stdout.write("================================================================================\n")
             sys.stdout.write("##[endgroup]\n")
             sys.stdout.flush()
@@ -45,15 +282,13 @@ def print_debug_output(content, coverage_type):
             sys.stdout.write("\n##[warning]No coverage summary found in extension coverage file\n")
             sys.stdout.flush()
     else:  # webview
-        # Look for the coverage table - specifically the "All files" row
-        table_match = re.search(r'% Coverage report from v8.*?-+\|.*?\n.*?\n(All files.*?)(?:\n[^\n]*\|)', content, re.DOTALL)
-        if table_match:
+        if detector.summary_lines:
             sys.stdout.write("\n##[group]WEBVIEW COVERAGE SUMMARY\n")
             sys.stdout.write("% Coverage report from v8\n")
             sys.stdout.write("-------------------|---------|----------|---------|---------|-------------------\n")
             sys.stdout.write("File               | % Stmts | % Branch | % Funcs | % Lines | Uncovered Line #s \n")
             sys.stdout.write("-------------------|---------|----------|---------|---------|-------------------\n")
-            sys.stdout.write(table_match.group(1) + "\n")
+            sys.stdout.write(detector.summary_lines[0] + "\n")
             sys.stdout.write("-------------------|---------|----------|---------|---------|-------------------\n")
             sys.stdout.write("##[endgroup]\n")
             sys.stdout.flush()
@@ -61,6 +296,33 @@ def print_debug_output(content, coverage_type):
             sys.stdout.write("\n##[warning]No coverage table found in webview coverage file\n")
             sys.stdout.flush()
 
+def print_debug_output(content, coverage_type):
+    """
+    Print debug information about the coverage output.
+    
+    Args:
+        content: The content of the coverage file
+        coverage_type: Type of coverage report (extension or webview)
+    """
+    if not verbose:
+        return
+
+    # Encoded a chunk at a time, so the content isn't held twice
+    chunks = (content[start:start + SCAN_CHUNK_SIZE].encode('utf-8', errors='replace')
+              for start in range(0, len(content), SCAN_CHUNK_SIZE))
+    print_summary(scan_chunks(chunks, coverage_type))
+
+def log_scan_tail(detector, file_size):
+    """Log the end of a scanned file (all of it, if it is small), for debugging a missing summary."""
+    if file_size > len(detector.tail.encode('utf-8')):
+        log(f"No coverage data found. Last {SCAN_TAIL_BYTES // 1024} KB of the file:")
+    else:
+        log("No coverage data found. Full file content:")
+    log("=== File content ===")
+    sys.stdout.write(detector.tail)
+    sys.stdout.write("\n")
+    log("=== End file content ===")
+
 def extract_coverage(file_path, coverage_type="extension"):
     """
     Extract coverage percentage from a coverage report file.
@@ -123,45 +385,21 @@ def extract_coverage(file_path, coverage_type="extension"):
     except Exception as e:
         log(f"Error listing directory: {e}")
     
-    with open(file_path, 'r') as f:
-        content = f.read()
+    # One pass over the file finds the summary and keeps its end for the diagnostics below
+    detector = scan_coverage_file(file_path, coverage_type)
     
     # Print debug information if verbose
-    print_debug_output(content, coverage_type)
+    print_summary(detector)
     
-    # Extract coverage percentage based on coverage type
-    if coverage_type == "extension":
-        # Extract the percentage from the "Lines" row in the coverage summary
-        # Pattern: Lines : xx.xx% ( xxxxxxx/xxxxxxx )
-        lines_match = re.search(r'Lines\s*:\s*(\d+\.\d+)%', content)
-        if lines_match:
-            coverage_pct = float(lines_match.group(1))
-            if verbose:
-                sys.stdout.write(f"Pattern matched (Lines percentage): {coverage_pct}\n")
-                sys.stdout.flush()
-            return coverage_pct
-        else:
-            # No coverage data found, log full content for debugging
-            log("No coverage data found. Full file content:")
-            log("=== Full file content ===")
-            log(content)
-            log("=== End file content ===")
-    else:  # webview
-        # Extract the percentage from the "% Lines" column in the "All files" row
-        # Pattern: All files | xx.xx | xx.xx | xx.xx | xx.xx |
-        all_files_match = re.search(r'All files\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+(\d+\.\d+)', content)
-        if all_files_match:
-            coverage_pct = float(all_files_match.group(1))
-            if verbose:
-                sys.stdout.write(f"Pattern matched (All files % Lines): {coverage_pct}\n")
-                sys.stdout.flush()
-            return coverage_pct
-        else:
-            # No coverage data found, log full content for debugging
-            log("No coverage data found. Full file content:")
-            log("=== Full file content ===")
-            log(content)
-            log("=== End file content ===")
+    if detector.coverage_pct is not None:
+        if verbose:
+            pattern = "Lines percentage" if coverage_type == "extension" else "All files % Lines"
+            sys.stdout.write(f"Pattern matched ({pattern}): {detector.coverage_pct}\n")
+            sys.stdout.flush()
+        return detector.coverage_pct
+    
+    # No coverage data found, log the file for debugging
+    log_scan_tail(detector, file_size)
     
     # If no match found, return 0.0
     return 0.0
@@ -190,7 +428,7 @@ def compare_coverage(base_cov, pr_cov):
     
     return decreased, abs(diff)
 
-def run_coverage(command, output_file, coverage_type="extension"):
+def run_coverage(command, output_file, coverage_type="extension", cwd=None, env=None, outcome=None):
     """
     Run a coverage command and extract the coverage percentage.
     
@@ -198,6 +436,9 @@ def run_coverage(command, output_file, coverage_type="extension"):
         command: Command to run
         output_file: File to save the output to
         coverage_type: Type of coverage report (extension or webview)
+        cwd: Working directory for the command (default: current directory)
+        env: Environment for the command (default: inherit)
+        outcome: Dict that receives the command's exit code as 'returncode' (optional)
         
     Returns:
         Coverage percentage as a float
@@ -215,21 +456,28 @@ def run_coverage(command, output_file, coverage_type="extension"):
             sys.stdout.flush()
             sys.exit(1)
 
-        # Run command using safe execution from util
-        returncode, stdout, stderr = run_command(command)
+        # Stream the output to the file and the log, watching for the summary as it goes by.
+        # Once it is seen the run only gets a short grace period to exit, so a test runner
+        # that hangs on shutdown can't hold the job hostage.
+        detector = CoverageSummaryDetector(coverage_type)
+        def on_line(line):
+            if detector.feed(line):
+                log(f"{coverage_type.capitalize()} coverage summary detected: {detector.coverage_pct}%")
+                return True
+            return False
+        
+        log(f"Saving command output to {output_file}")
+        returncode = stream_command(
+            command, output_file, on_line=on_line, echo_prefix=f"[{coverage_type}] ", cwd=cwd, env=env,
+            **coverage_timeouts()
+        )
         
         # Log command result
         log(f"Command exit code: {returncode}")
-        log(f"Command stdout length: {len(stdout)} bytes")
-        log(f"Command stderr length: {len(stderr)} bytes")
-        
-        # Save output to file
-        log(f"Saving command output to {output_file}")
-        with open(output_file, 'w') as f:
-            f.write(stdout)
-            if stderr:
-                f.write("\n\n=== STDERR ===\n")
-                f.write(stderr)
+        if outcome is not None:
+            outcome['returncode'] = returncode
+        if returncode == TIMEOUT_EXIT_CODE:
+            log(f"Coverage command was stopped by a timeout; salvaging coverage from its partial output")
         
         # Verify file was created and has content
         if not file_exists(output_file):
@@ -249,8 +497,12 @@ def run_coverage(command, output_file, coverage_type="extension"):
             
         log(f"Output file size: {file_size} bytes")
         
-        # Extract coverage percentage
-        coverage_pct = extract_coverage(output_file, coverage_type)
+        # Use the summary seen while streaming; otherwise rescan the file with full diagnostics
+        if detector.coverage_pct is not None:
+            print_summary(detector)
+            coverage_pct = detector.coverage_pct
+        else:
+            coverage_pct = extract_coverage(output_file, coverage_type)
         
         log(f"{coverage_type.capitalize()} coverage: {coverage_pct}%")
         return coverage_pct
@@ -4,158 +4,443 @@ This module handles interactions with the GitHub API for posting comments to PRs
 """
 
 import os
+import re
+import json
+import time
+import hashlib
+import threading
 import requests
+from .cache import DEFAULT_CACHE_DIR
+from .timing import phase
 from .util import log, file_exists
+from .patch import format_patch_coverage
+from .history import format_trend
 
-def generate_comment(base_ext_cov, pr_ext_cov, ext_decreased, ext_diff, 
-                    base_web_cov, pr_web_cov, web_decreased, web_diff):
+DEFAULT_API_URL = 'https://api.github.com'
+
+# Marks the coverage comment so later runs update it instead of posting another
+COMMENT_MARKER = '<!-- COVERAGE_REPORT -->'
+
+# Hidden hash of the comment's coverage content, so an unchanged report isn't rewritten
+HASH_MARKER_PATTERN = re.compile(r'<!-- COVERAGE_HASH: ([0-9a-f]+) -->')
+
+# Largest page size the REST API allows
+PER_PAGE = 100
+
+# Retries of a rate-limited or failed request, and the longest wait between them
+MAX_RETRIES = 3
+MAX_BACKOFF_S = 60
+
+REQUEST_TIMEOUT_S = 30
+
+# Methods not resent after a timeout, connection error or server error: GitHub may have
+# applied them before failing, and a second POST would duplicate the comment. They are
+# only retried when GitHub rejected them (rate limits). The comment PATCH sets a fixed
+# body, so resending it is harmless.
+NON_IDEMPOTENT_METHODS = ('POST',)
+
+# Longest the workflow waits for a background comment post before exiting without it
+COMMENT_POST_TIMEOUT_S = 120
+
+# ETags and bodies of listing pages, kept with the base coverage cache
+DEFAULT_ETAG_CACHE = os.path.join(DEFAULT_CACHE_DIR, 'github_etags.json')
+MAX_ETAG_ENTRIES = 50
+
+class GitHubError(Exception):
+    """Unexpected response from the GitHub API."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+
+def generate_comment(results, patch_coverage=None, timing=None, trend=None):
     """
     Generate a PR comment with coverage comparison.
     
     Args:
-        base_ext_cov: Base branch extension coverage
-        pr_ext_cov: PR branch extension coverage
-        ext_decreased: Whether extension coverage decreased
-        ext_diff: Extension coverage difference
-        base_web_cov: Base branch webview coverage
-        pr_web_cov: PR branch webview coverage
-        web_decreased: Whether webview coverage decreased
-        web_diff: Webview coverage difference
+        results: TargetResult of each coverage target, in the order they are shown
+        patch_coverage: PatchCoverage for the changed lines (optional)
+        timing: Timeline to include as a collapsed section (optional)
+        trend: Base branch trend from CoverageHistory.branch_trend (optional)
         
     Returns:
         Comment text
     """
     from datetime import datetime
     
-    # Convert string inputs to appropriate types
-    try:
-        base_ext_cov = float(base_ext_cov)
-        pr_ext_cov = float(pr_ext_cov)
-        # Handle ext_decreased as either string or boolean
-        if isinstance(ext_decreased, str):
-            ext_decreased = ext_decreased.lower() == 'true'
-        else:
-            ext_decreased = bool(ext_decreased)
-        ext_diff = float(ext_diff)
-        base_web_cov = float(base_web_cov)
-        pr_web_cov = float(pr_web_cov)
-        # Handle web_decreased as either string or boolean
-        if isinstance(web_decreased, str):
-            web_decreased = web_decreased.lower() == 'true'
+    comment = '## Coverage Report\n\n'
+
+    for result in results:
+        comment += f'### {result.target.label} Coverage\n\n'
+        comment += f'Base branch: {result.base:.0f}%\n\n'
+        comment += f'PR branch: {result.pr:.0f}%\n\n'
+
+        if result.decreased:
+            comment += f'⚠️ **Warning: Coverage decreased by {result.diff:.2f}%**\n\n'
+            comment += 'Consider adding tests to cover your changes.\n\n'
         else:
-            web_decreased = bool(web_decreased)
-        web_diff = float(web_diff)
-    except ValueError as e:
-        log(f"Error converting input values: {e}")
-        return ""
-    
-    # Add a unique identifier to find this comment later
-    comment = '<!-- COVERAGE_REPORT -->\n'
-    comment += '## Coverage Report\n\n'
-
-    # Extension coverage
-    comment += '### Extension Coverage\n\n'
-    comment += f'Base branch: {base_ext_cov:.0f}%\n\n'
-    comment += f'PR branch: {pr_ext_cov:.0f}%\n\n'
-
-    if ext_decreased:
-        comment += f'⚠️ **Warning: Coverage decreased by {ext_diff:.2f}%**\n\n'
-        comment += 'Consider adding tests to cover your changes.\n\n'
-    else:
-        comment += '✅ Coverage increased or remained the same\n\n'
+            comment += '✅ Coverage increased or remained the same\n\n'
 
-    # Webview coverage
-    comment += '### Webview Coverage\n\n'
-    comment += f'Base branch: {base_web_cov:.0f}%\n\n'
-    comment += f'PR branch: {pr_web_cov:.0f}%\n\n'
+        if result.below_minimum:
+            comment += f"⚠️ **Below the {result.target.thresholds['min_coverage']}% minimum for this target**\n\n"
 
-    if web_decreased:
-        comment += f'⚠️ **Warning: Coverage decreased by {web_diff:.2f}%**\n\n'
-        comment += 'Consider adding tests to cover your changes.\n\n'
-    else:
-        comment += '✅ Coverage increased or remained the same\n\n'
+    # Changed lines
+    if patch_coverage is not None:
+        comment += format_patch_coverage(patch_coverage)
 
     # Overall assessment
     comment += '### Overall Assessment\n\n'
-    if ext_decreased or web_decreased:
+    if any(result.decreased for result in results):
         comment += '⚠️ **Test coverage has decreased in this PR**\n\n'
         comment += 'Please consider adding tests to maintain or improve coverage.\n\n'
     else:
         comment += '✅ **Test coverage has been maintained or improved**\n\n'
 
+    # Base branch coverage over its last measured commits
+    if trend:
+        comment += format_trend(trend, {result.target.name: result.target.label for result in results})
+
+    # Add a unique identifier to find this comment later, and the hash of everything
+    # above; timing and the timestamp differ on every run, so they come after it
+    comment = f'{COMMENT_MARKER}\n<!-- COVERAGE_HASH: {content_hash(comment)} -->\n' + comment
+
+    # Workflow timing so far
+    if timing is not None:
+        comment += timing.comment_section()
+
     # Add timestamp
     comment += f'\n\n<sub>Last updated: {datetime.now().isoformat()}</sub>'
     
     return comment
 
-def post_comment(comment_path, pr_number, repo, token=None):
+def content_hash(content):
+    """Stable short hash of comment content."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+def comment_hash(body):
+    """
+    Get the coverage content hash embedded in a comment.
+    
+    Args:
+        body: Comment text
+        
+    Returns:
+        The hash, or None for comments written before hashes were embedded
+    """
+    match = HASH_MARKER_PATTERN.search(body or '')
+    return match.group(1) if match else None
+
+class GitHubClient:
+    """
+    Minimal GitHub REST client for the coverage comment.
+    
+    One requests.Session keeps the connection alive across calls. Listings follow
+    Link headers page by page, and each page is fetched conditionally with the ETag
+    of the last copy seen, so an unchanged page costs a 304 that GitHub does not
+    count against the rate limit. Rate-limited and failed requests are retried
+    after the wait GitHub asks for, or with exponential backoff.
+    """
+
+    def __init__(self, token, api_url=None, etag_cache_path=DEFAULT_ETAG_CACHE, session=None,
+                 max_retries=MAX_RETRIES, sleep=time.sleep):
+        self.api_url = (api_url or os.environ.get('GITHUB_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'coverage-check',
+        })
+        self.etag_cache_path = etag_cache_path
+        self.etag_cache = self.load_etag_cache()
+        self.etag_cache_changed = False
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.request_count = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self.save_etag_cache()
+        self.session.close()
+    
+    def load_etag_cache(self):
+        if not self.etag_cache_path or not file_exists(self.etag_cache_path):
+            return {}
+        try:
+            with open(self.etag_cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"Ignoring unreadable ETag cache {self.etag_cache_path}: {e}")
+            return {}
+    
+    def save_etag_cache(self):
+        if not self.etag_cache_path or not self.etag_cache_changed:
+            return
+        # Keep the most recently stored pages
+        entries = list(self.etag_cache.items())[-MAX_ETAG_ENTRIES:]
+        try:
+            os.makedirs(os.path.dirname(self.etag_cache_path) or '.', exist_ok=True)
+            tmp_path = f"{self.etag_cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(entries), f)
+            os.replace(tmp_path, self.etag_cache_path)
+        except OSError as e:
+            log(f"Could not save ETag cache {self.etag_cache_path}: {e}")
+    
+    def url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f"{self.api_url}/{path.lstrip('/')}"
+    
+    def retry_delay(self, response, attempt, method='GET'):
+        """
+        Seconds to wait before retrying a response, or None if it should not be retried.
+        
+        Args:
+            response: Response, or None if the request raised a connection error
+            attempt: Number of the attempt that just failed, from 0
+            method: HTTP method of the request; see NON_IDEMPOTENT_METHODS
+        """
+        backoff = min(MAX_BACKOFF_S, 2 ** attempt)
+        if response is None or response.status_code >= 500:
+            return None if method in NON_IDEMPOTENT_METHODS else backoff
+        if response.status_code in (403, 429):
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                return min(MAX_BACKOFF_S, float(retry_after))
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                reset = float(response.headers.get('X-RateLimit-Reset', 0))
+                return min(MAX_BACKOFF_S, max(1.0, reset - time.time()))
+            if response.status_code == 429:
+                return backoff
+        return None
+    
+    def request(self, method, path, **kwargs):
+        """
+        Make an API request, retrying rate limits, server errors and connection errors
+        (only rate limits for NON_IDEMPOTENT_METHODS).
+        
+        Args:
+            method: HTTP method
+            path: API path or absolute URL
+            **kwargs: Passed to requests.Session.request
+            
+        Returns:
+            The final response
+            
+        Raises:
+            requests.RequestException: If the last attempt could not connect
+        """
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT_S)
+        url = self.url(path)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                self.request_count += 1
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                if attempt == self.max_retries or method in NON_IDEMPOTENT_METHODS:
+                    raise
+                log(f"{method} {url} failed: {e}")
+            delay = self.retry_delay(response, attempt, method) if attempt < self.max_retries else None
+            if delay is None:
+                return response
+            log(f"Retrying {method} {url} in {delay:.0f}s"
+                + (f" (HTTP {response.status_code})" if response is not None else ""))
+            self.sleep(delay)
+        return response
+    
+    def get_json(self, path, params=None):
+        """
+        GET one page, conditionally if an earlier copy is cached.
+        
+        Returns:
+            Tuple of (decoded body, URL of the next page or None)
+            
+        Raises:
+            GitHubError: On an unexpected status
+        """
+        url = self.url(path)
+        if params:
+            url = requests.Request('GET', url, params=params).prepare().url
+        cached = self.etag_cache.get(url)
+        headers = {'If-None-Match': cached['etag']} if cached else {}
+        response = self.request('GET', url, headers=headers)
+        
+        if response.status_code == 304 and cached:
+            return cached['body'], cached.get('next')
+        if response.status_code != 200:
+            raise GitHubError(response.status_code, response.text)
+        
+        body = response.json()
+        next_url = (response.links.get('next') or {}).get('url')
+        etag = response.headers.get('ETag')
+        if etag:
+            self.etag_cache.pop(url, None)
+            self.etag_cache[url] = {'etag': etag, 'body': body, 'next': next_url}
+            self.etag_cache_changed = True
+        return body, next_url
+    
+    def iter_paginated(self, path, params=None):
+        """Yield the items of a listing, fetching pages as they are consumed."""
+        url, page_params = path, dict(params or {}, per_page=PER_PAGE)
+        while url:
+            items, url = self.get_json(url, page_params)
+            # The next-page URL already carries the query
+            page_params = None
+            yield from items
+    
+    def find_issue_comment(self, repo, number, marker=COMMENT_MARKER):
+        """
+        Find the first comment on an issue or PR containing a marker.
+        
+        Returns:
+            The comment, or None if there is none
+        """
+        for comment in self.iter_paginated(f"repos/{repo}/issues/{number}/comments"):
+            if marker in (comment.get('body') or ''):
+                return comment
+        return None
+    
+    def create_issue_comment(self, repo, number, body):
+        return self.request('POST', f"repos/{repo}/issues/{number}/comments", json={'body': body})
+    
+    def update_issue_comment(self, repo, comment_id, body):
+        return self.request('PATCH', f"repos/{repo}/issues/comments/{comment_id}", json={'body': body})
+
+def find_created_comment(client, repo, pr_number, comment_body):
+    """
+    Look for a coverage comment a failed create may have posted after all.
+    
+    Returns:
+        "created" if the PR holds a coverage comment with this body, else None
+    """
+    try:
+        existing = client.find_issue_comment(repo, pr_number)
+    except (GitHubError, requests.RequestException) as e:
+        log(f"Error checking whether the comment was created: {e}")
+        return None
+    if existing and existing.get('body') == comment_body:
+        log(f"Comment {existing['id']} was created despite the error")
+        return 'created'
+    return None
+
+def post_comment(comment_path, pr_number, repo, token=None, client=None):
     """
-    Post a comment to a GitHub PR.
+    Post a comment to a GitHub PR, or update the coverage comment already on it.
     
     Args:
         comment_path: Path to the file containing the comment text
         pr_number: PR number
         repo: Repository in the format "owner/repo"
         token: GitHub token
+        client: GitHubClient to use (default: a new one, closed afterwards)
+        
+    Returns:
+        "created", "updated" or "unchanged", or None if the comment could not be posted
     """
     if not file_exists(comment_path):
         log(f"Error: Comment file {comment_path} does not exist")
-        return
+        return None
     
     with open(comment_path, 'r') as f:
         comment_body = f.read()
     
-    if not token:
-        token = os.environ.get('GITHUB_TOKEN')
+    if client is None:
         if not token:
-            log("Error: GitHub token not provided")
-            return
+            token = os.environ.get('GITHUB_TOKEN')
+            if not token:
+                log("Error: GitHub token not provided")
+                return None
+        with GitHubClient(token) as own_client:
+            return post_comment(comment_path, pr_number, repo, client=own_client)
+    
+    # Find existing comment with our identifier, on any page
+    log(f"Looking for an existing coverage report comment on {repo}#{pr_number}")
+    try:
+        existing = client.find_issue_comment(repo, pr_number)
+    except GitHubError as e:
+        log(f"Error getting comments: {e}")
+        return None
     
-    # Find existing comment
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    # Get all comments
-    comments_url = f'https://api.github.com/repos/{repo}/issues/{pr_number}/comments'
-    log(f"Getting comments from: {comments_url}")
-    response = requests.get(comments_url, headers=headers)
-    
-    if response.status_code != 200:
-        log(f"Error getting comments: {response.status_code} - {response.text}")
-        return
-    
-    comments = response.json()
-    log(f"Found {len(comments)} existing comments")
-    
-    # Find comment with our identifier
-    comment_id = None
-    for comment in comments:
-        if '<!-- COVERAGE_REPORT -->' in comment['body']:
-            comment_id = comment['id']
-            log(f"Found existing coverage report comment with ID: {comment_id}")
-            break
-    
-    if comment_id:
-        # Update existing comment
-        update_url = f'https://api.github.com/repos/{repo}/issues/comments/{comment_id}'
-        log(f"Updating existing comment at: {update_url}")
-        response = requests.patch(update_url, headers=headers, json={'body': comment_body})
+    outcome = None
+    new_hash = comment_hash(comment_body)
+    if existing and new_hash and comment_hash(existing.get('body')) == new_hash:
+        # Same report as last time: don't rewrite the comment or notify anyone
+        log(f"Coverage report unchanged (hash {new_hash}), not updating comment {existing['id']}")
+        outcome = 'unchanged'
+    elif existing:
+        comment_id = existing['id']
+        log(f"Updating existing coverage report comment: {comment_id}")
+        response = client.update_issue_comment(repo, comment_id, comment_body)
         
         if response.status_code == 200:
             log(f"Successfully updated existing comment: {comment_id}")
+            outcome = 'updated'
         else:
             log(f"Error updating comment: {response.status_code} - {response.text}")
     else:
-        # Create new comment
-        log(f"Creating new comment at: {comments_url}")
-        response = requests.post(comments_url, headers=headers, json={'body': comment_body})
+        log(f"Creating new comment on {repo}#{pr_number}")
+        try:
+            response = client.create_issue_comment(repo, pr_number, comment_body)
+        except requests.RequestException as e:
+            log(f"Error creating comment: {e}")
+            response = None
         
-        if response.status_code == 201:
+        if response is not None and response.status_code == 201:
             log("Successfully created new comment")
+            outcome = 'created'
         else:
-            log(f"Error creating comment: {response.status_code} - {response.text}")
+            if response is not None:
+                log(f"Error creating comment: {response.status_code} - {response.text}")
+            # The POST isn't resent, as GitHub may have created the comment before failing
+            if response is None or response.status_code >= 500:
+                outcome = find_created_comment(client, repo, pr_number, comment_body)
+    log(f"GitHub API requests made: {client.request_count}")
+    return outcome
+
+class CommentPost:
+    """
+    post_comment running on a background thread, so the workflow can write its outputs meanwhile.
+    
+    The thread is a daemon: if GitHub is still not answering when the wait runs out,
+    the process exits without it.
+    """
+
+    def __init__(self, comment_path, pr_number, repo, token=None):
+        self.label = f"{repo}#{pr_number}"
+        self.outcome = None
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._post, args=(comment_path, pr_number, repo, token), name='post-comment', daemon=True
+        )
+        self._thread.start()
+
+    def _post(self, comment_path, pr_number, repo, token):
+        try:
+            with phase("post comment"):
+                self.outcome = post_comment(comment_path, pr_number, repo, token)
+        except Exception as e:
+            self.error = e
+            log(f"Error posting comment to {self.label}: {e}")
+
+    def wait(self, timeout=None):
+        """
+        Wait for the post to finish.
+        
+        Args:
+            timeout: Seconds to wait at most (default: COMMENT_POST_TIMEOUT_S)
+            
+        Returns:
+            The outcome of post_comment, "timeout" if it is still running, or None if it failed
+        """
+        self._thread.join(COMMENT_POST_TIMEOUT_S if timeout is None else timeout)
+        if self._thread.is_alive():
+            log(f"Comment post to {self.label} did not finish in time; exiting without waiting for it")
+            return 'timeout'
+        return self.outcome
 
 def set_github_output(name, value):
     """
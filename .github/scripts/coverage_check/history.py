@@ -0,0 +1,304 @@
+"""
+Coverage history module.
+This module appends every measured coverage result to a SQLite database keyed by commit,
+branch and target, and answers the lookups the workflow needs: an already measured base
+commit, the trend over the last base commits for the PR comment, and the test impact map
+of the latest base run.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from .cache import DEFAULT_CACHE_DIR
+from .reports import CoverageReport, CoverageCounts, METRICS
+from .util import log
+
+# Kept in the cache directory, so actions/cache carries it from run to run
+DEFAULT_HISTORY_DB = os.path.join(DEFAULT_CACHE_DIR, 'coverage_history.db')
+
+# Base commits shown in the comment's trend table
+DEFAULT_TREND_COMMITS = 10
+
+# Bump and append a statement list when the schema changes; applied in order via PRAGMA user_version
+SCHEMA = [
+    [
+        """CREATE TABLE IF NOT EXISTS coverage_runs (
+            run_id INTEGER PRIMARY KEY,
+            commit_sha TEXT NOT NULL,
+            branch TEXT NOT NULL,
+            target TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            pr_number INTEGER,
+            lines_pct REAL NOT NULL,
+            statements_pct REAL,
+            branches_pct REAL,
+            functions_pct REAL,
+            recorded_at TEXT NOT NULL,
+            UNIQUE (commit_sha, branch, target, kind)
+        )""",
+        """CREATE TABLE IF NOT EXISTS file_coverage (
+            run_id INTEGER NOT NULL REFERENCES coverage_runs(run_id) ON DELETE CASCADE,
+            path TEXT NOT NULL,
+            """ + ",\n            ".join(f"{metric}_covered INTEGER NOT NULL, {metric}_total INTEGER NOT NULL"
+                                         for metric in METRICS) + """,
+            PRIMARY KEY (run_id, path)
+        ) WITHOUT ROWID""",
+        # Trend query: latest base runs of one branch and target
+        "CREATE INDEX IF NOT EXISTS idx_coverage_runs_trend ON coverage_runs(branch, target, kind, recorded_at DESC)",
+        # Baseline lookup: has this commit already been measured
+        "CREATE INDEX IF NOT EXISTS idx_coverage_runs_commit ON coverage_runs(commit_sha, target, kind)",
+    ],
+    [
+        # Source file -> test files that execute it; test '' records a source no test executes
+        """CREATE TABLE IF NOT EXISTS test_impact (
+            run_id INTEGER NOT NULL REFERENCES coverage_runs(run_id) ON DELETE CASCADE,
+            source TEXT NOT NULL,
+            test TEXT NOT NULL,
+            PRIMARY KEY (run_id, source, test)
+        ) WITHOUT ROWID""",
+    ],
+]
+
+class CoverageHistory:
+    """
+    SQLite store of measured coverage.
+
+    Each (commit, branch, target, kind) has one run; recording it again replaces
+    the earlier measurement and its per-file rows.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_HISTORY_DB):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def migrate(self) -> None:
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(SCHEMA[version:], start=version + 1):
+            with self.conn:
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+
+    def record(self, commit: str, branch: str, target: str, lines_pct: float, kind: str = 'base',
+               report: Optional[CoverageReport] = None, pr_number: Optional[int] = None) -> int:
+        """
+        Record one target's coverage for a commit.
+
+        Args:
+            commit: Commit SHA that was measured
+            branch: Branch the commit was measured for (the base branch, or the PR's head ref)
+            target: Coverage target name
+            lines_pct: Line coverage percentage
+            kind: "base" or "pr"
+            report: Structured report with per-file counts (optional)
+            pr_number: PR the measurement was made for (optional)
+
+        Returns:
+            run_id of the stored run
+        """
+        total = report.total if report else None
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM coverage_runs WHERE commit_sha = ? AND branch = ? AND target = ? AND kind = ?",
+                (commit, branch, target, kind)
+            )
+            cursor = self.conn.execute(
+                """INSERT INTO coverage_runs (commit_sha, branch, target, kind, pr_number, lines_pct,
+                       statements_pct, branches_pct, functions_pct, recorded_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (commit, branch, target, kind, pr_number, lines_pct,
+                 total.pct('statements') if total else None,
+                 total.pct('branches') if total else None,
+                 total.pct('functions') if total else None,
+                 datetime.now().isoformat())
+            )
+            run_id = cursor.lastrowid
+            if report:
+                columns = [f"{metric}_{field}" for metric in METRICS for field in ('covered', 'total')]
+                self.conn.executemany(
+                    f"INSERT INTO file_coverage (run_id, path, {', '.join(columns)}) "
+                    f"VALUES (?, ?, {', '.join('?' for _ in columns)})",
+                    ((run_id, path, *(getattr(counts, column) for column in columns))
+                     for path, counts in report.files.items())
+                )
+        return run_id
+
+    def measured(self, commit: str, target: str, kind: str = 'base') -> Optional[float]:
+        """
+        Line coverage already recorded for a commit, if any.
+
+        Args:
+            commit: Commit SHA
+            target: Coverage target name
+            kind: "base" or "pr"
+
+        Returns:
+            Latest recorded percentage, or None if the commit was never measured
+        """
+        row = self.conn.execute(
+            """SELECT lines_pct FROM coverage_runs
+               WHERE commit_sha = ? AND target = ? AND kind = ?
+               ORDER BY recorded_at DESC LIMIT 1""",
+            (commit, target, kind)
+        ).fetchone()
+        return row['lines_pct'] if row else None
+
+    def trend(self, branch: str, target: str, limit: int = DEFAULT_TREND_COMMITS) -> List[sqlite3.Row]:
+        """
+        Latest base measurements of a branch, newest first.
+
+        Args:
+            branch: Base branch name
+            target: Coverage target name
+            limit: Most commits returned
+
+        Returns:
+            Rows with commit_sha, lines_pct and recorded_at
+        """
+        return self.conn.execute(
+            """SELECT commit_sha, lines_pct, recorded_at FROM coverage_runs
+               WHERE branch = ? AND target = ? AND kind = 'base'
+               ORDER BY recorded_at DESC LIMIT ?""",
+            (branch, target, limit)
+        ).fetchall()
+
+    def file_coverage(self, commit: str, target: str, kind: str = 'base') -> Dict[str, sqlite3.Row]:
+        """Per-file counts recorded for a commit, keyed by path."""
+        rows = self.conn.execute(
+            """SELECT f.* FROM file_coverage f JOIN coverage_runs r ON r.run_id = f.run_id
+               WHERE r.commit_sha = ? AND r.target = ? AND r.kind = ?""",
+            (commit, target, kind)
+        ).fetchall()
+        return {row['path']: row for row in rows}
+
+    def run_file_counts(self, run_id: int) -> Dict[str, CoverageCounts]:
+        """Per-file counts of a run, keyed by path."""
+        files = {}
+        for row in self.conn.execute("SELECT * FROM file_coverage WHERE run_id = ?", (run_id,)):
+            counts = CoverageCounts()
+            for metric in METRICS:
+                counts.add(metric, row[f"{metric}_covered"], row[f"{metric}_total"])
+            files[row['path']] = counts
+        return files
+
+    def record_test_impact(self, run_id: int, impact_map: Dict[str, Set[str]]) -> None:
+        """
+        Store the test impact map measured by a run.
+
+        Args:
+            run_id: Run returned by record
+            impact_map: Source path -> test files that execute it (see impact.build_impact_map)
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM test_impact WHERE run_id = ?", (run_id,))
+            self.conn.executemany(
+                "INSERT INTO test_impact (run_id, source, test) VALUES (?, ?, ?)",
+                ((run_id, source, test) for source, tests in impact_map.items() for test in (tests or ['']))
+            )
+
+    def latest_impact_run(self, branch: str, target: str) -> Optional[sqlite3.Row]:
+        """
+        Latest base run of a branch that has a test impact map.
+
+        Returns:
+            Row with run_id, commit_sha and lines_pct, or None
+        """
+        return self.conn.execute(
+            """SELECT run_id, commit_sha, lines_pct FROM coverage_runs r
+               WHERE branch = ? AND target = ? AND kind = 'base'
+                 AND EXISTS (SELECT 1 FROM test_impact t WHERE t.run_id = r.run_id)
+               ORDER BY recorded_at DESC LIMIT 1""",
+            (branch, target)
+        ).fetchone()
+
+    def test_impact(self, run_id: int) -> Dict[str, Set[str]]:
+        """Test impact map stored for a run."""
+        impact_map: Dict[str, Set[str]] = {}
+        for row in self.conn.execute("SELECT source, test FROM test_impact WHERE run_id = ?", (run_id,)):
+            tests = impact_map.setdefault(row['source'], set())
+            if row['test']:
+                tests.add(row['test'])
+        return impact_map
+
+    def targets(self, branch: str) -> List[str]:
+        """Targets with base measurements on a branch."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT target FROM coverage_runs WHERE branch = ? AND kind = 'base' ORDER BY target", (branch,)
+        ).fetchall()
+        return [row['target'] for row in rows]
+
+    def branch_trend(self, branch: str, limit: int = DEFAULT_TREND_COMMITS,
+                     targets: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Trend of every target over the last base commits of a branch, for the PR comment.
+
+        Args:
+            branch: Base branch name
+            limit: Most commits returned
+            targets: Target names to include (default: every target measured on the branch)
+
+        Returns:
+            Dicts with commit, recorded_at and one percentage per target, newest first
+        """
+        commits: Dict[str, Dict] = {}
+        for target in targets if targets is not None else self.targets(branch):
+            for row in self.trend(branch, target, limit):
+                entry = commits.setdefault(row['commit_sha'], {'commit': row['commit_sha'], 'recorded_at': row['recorded_at']})
+                entry[target] = row['lines_pct']
+                entry['recorded_at'] = max(entry['recorded_at'], row['recorded_at'])
+        return sorted(commits.values(), key=lambda entry: entry['recorded_at'], reverse=True)[:limit]
+
+def format_trend(trend: List[Dict], labels: Optional[Dict[str, str]] = None) -> str:
+    """
+    Render the base branch trend as a collapsed markdown section for the PR comment.
+
+    Args:
+        trend: Result of CoverageHistory.branch_trend
+        labels: Column title of each target, in column order (default: every target in the trend)
+
+    Returns:
+        Markdown text, empty if there is no history
+    """
+    if not trend:
+        return ''
+    if labels is None:
+        names = sorted({key for entry in trend for key in entry} - {'commit', 'recorded_at'})
+        labels = {name: name.replace('_', ' ').title() for name in names}
+
+    def cell(value):
+        return f"{value:.2f}%" if value is not None else '-'
+
+    section = f'<details>\n<summary>Base branch coverage trend (last {len(trend)} commits)</summary>\n\n'
+    section += '| Commit | ' + ''.join(f'{label} | ' for label in labels.values()) + 'Measured |\n'
+    section += '| --- | ' + '---: | ' * len(labels) + '--- |\n'
+    for entry in trend:
+        cells = ''.join(f"{cell(entry.get(name))} | " for name in labels)
+        section += f"| `{entry['commit'][:8]}` | {cells}{entry['recorded_at'][:16].replace('T', ' ')} |\n"
+    return section + '\n</details>\n\n'
+
+def open_history(db_path: Optional[str]) -> Optional[CoverageHistory]:
+    """Open the history database, or return None (and log why) if it can't be used."""
+    if not db_path:
+        return None
+    try:
+        return CoverageHistory(db_path)
+    except sqlite3.Error as e:
+        log(f"Coverage history unavailable ({db_path}): {e}")
+        return None
@@ -0,0 +1,291 @@
+"""
+Test impact module.
+This module maps each source file to the test files that execute it, built from the
+coverage reports of sharded runs, and uses that map to pick the tests a diff can affect.
+A commit close to an already measured one then reruns only those tests and takes every
+other file's coverage from the earlier measurement.
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .patch import parse_diff, affects_coverage
+from .reports import CoverageReport, CoverageCounts, iter_json_object, file_coverage_from_istanbul
+from .util import log, run_command
+
+# Shards a full run is split into when it collects the impact map; each shard's test
+# files are mapped to everything the shard executed, so more shards give a finer map
+IMPACT_SHARDS = 8
+
+# Test file names, in source or compiled form
+TEST_FILE_PATTERN = re.compile(r'\.(test|spec)\.[cm]?[jt]sx?$')
+
+def relative_path(path: str, root: Optional[str] = None) -> str:
+    """Repository-relative form of a coverage report path (absolute paths outside root are kept)."""
+    root = os.path.abspath(root or '.')
+    if os.path.isabs(path):
+        relative = os.path.relpath(path, root)
+        if relative.startswith('..'):
+            return path.replace('\\', '/')
+        path = relative
+    return path.replace('\\', '/')
+
+def relativize_report(report: CoverageReport, root: Optional[str] = None) -> CoverageReport:
+    """Copy of a report keyed by repository-relative paths, so runs in different checkouts compare."""
+    relative = CoverageReport(report.source)
+    for path, counts in report.files.items():
+        relative.add_file(relative_path(path, root), counts)
+    relative.total = report.total
+    return relative
+
+def executed_sources(coverage_final: str, root: Optional[str] = None) -> Tuple[Set[str], Set[str]]:
+    """
+    Sources a run executed, from its coverage-final.json.
+
+    Args:
+        coverage_final: Path to the run's coverage-final.json
+        root: Repository root the run's paths are under
+
+    Returns:
+        Tuple of (executed, instrumented) repository-relative paths
+    """
+    executed, instrumented = set(), set()
+    for key, entry in iter_json_object(coverage_final):
+        path = relative_path(entry.get('path', key), root)
+        instrumented.add(path)
+        if any((entry.get('s') or {}).values()) or any((entry.get('f') or {}).values()):
+            executed.add(path)
+    return executed, instrumented
+
+def build_impact_map(shard_runs: Iterable[Tuple[List[str], str]], root: Optional[str] = None) -> Dict[str, Set[str]]:
+    """
+    Map sources to the tests that execute them.
+
+    Args:
+        shard_runs: (test files, coverage-final.json) of each shard
+        root: Repository root the shards ran under
+
+    Returns:
+        Dict of repository-relative source path to the set of test files (relative to the
+        target's directory) whose shard executed it; instrumented sources no shard
+        executed map to an empty set, so a change to them is known to affect no test
+    """
+    impact: Dict[str, Set[str]] = {}
+    for tests, coverage_final in shard_runs:
+        executed, instrumented = executed_sources(coverage_final, root)
+        for source in instrumented:
+            impact.setdefault(source, set())
+        for source in executed:
+            impact[source].update(tests)
+    return impact
+
+def update_impact_map(previous: Dict[str, Set[str]], rerun: Dict[str, Set[str]], rerun_tests: Iterable[str],
+                      tests: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    Carry an impact map forward after rerunning some of its tests.
+
+    Args:
+        previous: Map of the reference run
+        rerun: Map built from the rerun shards
+        rerun_tests: Tests that were rerun; their old entries are replaced
+        tests: Every test file that exists now; entries of deleted tests are dropped
+
+    Returns:
+        The updated map
+    """
+    replaced = set(rerun_tests)
+    existing = set(tests)
+    updated = {source: {test for test in mapped if test not in replaced and test in existing}
+               for source, mapped in previous.items()}
+    for source, mapped in rerun.items():
+        updated.setdefault(source, set()).update(mapped)
+    return updated
+
+class ImpactPlan:
+    """Tests to rerun for a diff, or the reason the whole target has to run."""
+
+    def __init__(self):
+        self.tests: Set[str] = set()
+        self.deleted_sources: Set[str] = set()
+        self.full_reason: Optional[str] = None
+
+    @property
+    def full(self) -> bool:
+        return self.full_reason is not None
+
+def owns_path(path: str, target_dir: str, other_dirs: Iterable[str]) -> bool:
+    """Whether a repository-relative path belongs to a target, rather than to a target nested in it."""
+    def under(directory):
+        return directory == '.' or path.startswith(directory.rstrip('/') + '/')
+    if not under(target_dir):
+        return False
+    return not any(under(other) and len(other) > len(target_dir) for other in other_dirs if other != '.')
+
+def under_inputs(path: str, inputs: Iterable[str]) -> bool:
+    """Whether a repository-relative path is one of a target's declared inputs or inside one."""
+    return any(path == entry or path.startswith(entry.rstrip('/') + '/') for entry in inputs)
+
+def is_target_input(path: str, target, targets) -> bool:
+    """
+    Whether a repository-relative path can change a target's coverage: the target owns it
+    (see owns_path), or it is under one of the inputs the target declares outside its directory.
+    """
+    if not affects_coverage(path):
+        return False
+    directory = target.cwd.replace(os.sep, '/')
+    other_dirs = [other.cwd.replace(os.sep, '/') for other in targets if other.name != target.name]
+    return owns_path(path, directory, other_dirs) or under_inputs(path, target.inputs)
+
+def match_test_file(path: str, tests: Set[str]) -> Optional[str]:
+    """Test file (relative to the target's directory) a changed test source runs as, e.g. its compiled .js."""
+    if path in tests:
+        return path
+    stem = os.path.splitext(path)[0]
+    for test in sorted(tests):
+        test_stem = os.path.splitext(test)[0]
+        if test_stem == stem or test_stem.endswith('/' + stem):
+            return test
+    return None
+
+def plan_tests(impact_map: Dict[str, Set[str]], tests: List[str], changes: Dict[str, list], target_dir: str,
+               other_dirs: Iterable[str] = (), root: Optional[str] = None, inputs: Iterable[str] = ()) -> ImpactPlan:
+    """
+    Pick the tests a diff can affect.
+
+    A changed source selects the tests that execute it. A changed or deleted test
+    selects every test sharing a source with it, since that source's coverage changes
+    with it and can only be recounted by running all of its tests.
+
+    Args:
+        impact_map: Map of the reference run, from build_impact_map
+        tests: Test files of the target now, relative to target_dir
+        changes: Diff since the reference run, from parse_diff
+        target_dir: The target's directory, relative to the repository root
+        other_dirs: Directories of the other targets, whose files this target doesn't own
+        root: Repository root the diff applies to (default: current directory)
+        inputs: Paths outside target_dir the target builds from (CoverageTarget.inputs); other
+            files the target doesn't own can't affect it
+
+    Returns:
+        ImpactPlan; full_reason is set when a change can't be traced through the map
+        (new sources or test files, configuration, build files, declared inputs the run
+        didn't instrument), since any test could depend on it
+    """
+    plan = ImpactPlan()
+    test_set = set(tests)
+    mapped_tests = set().union(*impact_map.values()) if impact_map else set()
+    changed_tests = set()
+    for path in sorted(changes):
+        owned = owns_path(path, target_dir, other_dirs)
+        if not affects_coverage(path) or not (owned or under_inputs(path, inputs)):
+            continue
+        exists = os.path.exists(os.path.join(root or '.', path))
+        relative = path if target_dir == '.' else os.path.relpath(path, target_dir).replace(os.sep, '/')
+        if path in impact_map:
+            plan.tests.update(impact_map[path])
+            if not exists:
+                plan.deleted_sources.add(path)
+        elif owned and TEST_FILE_PATTERN.search(path):
+            test = match_test_file(relative, mapped_tests | test_set)
+            if test is None and exists:
+                plan.full_reason = f"new test file {path}"
+                return plan
+            if test is not None:
+                changed_tests.add(test)
+        else:
+            plan.full_reason = f"{path} is not in the impact map"
+            return plan
+    for mapped in impact_map.values():
+        if mapped & changed_tests:
+            plan.tests.update(mapped)
+    plan.tests.update(changed_tests)
+    # Only tests that still exist can run
+    plan.tests &= test_set
+    return plan
+
+def changes_since(commit: str, cwd: Optional[str] = None) -> Optional[Dict[str, list]]:
+    """
+    Diff of the checkout in cwd against an earlier commit.
+
+    Unlike a PR diff this compares the two trees directly, so it also holds when the
+    earlier commit is no ancestor (e.g. after a force push).
+
+    Returns:
+        Result of parse_diff, or None if the commit is not available here
+    """
+    returncode, stdout, stderr = run_command(
+        ['git', 'diff', '--unified=0', '--no-color', '--no-ext-diff', commit, 'HEAD'], cwd=cwd
+    )
+    if returncode != 0:
+        log(f"Could not diff against {commit[:12]}: {stderr.strip()}")
+        return None
+    return parse_diff(stdout)
+
+def combine_file_counts(reference: Dict[str, CoverageCounts], rerun: CoverageReport, plan: ImpactPlan,
+                        impact_map: Dict[str, Set[str]]) -> CoverageReport:
+    """
+    Coverage of the whole target from a reference run and a rerun of the affected tests.
+
+    A source whose tests (per the reference map) all reran takes its counts from the
+    rerun, which covers every changed source. Any other source keeps the reference
+    counts: tests that were not rerun also execute it, so the rerun alone would
+    undercount it.
+
+    Args:
+        reference: Per-file counts of the reference run, by repository-relative path
+        rerun: Relativized report of the rerun (empty if nothing was rerun)
+        plan: The plan the rerun followed
+        impact_map: Map of the reference run
+
+    Returns:
+        CoverageReport of the target
+    """
+    def rerun_counts(path):
+        return path in rerun.files and impact_map.get(path, set()) <= plan.tests
+
+    combined = CoverageReport(f"reference run plus {len(plan.tests)} rerun tests")
+    for path, counts in reference.items():
+        if path not in plan.deleted_sources and not rerun_counts(path):
+            combined.add_file(path, counts)
+    for path, counts in rerun.files.items():
+        if path not in reference or rerun_counts(path):
+            combined.add_file(path, counts)
+    return combined
+
+def file_counts_report(coverage_final: str, root: Optional[str] = None) -> CoverageReport:
+    """Relativized per-file counts of a coverage-final.json."""
+    report = CoverageReport(coverage_final)
+    for key, entry in iter_json_object(coverage_final):
+        report.add_file(relative_path(entry.get('path', key), root), file_coverage_from_istanbul(entry))
+    return report
+
+class ImpactTracker:
+    """
+    Test impact state of one base branch run: the reference runs read from the history
+    before the targets start, and the maps and counts measured for the history to store.
+
+    The history is only touched from the thread that created it (SQLite connections
+    are not shared across threads); the targets running concurrently only read
+    references and fill in results.
+    """
+
+    def __init__(self, history, branch: str, targets, shards: int = IMPACT_SHARDS):
+        self.branch = branch
+        self.shards = shards
+        self.target_dirs = [target.cwd for target in targets]
+        # Target name -> (commit, impact map, per-file counts) of the latest base run with a map
+        self.references: Dict[str, Tuple[str, Dict[str, Set[str]], Dict[str, CoverageCounts]]] = {}
+        for target in targets:
+            row = history.latest_impact_run(branch, target.name)
+            if row:
+                self.references[target.name] = (
+                    row['commit_sha'], history.test_impact(row['run_id']), history.run_file_counts(row['run_id'])
+                )
+        # Target name -> map and relativized report measured by this run
+        self.maps: Dict[str, Dict[str, Set[str]]] = {}
+        self.reports: Dict[str, CoverageReport] = {}
+
+    def store(self, target_name: str, impact_map: Dict[str, Set[str]], report: CoverageReport) -> None:
+        self.maps[target_name] = impact_map
+        self.reports[target_name] = report
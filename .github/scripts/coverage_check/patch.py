@@ -0,0 +1,243 @@
+"""
+Patch coverage module.
+This module intersects per-line coverage data with the lines a PR changes, so the
+comment can show how well the new code itself is tested.
+"""
+
+import os
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from .util import log, run_command
+
+# Changes to these files can't move coverage
+NON_CODE_EXTENSIONS = {'.md', '.mdx', '.txt', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp'}
+NON_CODE_DIRS = ('docs/', 'old_docs/', '.changeset/')
+
+# @@ -old_start[,old_count] +new_start[,new_count] @@
+HUNK_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+# Most files listed in the comment
+MAX_COMMENT_FILES = 20
+
+def parse_diff(diff_text: str) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Parse a zero-context unified diff into the added line ranges of each file.
+
+    Args:
+        diff_text: Output of git diff --unified=0
+
+    Returns:
+        Dict of repository-relative path to sorted, merged (start, end) inclusive line ranges
+        in the new file. Files whose changes are pure deletions map to an empty list.
+    """
+    changes: Dict[str, List[Tuple[int, int]]] = {}
+    current = None
+    in_header = False
+    for line in diff_text.splitlines():
+        if line.startswith('diff --git '):
+            # Every touched file counts, including deletions, renames and binary files
+            current = line.split(' b/', 1)[-1]
+            changes.setdefault(current, [])
+            in_header = True
+        elif in_header:
+            if line.startswith('+++ '):
+                target = line[4:].strip()
+                if target != '/dev/null':
+                    current = target[2:] if target.startswith('b/') else target
+                    changes.setdefault(current, [])
+                in_header = False
+            elif line.startswith('@@'):
+                in_header = False
+        elif line.startswith('@@'):
+            match = HUNK_PATTERN.match(line)
+            if not match:
+                continue
+            start = int(match.group(1))
+            count = int(match.group(2)) if match.group(2) is not None else 1
+            if count:
+                changes[current].append((start, start + count - 1))
+    return {path: merge_ranges(ranges) for path, ranges in changes.items()}
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort inclusive ranges and merge overlapping or adjacent ones."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def get_changed_lines(base_ref: str, head_ref: str = 'HEAD', cwd: Optional[str] = None) -> Optional[Dict[str, List[Tuple[int, int]]]]:
+    """
+    Get the lines changed on head_ref since it branched off base_ref.
+
+    Args:
+        base_ref: Base ref, e.g. origin/main (must already be fetched)
+        head_ref: PR ref
+        cwd: Repository directory (default: current directory)
+
+    Returns:
+        Result of parse_diff, or None if git fails
+    """
+    returncode, stdout, stderr = run_command(['git', 'merge-base', base_ref, head_ref], cwd=cwd)
+    if returncode != 0:
+        log(f"Could not find the merge base of {base_ref} and {head_ref}: {stderr.strip()}")
+        return None
+    merge_base = stdout.strip()
+
+    returncode, stdout, stderr = run_command(
+        ['git', 'diff', '--unified=0', '--no-color', '--no-ext-diff', merge_base, head_ref], cwd=cwd
+    )
+    if returncode != 0:
+        log(f"git diff failed: {stderr.strip()}")
+        return None
+    changes = parse_diff(stdout)
+    log(f"Diff against {base_ref}: {len(changes)} files, {count_changed_lines(changes)} changed lines")
+    return changes
+
+def count_changed_lines(changes: Dict[str, List[Tuple[int, int]]]) -> int:
+    return sum(end - start + 1 for ranges in changes.values() for start, end in ranges)
+
+def affects_coverage(path: str) -> bool:
+    """Whether a change to this file could change measured coverage."""
+    if path.startswith(NON_CODE_DIRS):
+        return False
+    return os.path.splitext(path)[1].lower() not in NON_CODE_EXTENSIONS
+
+def is_coverage_neutral(changes: Dict[str, List[Tuple[int, int]]]) -> bool:
+    """
+    Whether a diff cannot change coverage, so base coverage equals PR coverage.
+
+    Args:
+        changes: Result of parse_diff
+
+    Returns:
+        True if no changed file could affect coverage (including an empty diff)
+    """
+    return not any(affects_coverage(path) for path in changes)
+
+def match_paths(coverage_paths, changed_paths, root: Optional[str] = None) -> Dict[str, str]:
+    """
+    Map coverage report paths to repository-relative diff paths.
+
+    Reports usually hold absolute paths from the machine that ran the tests, which
+    need not be this checkout, so a path relative to root is tried first and then
+    the longest diff path that is a suffix of it.
+
+    Args:
+        coverage_paths: Paths from a coverage report
+        changed_paths: Paths from parse_diff
+        root: Repository root on this machine (default: current directory)
+
+    Returns:
+        Dict of coverage path to diff path, for the coverage paths that were changed
+    """
+    root = os.path.abspath(root or '.')
+    changed = set(changed_paths)
+    by_name: Dict[str, List[str]] = {}
+    for path in changed:
+        by_name.setdefault(os.path.basename(path), []).append(path)
+
+    matches = {}
+    for coverage_path in coverage_paths:
+        normalized = coverage_path.replace('\\', '/')
+        if os.path.isabs(coverage_path):
+            relative = os.path.relpath(coverage_path, root).replace('\\', '/')
+            if relative in changed:
+                matches[coverage_path] = relative
+                continue
+        elif normalized in changed:
+            matches[coverage_path] = normalized
+            continue
+        candidates = [path for path in by_name.get(os.path.basename(normalized), [])
+                      if normalized.endswith('/' + path) or normalized == path]
+        if candidates:
+            matches[coverage_path] = max(candidates, key=len)
+    return matches
+
+class PatchCoverage:
+    """Covered and uncovered changed lines per file."""
+
+    def __init__(self):
+        self.files: Dict[str, Dict[str, List[int]]] = {}
+
+    def add(self, path: str, covered: List[int], uncovered: List[int]) -> None:
+        entry = self.files.setdefault(path, {'covered': [], 'uncovered': []})
+        entry['covered'].extend(covered)
+        entry['uncovered'].extend(uncovered)
+
+    @property
+    def covered(self) -> int:
+        return sum(len(entry['covered']) for entry in self.files.values())
+
+    @property
+    def total(self) -> int:
+        return sum(len(entry['covered']) + len(entry['uncovered']) for entry in self.files.values())
+
+    def pct(self) -> Optional[float]:
+        return round(100.0 * self.covered / self.total, 2) if self.total else None
+
+def compute_patch_coverage(line_hits: Dict[str, Dict[int, int]], changes: Dict[str, List[Tuple[int, int]]],
+                           root: Optional[str] = None) -> PatchCoverage:
+    """
+    Intersect per-line hit counts with changed line ranges.
+
+    Each file's code lines are sorted once, and every changed range is located
+    with two binary searches, so the cost is O((code lines + ranges) log n)
+    per file regardless of how large the diff is.
+
+    Args:
+        line_hits: {coverage path: {line: hits}} from a CoverageReport with keep_lines
+        changes: Result of parse_diff
+        root: Repository root used to match report paths (default: current directory)
+
+    Returns:
+        PatchCoverage keyed by repository-relative path
+    """
+    patch = PatchCoverage()
+    for coverage_path, diff_path in match_paths(line_hits, changes, root).items():
+        ranges = changes[diff_path]
+        if not ranges:
+            continue
+        hits = line_hits[coverage_path]
+        code_lines = sorted(hits)
+        covered, uncovered = [], []
+        for start, end in ranges:
+            for line in code_lines[bisect_left(code_lines, start):bisect_right(code_lines, end)]:
+                (covered if hits[line] else uncovered).append(line)
+        if covered or uncovered:
+            patch.add(diff_path, covered, uncovered)
+    return patch
+
+def format_line_ranges(lines: List[int]) -> str:
+    """Format line numbers compactly, e.g. [1, 2, 3, 7] -> "1-3, 7"."""
+    ranges = merge_ranges([(line, line) for line in lines])
+    return ', '.join(f"{start}-{end}" if end > start else f"{start}" for start, end in ranges)
+
+def format_patch_coverage(patch: PatchCoverage) -> str:
+    """
+    Render patch coverage as a markdown section for the PR comment.
+
+    Args:
+        patch: Result of compute_patch_coverage
+
+    Returns:
+        Markdown text
+    """
+    section = '### Patch Coverage\n\n'
+    if not patch.total:
+        return section + 'No changed lines are measured by coverage.\n\n'
+
+    section += f'{patch.covered} of {patch.total} changed lines covered ({patch.pct():.2f}%)\n\n'
+    files = sorted(patch.files.items(), key=lambda item: (-len(item[1]['uncovered']), item[0]))
+    section += '| File | Covered | Uncovered lines |\n'
+    section += '| --- | --- | --- |\n'
+    for path, entry in files[:MAX_COMMENT_FILES]:
+        total = len(entry['covered']) + len(entry['uncovered'])
+        section += f"| `{path}` | {len(entry['covered'])}/{total} | {format_line_ranges(entry['uncovered']) or '-'} |\n"
+    if len(files) > MAX_COMMENT_FILES:
+        section += f'\n…and {len(files) - MAX_COMMENT_FILES} more files\n'
+    return section + '\n'
@@ -0,0 +1,349 @@
+"""
+Structured coverage report module.
+This module parses the machine-readable istanbul reports (coverage-summary.json,
+coverage-final.json) and lcov.info into per-file statement, branch, function and
+line counts, so the workflow does not have to scrape human-formatted tables.
+"""
+
+import os
+import json
+import math
+from typing import Dict, Iterator, Optional, Tuple
+
+from .util import log
+
+# Report files in order of preference: the summary is smallest, lcov is the most widely supported
+REPORT_FILES = ['coverage-summary.json', 'coverage-final.json', 'lcov.info']
+
+METRICS = ('statements', 'branches', 'functions', 'lines')
+
+# Bytes read at a time when streaming JSON reports
+CHUNK_SIZE = 1024 * 1024
+
+class CoverageCounts:
+    """Covered/total counts for each metric of one file or of the whole report."""
+
+    __slots__ = tuple(f"{metric}_{field}" for metric in METRICS for field in ('covered', 'total'))
+
+    def __init__(self):
+        for slot in self.__slots__:
+            setattr(self, slot, 0)
+
+    def add(self, metric: str, covered: int, total: int) -> None:
+        setattr(self, f"{metric}_covered", getattr(self, f"{metric}_covered") + covered)
+        setattr(self, f"{metric}_total", getattr(self, f"{metric}_total") + total)
+
+    def merge(self, other: 'CoverageCounts') -> None:
+        for metric in METRICS:
+            self.add(metric, getattr(other, f"{metric}_covered"), getattr(other, f"{metric}_total"))
+
+    def pct(self, metric: str = 'lines') -> Optional[float]:
+        """Coverage percentage for a metric truncated to two decimals like istanbul, or None if there is nothing to cover"""
+        total = getattr(self, f"{metric}_total")
+        if not total:
+            return None
+        return math.floor(100000 * getattr(self, f"{metric}_covered") / total / 10) / 100
+
+    def __repr__(self):
+        return "CoverageCounts(" + ", ".join(
+            f"{metric}={getattr(self, metric + '_covered')}/{getattr(self, metric + '_total')}" for metric in METRICS
+        ) + ")"
+
+class CoverageReport:
+    """
+    Per-file coverage counts plus the report total.
+
+    line_hits is only filled when a parser is asked to keep per-line data; it maps
+    each file to {line number: hit count} for the lines that hold code.
+    """
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.files: Dict[str, CoverageCounts] = {}
+        self.total = CoverageCounts()
+        self.line_hits: Dict[str, Dict[int, int]] = {}
+
+    def add_file(self, path: str, counts: CoverageCounts) -> None:
+        existing = self.files.get(path)
+        if existing:
+            existing.merge(counts)
+        else:
+            self.files[path] = counts
+        self.total.merge(counts)
+
+    def lines_pct(self) -> Optional[float]:
+        return self.total.pct('lines')
+
+def iter_json_object(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, object]]:
+    """
+    Stream the (key, value) pairs of a file holding one top-level JSON object.
+
+    Only one value (e.g. one source file's coverage) is decoded at a time, so
+    memory is bounded by the largest entry rather than the whole file.
+
+    Args:
+        file_path: Path to the JSON file
+        chunk_size: Bytes read at a time
+
+    Yields:
+        (key, decoded value) pairs in file order
+
+    Raises:
+        ValueError: If the file is not a JSON object
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n':
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        def expect(char):
+            nonlocal position
+            skip_whitespace()
+            if position >= len(buffer) or buffer[position] != char:
+                raise ValueError(f"Expected {char!r} in {file_path}")
+            position += 1
+
+        def decode():
+            nonlocal position
+            while True:
+                skip_whitespace()
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may continue in the next chunk
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        fill()
+        expect('{')
+        skip_whitespace()
+        if position < len(buffer) and buffer[position] == '}':
+            return
+        while True:
+            key = decode()
+            expect(':')
+            yield key, decode()
+            skip_whitespace()
+            if position < len(buffer) and buffer[position] == ',':
+                position += 1
+                continue
+            expect('}')
+            return
+
+def parse_coverage_summary(file_path: str) -> CoverageReport:
+    """
+    Parse an istanbul json-summary report (coverage-summary.json).
+
+    Args:
+        file_path: Path to the report
+
+    Returns:
+        CoverageReport; the total is taken from the report's own "total" entry
+    """
+    report = CoverageReport(file_path)
+    reported_total = None
+    for path, entry in iter_json_object(file_path):
+        counts = CoverageCounts()
+        for metric in METRICS:
+            data = entry.get(metric) or {}
+            counts.add(metric, int(data.get('covered', 0)), int(data.get('total', 0)))
+        if path == 'total':
+            reported_total = counts
+        else:
+            report.add_file(path, counts)
+    if reported_total is not None:
+        report.total = reported_total
+    return report
+
+def file_coverage_from_istanbul(entry: dict, line_hits: Optional[Dict[int, int]] = None) -> CoverageCounts:
+    """
+    Count one file's coverage from its istanbul coverage-final.json entry.
+
+    Lines are derived from statements the way istanbul does: a line's hit count is
+    the highest count of the statements that start on it.
+
+    Args:
+        entry: The file's entry, with statementMap, s, f and b
+        line_hits: Dict to fill with {line: hits}, if per-line data is wanted
+
+    Returns:
+        CoverageCounts for the file
+    """
+    counts = CoverageCounts()
+    statement_hits = entry.get('s') or {}
+    counts.add('statements', sum(1 for hits in statement_hits.values() if hits), len(statement_hits))
+
+    function_hits = entry.get('f') or {}
+    counts.add('functions', sum(1 for hits in function_hits.values() if hits), len(function_hits))
+
+    branch_hits = entry.get('b') or {}
+    counts.add(
+        'branches',
+        sum(1 for hits in branch_hits.values() for count in hits if count),
+        sum(len(hits) for hits in branch_hits.values())
+    )
+
+    lines = line_hits if line_hits is not None else {}
+    statement_map = entry.get('statementMap') or {}
+    for statement_id, hits in statement_hits.items():
+        location = statement_map.get(statement_id)
+        if not location:
+            continue
+        line = location['start']['line']
+        if lines.get(line, -1) < hits:
+            lines[line] = hits
+    counts.add('lines', sum(1 for hits in lines.values() if hits), len(lines))
+    return counts
+
+def parse_coverage_final(file_path: str, keep_lines: bool = False) -> CoverageReport:
+    """
+    Parse an istanbul json report (coverage-final.json), streaming one file entry at a time.
+
+    Args:
+        file_path: Path to the report
+        keep_lines: Keep per-line hit counts in report.line_hits
+
+    Returns:
+        CoverageReport
+    """
+    report = CoverageReport(file_path)
+    for path, entry in iter_json_object(file_path):
+        line_hits = {} if keep_lines else None
+        report.add_file(entry.get('path', path), file_coverage_from_istanbul(entry, line_hits))
+        if keep_lines:
+            report.line_hits[entry.get('path', path)] = line_hits
+    return report
+
+def parse_lcov(file_path: str, keep_lines: bool = False) -> CoverageReport:
+    """
+    Parse an lcov tracefile line by line.
+
+    lcov has no statement records, so statements mirror the line counts.
+
+    Args:
+        file_path: Path to lcov.info
+        keep_lines: Keep per-line hit counts in report.line_hits
+
+    Returns:
+        CoverageReport
+    """
+    report = CoverageReport(file_path)
+    path = None
+    lines: Dict[int, int] = {}
+    summary = {}
+
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for raw in f:
+            record, _, value = raw.strip().partition(':')
+            if record == 'SF':
+                path, lines, summary = value, {}, {}
+            elif record == 'DA':
+                line, hits = value.split(',')[:2]
+                line = int(line)
+                lines[line] = max(lines.get(line, 0), int(hits))
+            elif record in ('LF', 'LH', 'FNF', 'FNH', 'BRF', 'BRH'):
+                summary[record] = int(value)
+            elif record == 'end_of_record' and path is not None:
+                counts = CoverageCounts()
+                line_total = summary.get('LF', len(lines))
+                line_covered = summary.get('LH', sum(1 for hits in lines.values() if hits))
+                counts.add('lines', line_covered, line_total)
+                counts.add('statements', line_covered, line_total)
+                counts.add('functions', summary.get('FNH', 0), summary.get('FNF', 0))
+                counts.add('branches', summary.get('BRH', 0), summary.get('BRF', 0))
+                report.add_file(path, counts)
+                if keep_lines:
+                    report.line_hits[path] = lines
+                path = None
+    return report
+
+PARSERS = {
+    'coverage-summary.json': lambda path, keep_lines: parse_coverage_summary(path),
+    'coverage-final.json': parse_coverage_final,
+    'lcov.info': parse_lcov,
+}
+
+def find_structured_report(coverage_dir: str, since: Optional[float] = None,
+                           names=REPORT_FILES) -> Optional[str]:
+    """
+    Find the preferred machine-readable report in a coverage output directory.
+
+    Args:
+        coverage_dir: Directory the test runner writes reports to
+        since: Ignore reports last modified before this timestamp (stale output from an earlier run)
+        names: Report file names in order of preference
+
+    Returns:
+        Path to the report, or None if there is none
+    """
+    for name in names:
+        path = os.path.join(coverage_dir, name)
+        if os.path.isfile(path) and (since is None or os.path.getmtime(path) >= since):
+            return path
+    return None
+
+def load_structured_report(file_path: str, keep_lines: bool = False) -> CoverageReport:
+    """
+    Parse a report with the parser matching its file name.
+
+    Args:
+        file_path: Path to a file named like one of REPORT_FILES
+        keep_lines: Keep per-line hit counts (not available from coverage-summary.json)
+
+    Returns:
+        CoverageReport
+
+    Raises:
+        ValueError: If the file name is not a known report
+    """
+    parser = PARSERS.get(os.path.basename(file_path))
+    if not parser:
+        raise ValueError(f"Unknown coverage report: {file_path}")
+    return parser(file_path, keep_lines)
+
+def structured_coverage_pct(coverage_dir: str, since: Optional[float] = None,
+                            names=REPORT_FILES) -> Optional[float]:
+    """
+    Get the exact line coverage percentage from a machine-readable report, if one exists.
+
+    Args:
+        coverage_dir: Directory the test runner writes reports to
+        since: Ignore reports older than this timestamp
+        names: Report file names in order of preference
+
+    Returns:
+        Line coverage percentage, or None if no usable report was found
+    """
+    path = find_structured_report(coverage_dir, since, names)
+    if not path:
+        return None
+    try:
+        report = load_structured_report(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log(f"Could not parse coverage report {path}: {e}")
+        return None
+    pct = report.lines_pct()
+    log(f"Coverage from {path}: {pct}% lines across {len(report.files)} files")
+    return pct
@@ -0,0 +1,108 @@
+"""
+Job scheduler module.
+This module bounds how many test runner processes run at once by the CPUs and memory
+they declare, so the coverage targets and their shards keep the runner busy without
+pushing it into swap.
+"""
+
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+from .util import log
+
+# Share of the memory available at start that runners may claim; the rest is left to the OS and this script
+MEMORY_HEADROOM = 0.9
+
+def available_memory_mb() -> Optional[int]:
+    """
+    Memory available to new processes, in MB.
+
+    Returns:
+        MemAvailable from /proc/meminfo, the free physical memory where that is missing,
+        or None if neither is known
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class ResourcePool:
+    """
+    Counting semaphore over CPUs and memory, shared by every runner process of a run.
+
+    A reservation waits until both fit in what is free. Smaller reservations may go
+    ahead of a waiting larger one, which keeps the machine busy; the set of jobs is
+    finite, so the larger one runs once enough of them finish. A reservation larger
+    than the whole pool is clamped to it and so runs alone.
+    """
+
+    def __init__(self, cpus: Optional[float] = None, memory_mb: Optional[int] = None):
+        self.cpus = cpus or os.cpu_count() or 1
+        if memory_mb is None:
+            available = available_memory_mb()
+            memory_mb = int(available * MEMORY_HEADROOM) if available else None
+        # None: memory is not limited
+        self.memory_mb = memory_mb
+        self.used_cpus = 0.0
+        self.used_memory_mb = 0
+        self.running = 0
+        self.peak_running = 0
+        self._condition = threading.Condition()
+
+    def __repr__(self):
+        memory = f"{self.memory_mb} MB" if self.memory_mb else "unbounded memory"
+        return f"ResourcePool({self.cpus} CPUs, {memory})"
+
+    def clamp(self, cpus: float, memory_mb: int):
+        cpus = min(cpus, self.cpus)
+        memory_mb = min(memory_mb, self.memory_mb) if self.memory_mb else memory_mb
+        return cpus, memory_mb
+
+    def fits(self, cpus: float, memory_mb: int) -> bool:
+        if self.used_cpus + cpus > self.cpus:
+            return False
+        return not self.memory_mb or self.used_memory_mb + memory_mb <= self.memory_mb
+
+    @contextmanager
+    def reserve(self, cpus: float, memory_mb: int, label: str = ''):
+        """
+        Hold CPUs and memory for the duration of the block, waiting until they are free.
+
+        Args:
+            cpus: CPUs the job keeps busy
+            memory_mb: Memory the job may use at its peak
+            label: Job name for the log
+        """
+        cpus, memory_mb = self.clamp(cpus, memory_mb)
+        with self._condition:
+            if not self.fits(cpus, memory_mb):
+                log(f"{label or 'Job'} waiting for {cpus} CPUs and {memory_mb} MB "
+                    f"({self.used_cpus}/{self.cpus} CPUs, {self.used_memory_mb}/{self.memory_mb or '-'} MB in use)")
+            self._condition.wait_for(lambda: self.fits(cpus, memory_mb))
+            self.used_cpus += cpus
+            self.used_memory_mb += memory_mb
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.used_cpus -= cpus
+                self.used_memory_mb -= memory_mb
+                self.running -= 1
+                self._condition.notify_all()
+
+def reserve(pool: Optional[ResourcePool], cpus: float, memory_mb: int, label: str = ''):
+    """Reserve resources from pool, or do nothing if there is no pool."""
+    if pool is None:
+        return nullcontext()
+    return pool.reserve(cpus, memory_mb, label)
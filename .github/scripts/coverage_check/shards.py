@@ -0,0 +1,282 @@
+"""
+Sharded coverage module.
+This module splits a test suite's files into shards that run as separate processes, one
+per core, and merges the istanbul coverage-final.json report each shard writes into one.
+"""
+
+import os
+import glob
+import heapq
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .reports import CoverageReport, METRICS, iter_json_object, file_coverage_from_istanbul
+from .scheduler import ResourcePool, reserve
+from .util import log, stream_command
+
+# Read by .vscode-test.mjs to run one shard of the extension suite
+SHARD_FILES_ENV = 'COVERAGE_SHARD_FILES'
+SHARD_DIR_ENV = 'COVERAGE_SHARD_DIR'
+
+def resolve_shard_count(requested: Optional[int]) -> int:
+    """
+    Number of shards to run.
+
+    Args:
+        requested: Shard count from the command line; 0 means one per core
+
+    Returns:
+        Shard count, at least 1
+    """
+    if requested == 0:
+        return os.cpu_count() or 1
+    return max(1, requested or 1)
+
+def find_test_files(package_dir: str, patterns: Iterable[str], excludes: Iterable[str] = ()) -> List[str]:
+    """
+    Find a suite's test files.
+
+    Args:
+        package_dir: Directory the test runner runs in
+        patterns: Glob patterns relative to package_dir
+        excludes: Relative path prefixes to leave out
+
+    Returns:
+        Sorted paths relative to package_dir
+    """
+    excludes = tuple(excludes)
+    found = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(package_dir, pattern), recursive=True):
+            relative = os.path.relpath(path, package_dir).replace(os.sep, '/')
+            if 'node_modules/' not in relative and not relative.startswith(excludes):
+                found.add(relative)
+    return sorted(found)
+
+def split_into_shards(paths: List[str], count: int, weight: Optional[Callable[[str], int]] = None) -> List[List[str]]:
+    """
+    Split files into at most count shards of similar total weight.
+
+    Files are placed heaviest first onto the currently lightest shard, which keeps
+    the slowest shard (and so the wall time) close to the average.
+
+    Args:
+        paths: Files to split
+        count: Number of shards wanted
+        weight: Estimated cost of a file (default: its size in bytes)
+
+    Returns:
+        Non-empty shards, each a sorted list of paths
+    """
+    weight = weight or (lambda path: os.path.getsize(path) if os.path.exists(path) else 0)
+    shards: List[List[str]] = [[] for _ in range(max(1, min(count, len(paths))))]
+    # (total weight, file count, shard index): ties go to the shard with fewer files
+    heap = [(0, 0, index) for index in range(len(shards))]
+    for path in sorted(paths, key=lambda path: (-weight(path), path)):
+        load, files, index = heapq.heappop(heap)
+        shards[index].append(path)
+        heapq.heappush(heap, (load + weight(path), files + 1, index))
+    return [sorted(shard) for shard in shards if shard]
+
+def run_shard(shard: Dict, pool: Optional[ResourcePool] = None) -> int:
+    """Run one shard once the pool has room for the CPUs and memory it declares."""
+    with reserve(pool, shard.get('cpus', 1), shard.get('memory_mb', 0), shard['label']):
+        return stream_command(
+            shard['command'], shard['output_file'],
+            echo_prefix=f"[{shard['label']}] ", cwd=shard.get('cwd'), env=shard.get('env'),
+            timeout=shard.get('timeout'), idle_timeout=shard.get('idle_timeout')
+        )
+
+def run_shards(shards: List[Dict], workers: Optional[int] = None, pool: Optional[ResourcePool] = None) -> List[int]:
+    """
+    Run shard commands concurrently, streaming each one's output to its own file.
+
+    Every shard is its own test runner process; the threads only wait on them. With
+    a pool every shard gets a thread and the pool decides how many run at once, so
+    shards of several targets share the machine; without one the thread count is
+    the limit.
+
+    Args:
+        shards: Dicts with command, output_file, label and optionally cwd, env, cpus, memory_mb
+            and stream_command timeouts
+        workers: Most shards running at once without a pool (default: all of them, capped at the core count)
+        pool: ResourcePool shared with the other runners of this run (optional)
+
+    Returns:
+        Exit code of each shard, in order
+    """
+    if pool is not None:
+        workers = len(shards)
+    workers = workers or min(len(shards), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run_shard, shard, pool) for shard in shards]
+        return [future.result() for future in futures]
+
+def combine_outputs(shard_files: List[str], output_file: str) -> None:
+    """Concatenate the shards' output files into one, shard by shard."""
+    with open(output_file, 'w') as out:
+        for shard_file in shard_files:
+            out.write(f"===== {os.path.basename(shard_file)} =====\n")
+            if os.path.exists(shard_file):
+                with open(shard_file, 'r', errors='replace') as f:
+                    shutil.copyfileobj(f, out)
+
+def location_key(location: dict) -> tuple:
+    """Hashable (start line, start column, end line, end column) of an istanbul location."""
+    start = location.get('start') or {}
+    end = location.get('end') or {}
+    return start.get('line'), start.get('column'), end.get('line'), end.get('column')
+
+def function_key(function: dict) -> tuple:
+    return function.get('name'), location_key(function.get('decl') or function.get('loc') or {})
+
+def branch_key(branch: dict) -> tuple:
+    return (branch.get('type'), location_key(branch.get('loc') or {}),
+            tuple(location_key(location) for location in branch.get('locations') or []))
+
+# (map field, hits field, key of one map entry)
+ISTANBUL_SECTIONS = [
+    ('statementMap', 's', location_key),
+    ('fnMap', 'f', function_key),
+    ('branchMap', 'b', branch_key),
+]
+
+def add_hits(current, hits):
+    """Add hit counts; branch counts are lists with one count per branch path."""
+    if isinstance(current, list):
+        merged = list(current) + [0] * max(0, len(hits) - len(current))
+        for index, count in enumerate(hits):
+            merged[index] += count
+        return merged
+    return current + hits
+
+def merge_file_coverage(target: dict, entry: dict) -> None:
+    """
+    Merge one shard's istanbul entry for a file into the accumulated entry, in place.
+
+    Shards normally instrument a file identically, so counts are added by id. If the
+    maps differ, entries are matched by source location and unmatched ones appended.
+
+    Args:
+        target: Accumulated coverage-final.json entry for the file
+        entry: Another shard's entry for the same file
+    """
+    for map_field, hits_field, key in ISTANBUL_SECTIONS:
+        target_map = target.setdefault(map_field, {})
+        target_hits = target.setdefault(hits_field, {})
+        entry_map = entry.get(map_field) or {}
+        entry_hits = entry.get(hits_field) or {}
+
+        if entry_map == target_map:
+            for item_id, hits in entry_hits.items():
+                target_hits[item_id] = add_hits(target_hits.get(item_id, [] if isinstance(hits, list) else 0), hits)
+            continue
+
+        ids_by_key = {key(value): item_id for item_id, value in target_map.items()}
+        next_id = max((int(item_id) for item_id in target_map if str(item_id).isdigit()), default=-1) + 1
+        for item_id, value in entry_map.items():
+            hits = entry_hits.get(item_id, [] if map_field == 'branchMap' else 0)
+            target_id = ids_by_key.get(key(value))
+            if target_id is None:
+                target_id = str(next_id)
+                next_id += 1
+                target_map[target_id] = value
+                ids_by_key[key(value)] = target_id
+                target_hits[target_id] = hits
+            else:
+                target_hits[target_id] = add_hits(target_hits.get(target_id, [] if isinstance(hits, list) else 0), hits)
+
+class CoverageMerger:
+    """
+    Accumulates coverage-final.json reports one file entry at a time.
+
+    Each report is streamed with iter_json_object, so only the merged result and a
+    single entry of the report being read are in memory at once.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, dict] = {}
+        self.reports = 0
+
+    def add_entry(self, path: str, entry: dict) -> None:
+        existing = self.files.get(path)
+        if existing is None:
+            self.files[path] = entry
+        else:
+            merge_file_coverage(existing, entry)
+
+    def add_report(self, file_path: str) -> None:
+        for key, entry in iter_json_object(file_path):
+            self.add_entry(entry.get('path', key), entry)
+        self.reports += 1
+
+    def merge(self, other: 'CoverageMerger') -> None:
+        """Add the reports another merger accumulated, e.g. one that read them on another thread."""
+        for path, entry in other.files.items():
+            self.add_entry(path, entry)
+        self.reports += other.reports
+
+    def report(self) -> CoverageReport:
+        """Per-file counts of the merged coverage."""
+        report = CoverageReport(f"{self.reports} merged shard reports")
+        for path, entry in self.files.items():
+            report.add_file(path, file_coverage_from_istanbul(entry))
+        return report
+
+    def write_coverage_final(self, file_path: str) -> None:
+        """Write the merged coverage as coverage-final.json, one file entry at a time."""
+        with open(file_path, 'w') as f:
+            f.write('{')
+            for index, (path, entry) in enumerate(self.files.items()):
+                f.write(',\n' if index else '\n')
+                f.write(json.dumps(path))
+                f.write(': ')
+                f.write(json.dumps(entry, separators=(',', ':')))
+            f.write('\n}\n')
+
+def summary_metrics(counts) -> dict:
+    """coverage-summary.json metrics of one CoverageCounts (istanbul reports 100% of nothing)."""
+    metrics = {}
+    for metric in METRICS:
+        covered = getattr(counts, f"{metric}_covered")
+        total = getattr(counts, f"{metric}_total")
+        pct = counts.pct(metric)
+        metrics[metric] = {'total': total, 'covered': covered, 'skipped': 0, 'pct': 100 if pct is None else pct}
+    return metrics
+
+def write_coverage_summary(report: CoverageReport, file_path: str) -> None:
+    """Write a CoverageReport as an istanbul json-summary report (coverage-summary.json)."""
+    with open(file_path, 'w') as f:
+        f.write('{"total": ')
+        f.write(json.dumps(summary_metrics(report.total)))
+        for path, counts in report.files.items():
+            f.write(',\n')
+            f.write(json.dumps(path))
+            f.write(': ')
+            f.write(json.dumps(summary_metrics(counts)))
+        f.write('}\n')
+
+def merge_shard_reports(report_paths: List[str], output_dir: str) -> CoverageReport:
+    """
+    Merge the shards' coverage-final.json reports and write the result like an unsharded run would.
+
+    Args:
+        report_paths: coverage-final.json of each shard
+        output_dir: Coverage directory to write the merged coverage-final.json and coverage-summary.json to
+
+    Returns:
+        CoverageReport of the merged coverage
+    """
+    merger = CoverageMerger()
+    for path in report_paths:
+        merger.add_report(path)
+    report = merger.report()
+
+    os.makedirs(output_dir, exist_ok=True)
+    merger.write_coverage_final(os.path.join(output_dir, 'coverage-final.json'))
+    write_coverage_summary(report, os.path.join(output_dir, 'coverage-summary.json'))
+    log(f"Merged {len(report_paths)} shard reports into {output_dir}: "
+        f"{report.lines_pct()}% lines across {len(report.files)} files")
+    return report
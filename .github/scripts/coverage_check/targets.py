@@ -0,0 +1,241 @@
+"""
+Coverage targets module.
+This module loads the coverage targets (test suites whose coverage is measured and
+compared) from .github/coverage-targets.json, and holds each target's base and PR
+results, so adding a package needs a config entry rather than a code change.
+"""
+
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from .extraction import compare_coverage
+from .reports import REPORT_FILES
+
+# Shipped next to the scripts directory, so it is found whatever the working directory
+DEFAULT_TARGETS_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'coverage-targets.json'
+)
+
+# Structured reports read for each report_format, in order of preference
+REPORT_FORMATS = {
+    'auto': REPORT_FILES,
+    'istanbul-summary': ['coverage-summary.json'],
+    'istanbul': ['coverage-final.json'],
+    'lcov': ['lcov.info'],
+    # Only the console output is scraped
+    'text': [],
+}
+
+# Console report of each text_format (istanbul reporter name), as the extraction parser's coverage type
+TEXT_FORMATS = {
+    'text-summary': 'extension',
+    'text': 'webview',
+}
+
+# How a target's test files are split into shards (see shards.py)
+SHARD_RUNNERS = ('vscode-test', 'vitest')
+
+# Target names end up in file names and GitHub output names
+NAME_PATTERN = re.compile(r'^[a-z][a-z0-9_]*$')
+
+DEFAULT_THRESHOLDS = {
+    # Decrease (percentage points) tolerated before the target counts as decreased
+    'max_decrease': 0.0,
+    # Decrease that gets its own warning
+    'significant_decrease': 1.0,
+    # PR coverage below this is warned about, whatever the base measured
+    'min_coverage': None,
+}
+
+TARGET_FIELDS = {
+    'name', 'label', 'command', 'cwd', 'inputs', 'artifact', 'artifact_reports', 'report_dir', 'report_format',
+    'text_format',
+    'coverage_provider', 'shard_runner', 'test_patterns', 'test_excludes', 'max_old_space_mb',
+    'cpus', 'memory_mb', 'thresholds',
+}
+
+class CoverageTarget:
+    """One test suite whose coverage is measured, as declared in the targets config."""
+
+    def __init__(self, name: str, command: List[str], cwd: str = '.', label: Optional[str] = None,
+                 inputs: Iterable[str] = (), artifact: Optional[str] = None, artifact_reports: Optional[Iterable[str]] = None,
+                 report_dir: str = 'coverage', report_format: str = 'auto',
+                 text_format: str = 'text-summary', coverage_provider: Optional[str] = None,
+                 shard_runner: Optional[str] = None, test_patterns: Iterable[str] = (),
+                 test_excludes: Iterable[str] = (), max_old_space_mb: Optional[int] = 4096, cpus: float = 1,
+                 memory_mb: Optional[int] = None, thresholds: Optional[Dict] = None):
+        self.name = name
+        self.command = list(command)
+        self.cwd = os.path.normpath(cwd)
+        self.label = label or name.replace('_', ' ').title()
+        # Files or directories (relative to the repository root) outside cwd that the suite
+        # also builds from, e.g. sources shared with another target
+        self.inputs = [os.path.normpath(path).replace(os.sep, '/') for path in inputs]
+        # Output of the PR's test job, relative to the repository root; a glob when the job is sharded
+        self.artifact = artifact or os.path.join(self.cwd, f"{name}_coverage.txt")
+        self.report_dir = report_dir
+        self.report_format = report_format
+        # Globs (relative to the repository root) of the structured reports the test job uploads
+        self.artifact_reports = list(artifact_reports) if artifact_reports is not None else [
+            os.path.normpath(os.path.join(self.cwd, report_dir, report)) for report in self.report_names()
+        ]
+        self.text_format = text_format
+        self.coverage_provider = coverage_provider
+        self.shard_runner = shard_runner
+        self.test_patterns = list(test_patterns)
+        self.test_excludes = tuple(test_excludes)
+        self.max_old_space_mb = max_old_space_mb
+        self.cpus = cpus
+        # Node heap plus the runner around it
+        self.memory_mb = memory_mb if memory_mb is not None else (max_old_space_mb or 0) + 1024
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+
+    def __repr__(self):
+        return f"CoverageTarget({self.name!r}, cwd={self.cwd!r})"
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CoverageTarget':
+        """
+        Build a target from its config entry.
+
+        Raises:
+            ValueError: If the entry is invalid
+        """
+        unknown = set(data) - TARGET_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown coverage target fields: {', '.join(sorted(unknown))}")
+        name = data.get('name')
+        if not isinstance(name, str) or not NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid coverage target name: {name!r}")
+        command = data.get('command')
+        if not command or not isinstance(command, list) or not all(isinstance(arg, str) for arg in command):
+            raise ValueError(f"Coverage target {name}: command must be a list of strings")
+        if os.path.isabs(data.get('cwd', '.')) or '..' in data.get('cwd', '.').split('/'):
+            raise ValueError(f"Coverage target {name}: cwd must be inside the repository")
+        for path in data.get('inputs') or []:
+            if not isinstance(path, str) or os.path.isabs(path) or '..' in path.split('/'):
+                raise ValueError(f"Coverage target {name}: inputs must be paths inside the repository")
+        for pattern in [data.get('artifact') or ''] + list(data.get('artifact_reports') or []):
+            if os.path.isabs(pattern) or '..' in pattern.split('/'):
+                raise ValueError(f"Coverage target {name}: artifacts must be inside the repository")
+        if data.get('report_format', 'auto') not in REPORT_FORMATS:
+            raise ValueError(f"Coverage target {name}: unknown report_format {data['report_format']!r}")
+        if data.get('text_format', 'text-summary') not in TEXT_FORMATS:
+            raise ValueError(f"Coverage target {name}: unknown text_format {data['text_format']!r}")
+        if data.get('shard_runner') not in (None, *SHARD_RUNNERS):
+            raise ValueError(f"Coverage target {name}: unknown shard_runner {data['shard_runner']!r}")
+        unknown = set(data.get('thresholds') or {}) - set(DEFAULT_THRESHOLDS)
+        if unknown:
+            raise ValueError(f"Coverage target {name}: unknown thresholds {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def package_dir(self, root: Optional[str] = None) -> Optional[str]:
+        """Directory the command runs in; None means the current directory."""
+        if root:
+            return os.path.normpath(os.path.join(root, self.cwd))
+        return None if self.cwd == '.' else self.cwd
+
+    def coverage_dir(self, root: Optional[str] = None) -> str:
+        """Directory the command writes its structured reports to."""
+        return os.path.join(self.package_dir(root) or '.', self.report_dir)
+
+    def report_names(self) -> List[str]:
+        return REPORT_FORMATS[self.report_format]
+
+    def coverage_type(self) -> str:
+        """Parser of the console report, as run_coverage and extract_coverage name it."""
+        return TEXT_FORMATS[self.text_format]
+
+def load_targets(config_path: Optional[str] = None) -> List[CoverageTarget]:
+    """
+    Load the coverage targets.
+
+    Args:
+        config_path: JSON file with a "targets" list (default: .github/coverage-targets.json)
+
+    Returns:
+        Targets in config order
+
+    Raises:
+        ValueError: If the config is invalid
+        OSError: If it can't be read
+    """
+    config_path = config_path or DEFAULT_TARGETS_CONFIG
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    entries = config.get('targets') if isinstance(config, dict) else None
+    if not entries:
+        raise ValueError(f"No coverage targets in {config_path}")
+    targets = [CoverageTarget.from_dict(entry) for entry in entries]
+    names = [target.name for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate coverage targets in {config_path}: {', '.join(duplicates)}")
+    return targets
+
+def find_target(targets: List[CoverageTarget], name: str) -> CoverageTarget:
+    for target in targets:
+        if target.name == name:
+            return target
+    raise KeyError(f"No coverage target named {name}")
+
+def targets_fingerprint(targets: List[CoverageTarget]) -> str:
+    """Hash of everything that decides how the targets are measured, for cache keys."""
+    payload = json.dumps([
+        {'name': target.name, 'command': target.command, 'cwd': target.cwd, 'inputs': target.inputs,
+         'report_dir': target.report_dir,
+         'report_format': target.report_format, 'coverage_provider': target.coverage_provider}
+        for target in targets
+    ], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def target_package_dirs(targets: List[CoverageTarget]) -> List[str]:
+    """Directories with their own node_modules: the repository root and each target's directory."""
+    dirs = ['.']
+    for target in targets:
+        if target.cwd not in dirs:
+            dirs.append(target.cwd)
+    return dirs
+
+def target_lockfiles(targets: List[CoverageTarget]) -> List[str]:
+    """Lockfiles (repository-relative) whose contents affect the targets' coverage."""
+    return ['package-lock.json' if package_dir == '.' else f"{package_dir.replace(os.sep, '/')}/package-lock.json"
+            for package_dir in target_package_dirs(targets)]
+
+class TargetResult:
+    """Base and PR coverage of one target, compared against its thresholds."""
+
+    def __init__(self, target: CoverageTarget, base: float, pr: float):
+        self.target = target
+        self.base = float(base)
+        self.pr = float(pr)
+        decreased, self.diff = compare_coverage(self.base, self.pr)
+        self.decreased = decreased and self.diff > target.thresholds['max_decrease']
+
+    @property
+    def significant(self) -> bool:
+        """Decreased by more than the target's significant_decrease."""
+        significant = self.target.thresholds['significant_decrease']
+        return self.decreased and significant is not None and self.diff > significant
+
+    @property
+    def below_minimum(self) -> bool:
+        minimum = self.target.thresholds['min_coverage']
+        return minimum is not None and self.pr < minimum
+
+def compare_targets(targets: List[CoverageTarget], base: Dict[str, float], pr: Dict[str, float]) -> List[TargetResult]:
+    """
+    Compare base and PR coverage of every target.
+
+    Args:
+        targets: Coverage targets
+        base: Base coverage by target name (missing targets count as 0.0)
+        pr: PR coverage by target name (missing targets count as 0.0)
+
+    Returns:
+        One TargetResult per target, in config order
+    """
+    return [TargetResult(target, base.get(target.name, 0.0), pr.get(target.name, 0.0)) for target in targets]
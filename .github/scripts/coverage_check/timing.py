@@ -0,0 +1,208 @@
+"""
+Timing module.
+This module records a timeline of the workflow's phases and subprocess calls (wall time,
+CPU time, peak RSS of child processes and output bytes) and renders it as JSON, a GitHub
+step summary table or a PR comment section.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Default location of the JSON timeline
+DEFAULT_TIMING_FILE = 'coverage_timing.json'
+
+def children_usage():
+    """
+    CPU seconds and peak RSS (MB) of all terminated child processes so far.
+
+    Returns:
+        Tuple of (cpu_seconds, peak_rss_mb), or (0.0, None) where unsupported
+    """
+    if resource is None:
+        return 0.0, None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, rss_to_mb(usage.ru_maxrss)
+
+def rss_to_mb(max_rss):
+    """Convert ru_maxrss to MB (it is KB on Linux, bytes on macOS)."""
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+class Timeline:
+    """
+    Thread-safe list of timed phases and commands.
+
+    Phases nest per thread. CPU time of a phase is this process's CPU time plus
+    that of children reaped during it; when phases run on several threads at
+    once (the concurrent coverage suites) those process-wide numbers overlap.
+    Commands run through util measure their own child where the OS allows.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _append(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a block of the workflow.
+
+        Args:
+            name: Phase name shown in the timeline
+        """
+        stack = self._stack()
+        entry = {
+            'kind': 'phase',
+            'name': name,
+            'parent': stack[-1]['name'] if stack else None,
+            'thread': threading.current_thread().name,
+            'start_s': round(time.time() - self.started, 3),
+            'output_bytes': 0,
+        }
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        children_cpu_start, _ = children_usage()
+        stack.append(entry)
+        try:
+            yield entry
+        finally:
+            stack.pop()
+            children_cpu_end, children_rss = children_usage()
+            entry['wall_s'] = round(time.perf_counter() - wall_start, 3)
+            entry['cpu_s'] = round(time.process_time() - cpu_start, 3)
+            entry['children_cpu_s'] = round(children_cpu_end - children_cpu_start, 3)
+            entry['children_peak_rss_mb'] = round(children_rss, 1) if children_rss is not None else None
+            self._append(entry)
+
+    def record_command(self, command, wall_s: float, output_bytes: int, returncode: Optional[int],
+                       children_cpu_s: Optional[float] = None, peak_rss_mb: Optional[float] = None) -> None:
+        """
+        Record one finished subprocess call.
+
+        Args:
+            command: The command that ran
+            wall_s: Wall time in seconds
+            output_bytes: Bytes of output it produced
+            returncode: Exit code
+            children_cpu_s: CPU seconds used by the process, if known
+            peak_rss_mb: Peak resident set size in MB, if known
+        """
+        stack = self._stack()
+        for open_phase in stack:
+            open_phase['output_bytes'] += output_bytes
+        name = ' '.join(command) if isinstance(command, (list, tuple)) else str(command)
+        self._append({
+            'kind': 'command',
+            'name': name,
+            'parent': stack[-1]['name'] if stack else None,
+            'thread': threading.current_thread().name,
+            'start_s': round(time.time() - self.started - wall_s, 3),
+            'wall_s': round(wall_s, 3),
+            'children_cpu_s': round(children_cpu_s, 3) if children_cpu_s is not None else None,
+            'children_peak_rss_mb': round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+            'output_bytes': output_bytes,
+            'returncode': returncode,
+        })
+
+    def sorted_entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self.entries, key=lambda entry: entry['start_s'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started,
+            'total_wall_s': round(time.time() - self.started, 3),
+            'entries': self.sorted_entries(),
+        }
+
+    def write_json(self, path: str = DEFAULT_TIMING_FILE) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def markdown_table(self, include_commands: bool = True) -> str:
+        """
+        Render the timeline as a markdown table.
+
+        Args:
+            include_commands: Also list individual subprocess calls under their phase
+
+        Returns:
+            Markdown table text
+        """
+        rows = ['| Step | Wall (s) | CPU (s) | Child CPU (s) | Child peak RSS (MB) | Output |',
+                '| --- | ---: | ---: | ---: | ---: | ---: |']
+        for entry in self.sorted_entries():
+            if entry['kind'] == 'command' and not include_commands:
+                continue
+            name = entry['name'] if entry['kind'] == 'phase' else f"↳ `{entry['name'][:60]}`"
+            rows.append(
+                f"| {name} | {entry['wall_s']:.1f} | {format_optional(entry.get('cpu_s'))} "
+                f"| {format_optional(entry.get('children_cpu_s'))} | {format_optional(entry.get('children_peak_rss_mb'), '.0f')} "
+                f"| {format_bytes(entry['output_bytes'])} |"
+            )
+        return '\n'.join(rows) + '\n'
+
+    def write_step_summary(self) -> bool:
+        """
+        Append the timeline to the GitHub step summary, if running in GitHub Actions.
+
+        Returns:
+            True if it was written
+        """
+        summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
+        if not summary_path:
+            return False
+        with open(summary_path, 'a') as f:
+            f.write("## Coverage Workflow Timing\n\n")
+            f.write(self.markdown_table())
+            f.write("\n")
+        return True
+
+    def comment_section(self) -> str:
+        """Collapsed timing section for the PR comment (phases only)."""
+        return (
+            '<details>\n<summary>Coverage workflow timing</summary>\n\n'
+            + self.markdown_table(include_commands=False)
+            + '\n</details>\n\n'
+        )
+
+def format_optional(value, spec='.1f'):
+    return format(value, spec) if value is not None else '-'
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# Timeline of the current process
+timeline = Timeline()
+
+def phase(name: str):
+    """Time a block of the workflow on the process timeline."""
+    return timeline.phase(name)
+
+def record_command(*args, **kwargs) -> None:
+    """Record a subprocess call on the process timeline."""
+    timeline.record_command(*args, **kwargs)
@@ -7,19 +7,37 @@ import os
 import sys
 import re
 import shlex
+import time
+import signal
 import subprocess
+import threading
 import traceback
-from typing import List, Tuple, Dict, Any, Optional, Union
+from typing import List, Tuple, Dict, Any, Optional, Union, Callable
+
+from .timing import record_command, children_usage, rss_to_mb
 
 # List of allowed commands and their arguments
 ALLOWED_COMMANDS = {
-    'xvfb-run': ['-a'],
-    'npm': ['run', 'test:coverage', 'ci', 'install', '--no-save', '@vitest/coverage-v8', 'check-types', 'lint', 'format', 'compile'],
+    'xvfb-run': ['-a', '-n'],
+    'npm': ['run', 'test:coverage', '--', '--coverage.reportsDirectory', 'ci', 'install', '--no-save', '@vitest/coverage-v8', 'check-types', 'lint', 'format', 'compile'],
     'cd': ['webview-ui'],
     'python': ['-m', 'coverage_check'],
-    'git': ['fetch', 'checkout', 'origin'],
+    'git': ['fetch', 'checkout', 'origin', 'rev-parse', '--verify', '--quiet', 'worktree', 'add', 'list', 'prune',
+            '--porcelain', '--force', '--detach', 'diff', 'merge-base', '--unified=0', '--no-color', '--no-ext-diff'],
 }
 
+# Exit code reported for a command stopped by a timeout, as coreutils timeout does
+TIMEOUT_EXIT_CODE = 124
+
+# Seconds a stopped command's process group gets between SIGTERM and SIGKILL
+TERMINATE_GRACE_S = 10
+
+# Seconds between watchdog checks
+WATCHDOG_POLL_S = 1.0
+
+# Run commands in their own process group so a timeout can stop everything they spawned
+NEW_PROCESS_GROUP = os.name == 'posix'
+
 def is_safe_command(command: Union[str, List[str]]) -> bool:
     """
     Check if a command is safe to execute.
@@ -163,23 +181,41 @@ def write_file_content(file_path: str, content: str) -> bool:
         log(f"Error writing to file {file_path}: {e}")
         return False
 
-def run_command(command: Union[str, List[str]], capture_output: bool = True) -> Tuple[int, str, str]:
+def signal_process_group(process: subprocess.Popen, sig: int) -> None:
+    """Send a signal to a command's whole process group (just the process where groups aren't available)."""
+    try:
+        if NEW_PROCESS_GROUP:
+            os.killpg(process.pid, sig)
+        elif sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        # Already gone
+        pass
+
+def run_command(command: Union[str, List[str]], capture_output: bool = True,
+                cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                timeout: Optional[float] = None) -> Tuple[int, str, str]:
     """
     Run a command and return the result.
     
     Args:
         command: Command to run (string or list)
         capture_output: Whether to capture stdout/stderr
+        cwd: Working directory for the command (default: current directory)
+        env: Environment for the command (default: inherit)
+        timeout: Seconds before the command's process group is terminated, then killed (default: none)
         
     Returns:
-        Tuple of (returncode, stdout, stderr)
+        Tuple of (returncode, stdout, stderr); TIMEOUT_EXIT_CODE and the output so far on a timeout
     """
     if not is_safe_command(command):
         error_msg = f"Unsafe command detected: {command}"
         log(error_msg)
         return 1, "", error_msg
         
-    log(f"Running command: {command}")
+    log(f"Running command: {command}" + (f" (in {cwd})" if cwd else ""))
     try:
         # Convert string command to list
         if isinstance(command, str):
@@ -187,19 +223,211 @@ def run_command(command: Union[str, List[str]], capture_output: bool = True) ->
         else:
             cmd_list = command
             
-        result = subprocess.run(
+        started = time.perf_counter()
+        children_cpu_start, _ = children_usage()
+        pipe = subprocess.PIPE if capture_output else None
+        with subprocess.Popen(
             cmd_list,
             shell=False,  # Never use shell=True for security
-            capture_output=capture_output,
-            text=True
+            stdout=pipe,
+            stderr=pipe,
+            text=True,
+            cwd=cwd,
+            env=env,
+            start_new_session=NEW_PROCESS_GROUP
+        ) as process:
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+                returncode = process.returncode
+            except subprocess.TimeoutExpired:
+                log(f"Command timed out after {timeout}s, stopping it: {command}")
+                signal_process_group(process, signal.SIGTERM)
+                try:
+                    stdout, stderr = process.communicate(timeout=TERMINATE_GRACE_S)
+                except subprocess.TimeoutExpired:
+                    signal_process_group(process, signal.SIGKILL)
+                    stdout, stderr = process.communicate()
+                returncode = TIMEOUT_EXIT_CODE
+                stderr = f"{stderr or ''}\nTimed out after {timeout}s"
+        # Child CPU is measured process-wide, so it is approximate while other commands run
+        children_cpu_end, _ = children_usage()
+        record_command(
+            cmd_list, time.perf_counter() - started,
+            len(stdout or '') + len(stderr or ''), returncode,
+            children_cpu_s=children_cpu_end - children_cpu_start
         )
-        log(f"Command exit code: {result.returncode}")
-        return result.returncode, result.stdout, result.stderr
+        log(f"Command exit code: {returncode}")
+        return returncode, stdout or "", stderr or ""
     except Exception as e:
         log(f"Error running command: {e}")
         log(traceback.format_exc())
         return 1, "", str(e)
 
+class Watchdog:
+    """
+    Stops a running command's process group when it runs too long or goes quiet.
+    
+    The reading thread reports output with activity(); a background thread checks the
+    limits and, once one is hit, sends SIGTERM to the group and SIGKILL after a grace
+    period unless stop() is called first (the command finished).
+    """
+    
+    def __init__(self, process: subprocess.Popen, timeout: Optional[float] = None,
+                 idle_timeout: Optional[float] = None, grace_s: Optional[float] = None, poll_s: Optional[float] = None):
+        self.process = process
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.idle_timeout = idle_timeout
+        self.grace_s = TERMINATE_GRACE_S if grace_s is None else grace_s
+        self.poll_s = WATCHDOG_POLL_S if poll_s is None else poll_s
+        self.last_activity = self.started
+        self.reason: Optional[str] = None
+        self._done = threading.Event()
+        self._thread = None
+        if timeout or idle_timeout:
+            self._thread = threading.Thread(target=self._watch, name=f"watchdog-{process.pid}", daemon=True)
+            self._thread.start()
+    
+    def activity(self) -> None:
+        self.last_activity = time.monotonic()
+    
+    def limit_remaining(self, seconds: float) -> None:
+        """Allow the command at most this many more seconds."""
+        deadline = time.monotonic() + seconds
+        self.deadline = min(self.deadline, deadline) if self.deadline else deadline
+        if not self._thread:
+            self._thread = threading.Thread(target=self._watch, name=f"watchdog-{self.process.pid}", daemon=True)
+            self._thread.start()
+    
+    def _watch(self) -> None:
+        while not self._done.wait(self.poll_s):
+            now = time.monotonic()
+            if self.deadline and now >= self.deadline:
+                self.reason = f"timed out after {now - self.started:.0f}s"
+            elif self.idle_timeout and now - self.last_activity >= self.idle_timeout:
+                self.reason = f"no output for {now - self.last_activity:.0f}s"
+            else:
+                continue
+            log(f"Watchdog: command {self.reason}, terminating its process group")
+            signal_process_group(self.process, signal.SIGTERM)
+            if not self._done.wait(self.grace_s):
+                log(f"Watchdog: command still running {self.grace_s}s after SIGTERM, killing it")
+                signal_process_group(self.process, signal.SIGKILL)
+            return
+    
+    def stop(self) -> None:
+        self._done.set()
+        if self._thread:
+            self._thread.join()
+
+def wait_with_usage(process: subprocess.Popen) -> Tuple[int, Optional[float], Optional[float]]:
+    """
+    Wait for a process and collect its own resource usage where the OS supports it.
+    
+    Args:
+        process: Running process
+        
+    Returns:
+        Tuple of (returncode, cpu_seconds, peak_rss_mb); usage is None where unavailable
+    """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None, None
+    _, status, usage = os.wait4(process.pid, 0)
+    # Tell Popen the process was reaped so it doesn't wait for it again
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_utime + usage.ru_stime, rss_to_mb(usage.ru_maxrss)
+
+def stream_command(command: Union[str, List[str]], output_file: str,
+                   on_line: Optional[Callable[[str], Any]] = None, echo: bool = True, echo_prefix: str = "",
+                   cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                   timeout: Optional[float] = None, idle_timeout: Optional[float] = None,
+                   finish_timeout: Optional[float] = None) -> int:
+    """
+    Run a command, teeing its combined stdout/stderr line by line to a file and the log.
+    
+    Output is never held in memory as a whole, so arbitrarily large test logs are fine.
+    A command stopped by a timeout still leaves everything it printed in the file.
+    
+    Args:
+        command: Command to run (string or list)
+        output_file: File to write the output to
+        on_line: Called with each output line as it arrives; returning True means the
+            result is in, which starts finish_timeout
+        echo: Whether to also write each line to stdout
+        echo_prefix: Prefix for echoed lines, to tell concurrent commands apart
+        cwd: Working directory for the command (default: current directory)
+        env: Environment for the command (default: inherit)
+        timeout: Seconds before the command's process group is stopped (default: none)
+        idle_timeout: Seconds without output before it is stopped (default: none)
+        finish_timeout: Seconds it may keep running once on_line returned True (default: no limit)
+        
+    Returns:
+        The command's exit code (1 if it could not be run, TIMEOUT_EXIT_CODE if a timeout stopped it)
+    """
+    if not is_safe_command(command):
+        log(f"Unsafe command detected: {command}")
+        return 1
+    
+    log(f"Running command: {command}" + (f" (in {cwd})" if cwd else ""))
+    try:
+        # Convert string command to list
+        cmd_list = shlex.split(command) if isinstance(command, str) else command
+        
+        started = time.perf_counter()
+        output_bytes = 0
+        with open(output_file, 'w') as out, subprocess.Popen(
+            cmd_list,
+            shell=False,  # Never use shell=True for security
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors='replace',
+            bufsize=1,
+            cwd=cwd,
+            env=env,
+            start_new_session=NEW_PROCESS_GROUP
+        ) as process:
+            watchdog = Watchdog(process, timeout, idle_timeout)
+            try:
+                for line in process.stdout:
+                    watchdog.activity()
+                    out.write(line)
+                    output_bytes += len(line)
+                    if echo:
+                        sys.stdout.write(f"{echo_prefix}{line}")
+                    if on_line and on_line(line) and finish_timeout is not None:
+                        watchdog.limit_remaining(finish_timeout)
+                returncode, cpu_s, peak_rss_mb = wait_with_usage(process)
+            finally:
+                watchdog.stop()
+            if watchdog.reason:
+                log(f"Command {watchdog.reason} and was stopped; keeping its output so far in {output_file}")
+                returncode = TIMEOUT_EXIT_CODE
+        sys.stdout.flush()
+        record_command(cmd_list, time.perf_counter() - started, output_bytes, returncode,
+                       children_cpu_s=cpu_s, peak_rss_mb=peak_rss_mb)
+        log(f"Command exit code: {returncode}")
+        return returncode
+    except Exception as e:
+        log(f"Error running command: {e}")
+        log(traceback.format_exc())
+        return 1
+
+def node_env(max_old_space_mb: Optional[int] = None) -> Dict[str, str]:
+    """
+    Build an environment for a node process with a heap limit.
+    
+    Args:
+        max_old_space_mb: V8 old-space limit in MB (default: no limit)
+        
+    Returns:
+        Copy of the current environment with NODE_OPTIONS extended
+    """
+    env = dict(os.environ)
+    if max_old_space_mb:
+        env['NODE_OPTIONS'] = f"{env.get('NODE_OPTIONS', '')} --max-old-space-size={max_old_space_mb}".strip()
+    return env
+
 def find_pattern(content: str, pattern: str, group: int = 0, 
                 default: Optional[str] = None) -> Optional[str]:
     """
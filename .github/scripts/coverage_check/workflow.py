@@ -6,12 +6,62 @@ This module handles the main workflow logic for running coverage tests and proce
 import os
 import re
 import sys
+import shutil
+import json
+import hashlib
+import time
+import tempfile
 import subprocess
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-from .extraction import run_coverage, compare_coverage, extract_coverage
-from .github_api import generate_comment, post_comment, set_github_output
-from .util import log, file_exists, get_file_size, list_directory, run_command
+from .cache import (
+    DEFAULT_CACHE_DIR, base_coverage_cache_key, load_cached_coverage, store_cached_coverage, resolve_commit,
+    target_fingerprint, load_target_result, store_target_result
+)
+from .history import DEFAULT_HISTORY_DB, DEFAULT_TREND_COMMITS, open_history
+from .extraction import run_coverage, scan_coverage_file, coverage_timeouts
+from .reports import CoverageReport, structured_coverage_pct, find_structured_report, load_structured_report
+from .timing import DEFAULT_TIMING_FILE, phase, timeline
+from .shards import (
+    SHARD_FILES_ENV, SHARD_DIR_ENV,
+    resolve_shard_count, find_test_files, split_into_shards, run_shards, combine_outputs, merge_shard_reports,
+    write_coverage_summary
+)
+from .impact import (
+    IMPACT_SHARDS, ImpactTracker, build_impact_map, update_impact_map, plan_tests, changes_since,
+    combine_file_counts, relativize_report
+)
+from .targets import load_targets, compare_targets, targets_fingerprint, target_package_dirs, target_lockfiles
+from .artifacts import ingest_artifacts
+from .scheduler import ResourcePool, reserve
+from .patch import get_changed_lines, compute_patch_coverage, is_coverage_neutral
+from .github_api import generate_comment, CommentPost, set_github_output
+from .util import (
+    log, file_exists, get_file_size, list_directory, run_command, node_env, read_file_content, write_file_content
+)
+
+# Where worktree mode materializes the base branch. Outside the PR checkout so tooling
+# there never sees it; kept between runs so its node_modules can be reused.
+DEFAULT_WORKTREE_DIR = os.path.join(tempfile.gettempdir(), 'coverage-check-base-worktree')
+
+# Directories (relative to the repository root) with their own package-lock.json, when no targets are given
+PACKAGE_DIRS = ['.', 'webview-ui']
+
+# Seconds an install or build may take before it is stopped
+INSTALL_TIMEOUT_S = 15 * 60
+
+# First X display tried for each extension shard; xvfb-run -a races when many start at once
+XVFB_FIRST_DISPLAY = 100
+
+# Written into node_modules after an install; holds the hash of the lockfile it was installed from
+INSTALL_STAMP = '.coverage-check-lock-hash'
+
+# Default coverage provider installed on top of a target's lockfile (see coverage_provider in the targets config)
+COVERAGE_PROVIDER = '@vitest/coverage-v8'
+
+# Written into node_modules after installing the provider; holds provider_fingerprint
+PROVIDER_STAMP = '.coverage-check-provider-hash'
 
 def is_valid_branch_name(branch_name: str) -> bool:
     """
@@ -69,164 +119,564 @@ def checkout_branch(branch_name: str) -> None:
     
     log(f"Successfully checked out branch: {branch_name}")
 
-def extract_extension_coverage_from_file(file_path):
-    """Extract extension coverage from file when run_coverage returns 0."""
-    if not file_exists(file_path):
-        log(f"File {file_path} does not exist, cannot extract extension coverage")
-        return 0.0
+def list_worktrees() -> list:
+    """
+    List the worktrees registered with the current repository.
     
-    file_size = get_file_size(file_path)
-    if file_size == 0:
-        log(f"File {file_path} is empty, cannot extract extension coverage")
-        return 0.0
+    Returns:
+        List of absolute worktree paths
+    """
+    returncode, stdout, stderr = run_command(['git', 'worktree', 'list', '--porcelain'])
+    if returncode != 0:
+        raise RuntimeError(f"Git worktree list failed: {stderr}")
+    return [os.path.realpath(line[len('worktree '):]) for line in stdout.splitlines() if line.startswith('worktree ')]
+
+def prepare_worktree(branch_name: str, worktree_dir: str = DEFAULT_WORKTREE_DIR, package_dirs=PACKAGE_DIRS) -> str:
+    """
+    Materialize a branch into a separate git worktree, leaving the current tree untouched.
+    
+    An existing worktree at worktree_dir is moved to the branch in place, which keeps
+    its untracked node_modules. A leftover directory that is no longer registered
+    (e.g. from an earlier clone) is recreated, carrying its node_modules over.
+    
+    Args:
+        branch_name: Branch name to materialize
+        worktree_dir: Directory for the worktree
+        package_dirs: Directories whose node_modules are carried over
         
-    log(f"Extension coverage is 0.0, trying to read from file directly: {file_path} (size: {file_size} bytes)")
-    with open(file_path, 'r') as f:
-        content = f.read()
-        # Extract the percentage from the "Lines" row in the coverage summary
-        # Pattern: Lines : xx.xx% ( xxxxxxx/xxxxxxx )
-        lines_match = re.search(r'Lines\s*:\s*(\d+\.\d+)%', content)
-        if lines_match:
-            coverage = float(lines_match.group(1))
-            log(f"Found extension coverage in file: {coverage}%")
-            return coverage
-    return 0.0
+    Returns:
+        Absolute path of the worktree
+        
+    Raises:
+        RuntimeError: If a git command fails
+        ValueError: If branch name is invalid
+    """
+    if not is_valid_branch_name(branch_name):
+        raise ValueError(f"Invalid branch name: {branch_name}")
+    
+    worktree_dir = os.path.abspath(worktree_dir)
+    log(f"=== Preparing worktree for branch: {branch_name} at {worktree_dir} ===")
+    
+    returncode, stdout, stderr = run_command(['git', 'fetch', 'origin', branch_name])
+    if returncode != 0:
+        log(f"ERROR: Failed to fetch branch {branch_name}")
+        raise RuntimeError(f"Git fetch failed: {stderr}")
+    
+    target = f"origin/{branch_name}"
+    if os.path.realpath(worktree_dir) in list_worktrees():
+        returncode, stdout, stderr = run_command(['git', 'checkout', '--force', '--detach', target], cwd=worktree_dir)
+        if returncode != 0:
+            raise RuntimeError(f"Git checkout in worktree failed: {stderr}")
+    else:
+        saved_modules = stash_node_modules(worktree_dir, package_dirs)
+        run_command(['git', 'worktree', 'prune'])
+        returncode, stdout, stderr = run_command(['git', 'worktree', 'add', '--force', '--detach', worktree_dir, target])
+        if returncode != 0:
+            raise RuntimeError(f"Git worktree add failed: {stderr}")
+        restore_node_modules(worktree_dir, saved_modules)
+    
+    log(f"Worktree at {worktree_dir} is on {target}")
+    return worktree_dir
+
+def stash_node_modules(worktree_dir: str, package_dirs=PACKAGE_DIRS) -> dict:
+    """Move node_modules of package_dirs out of a stale worktree directory and delete the rest of it."""
+    saved = {}
+    if not os.path.isdir(worktree_dir):
+        return saved
+    
+    stash_dir = tempfile.mkdtemp(prefix='coverage-check-node-modules-', dir=os.path.dirname(worktree_dir))
+    for package_dir in package_dirs:
+        modules = os.path.join(worktree_dir, package_dir, 'node_modules')
+        if os.path.isdir(modules):
+            saved[package_dir] = os.path.join(stash_dir, package_dir.replace(os.sep, '_').strip('.') or 'root')
+            os.rename(modules, saved[package_dir])
+    log(f"Removing stale worktree directory {worktree_dir} (kept node_modules for {len(saved)} packages)")
+    shutil.rmtree(worktree_dir)
+    return saved
+
+def restore_node_modules(worktree_dir: str, saved: dict) -> None:
+    """Move node_modules saved by stash_node_modules into a fresh worktree."""
+    for package_dir, stashed in saved.items():
+        target = os.path.join(worktree_dir, package_dir, 'node_modules')
+        # Skip packages that don't exist at this commit
+        if os.path.isdir(os.path.dirname(target)) and not os.path.exists(target):
+            os.rename(stashed, target)
+    if saved:
+        shutil.rmtree(os.path.dirname(next(iter(saved.values()))), ignore_errors=True)
+
+def lockfile_hash(package_dir: str) -> str:
+    """Hash of a package's package-lock.json, or an empty string if there is none."""
+    lockfile = os.path.join(package_dir, 'package-lock.json')
+    if not file_exists(lockfile):
+        return ""
+    digest = hashlib.sha256()
+    with open(lockfile, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def install_dependencies(package_dir: str) -> bool:
+    """
+    Run npm ci in a package unless its node_modules was installed from the same lockfile.
+    
+    Args:
+        package_dir: Directory containing package.json
+        
+    Returns:
+        True if the dependencies were installed, False if the existing ones were reused
+        
+    Raises:
+        RuntimeError: If npm ci fails
+    """
+    expected = lockfile_hash(package_dir)
+    stamp = os.path.join(package_dir, 'node_modules', INSTALL_STAMP)
+    if expected and read_file_content(stamp, default=None) == expected:
+        log(f"Reusing node_modules in {package_dir} (lockfile unchanged)")
+        return False
+    
+    returncode, stdout, stderr = run_command(['npm', 'ci'], cwd=package_dir, timeout=INSTALL_TIMEOUT_S)
+    if returncode != 0:
+        raise RuntimeError(f"npm ci failed in {package_dir}: {stderr}")
+    write_file_content(stamp, expected)
+    return True
+
+def provider_version(package_dir: str, provider: str = COVERAGE_PROVIDER) -> str:
+    """Version range of a coverage provider declared in a package's package.json ("latest" if undeclared)."""
+    try:
+        with open(os.path.join(package_dir, 'package.json'), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return 'latest'
+    for section in ('devDependencies', 'dependencies'):
+        version = (manifest.get(section) or {}).get(provider)
+        if version:
+            return version
+    return 'latest'
+
+def provider_fingerprint(package_dir: str, provider: str = COVERAGE_PROVIDER) -> str:
+    """Hash of a package's lockfile and the coverage provider version it asks for."""
+    payload = json.dumps({
+        'lockfile': lockfile_hash(package_dir),
+        'provider': provider,
+        'version': provider_version(package_dir, provider),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
-def extract_webview_coverage_from_file(file_path):
-    """Extract webview coverage from file when run_coverage returns 0."""
+def install_coverage_provider(package_dir: str, provider: str = COVERAGE_PROVIDER) -> bool:
+    """
+    Install a coverage provider in a package unless node_modules already holds it
+    for the same lockfile and provider version.
+    
+    The stamp lives inside node_modules, so an npm ci (which recreates node_modules)
+    invalidates it along with the installed provider.
+    
+    Args:
+        package_dir: Directory containing package.json
+        provider: npm package of the provider
+        
+    Returns:
+        True if the provider was installed, False if the existing install was reused
+        
+    Raises:
+        RuntimeError: If npm install fails
+    """
+    expected = provider_fingerprint(package_dir, provider)
+    modules = os.path.join(package_dir, 'node_modules')
+    stamp = os.path.join(modules, PROVIDER_STAMP)
+    installed = file_exists(os.path.join(modules, *provider.split('/'), 'package.json'))
+    if installed and read_file_content(stamp, default=None) == expected:
+        log(f"Reusing {provider} in {package_dir} (lockfile and provider version unchanged)")
+        return False
+    
+    returncode, stdout, stderr = run_command(
+        ["npm", "install", "--no-save", provider], cwd=package_dir, timeout=INSTALL_TIMEOUT_S
+    )
+    if returncode != 0:
+        raise RuntimeError(f"Failed to install {provider} in {package_dir}: {stderr}")
+    write_file_content(stamp, expected)
+    return True
+
+def prepare_worktree_build(worktree_dir: str, package_dirs=PACKAGE_DIRS) -> None:
+    """
+    Install dependencies and build the extension inside a worktree.
+    
+    Args:
+        worktree_dir: Worktree created by prepare_worktree
+        package_dirs: Directories (relative to the worktree) to install dependencies in
+        
+    Raises:
+        RuntimeError: If installing or building fails
+    """
+    for package_dir in package_dirs:
+        install_dependencies(os.path.normpath(os.path.join(worktree_dir, package_dir)))
+    
+    returncode, stdout, stderr = run_command(['npm', 'run', 'compile'], cwd=worktree_dir, timeout=INSTALL_TIMEOUT_S)
+    if returncode != 0:
+        raise RuntimeError(f"Build failed in {worktree_dir}: {stderr}")
+
+def extract_coverage_from_file(file_path, target):
+    """Extract a target's coverage from its output file when the run returned 0."""
     if not file_exists(file_path):
-        log(f"File {file_path} does not exist, cannot extract webview coverage")
+        log(f"File {file_path} does not exist, cannot extract {target.name} coverage")
         return 0.0
     
     file_size = get_file_size(file_path)
     if file_size == 0:
-        log(f"File {file_path} is empty, cannot extract webview coverage")
+        log(f"File {file_path} is empty, cannot extract {target.name} coverage")
         return 0.0
         
-    log(f"Webview coverage is 0.0, trying to read from file directly: {file_path} (size: {file_size} bytes)")
-    with open(file_path, 'r') as f:
-        content = f.read()
-        # Extract the percentage from the "% Lines" column in the "All files" row
-        # Pattern: All files | xx.xx | xx.xx | xx.xx | xx.xx |
-        all_files_match = re.search(r'All files\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+\d+\.\d+\s+\|\s+(\d+\.\d+)', content)
-        if all_files_match:
-            coverage = float(all_files_match.group(1))
-            log(f"Found webview coverage in file: {coverage}%")
-            return coverage
+    log(f"{target.label} coverage is 0.0, trying to read from file directly: {file_path} (size: {file_size} bytes)")
+    coverage = scan_coverage_file(file_path, target.coverage_type()).coverage_pct
+    if coverage is not None:
+        log(f"Found {target.name} coverage in file: {coverage}%")
+        return coverage
     return 0.0
 
-def run_extension_coverage(branch_name=None):
-    """Run extension coverage tests and extract results."""
+def shard_commands(target, groups, package_dir, shard_root):
+    """
+    Build the command, environment and output file of each shard of a target.
+    
+    vscode-test shards pick their test files and their own VS Code user data and
+    coverage directories through environment variables read by .vscode-test.mjs;
+    vitest shards pass their files and coverage directory to vitest directly.
+    """
+    shards = []
+    for index, files in enumerate(groups):
+        shard_dir = os.path.join(shard_root, f"shard-{index + 1}")
+        os.makedirs(shard_dir, exist_ok=True)
+        env = node_env(target.max_old_space_mb)
+        command = list(target.command)
+        if target.shard_runner == "vscode-test":
+            env[SHARD_FILES_ENV] = os.pathsep.join(files)
+            env[SHARD_DIR_ENV] = shard_dir
+            # Give each shard its own display; xvfb-run -a races when many start at once
+            if command[:2] == ["xvfb-run", "-a"]:
+                command[2:2] = ["-n", str(XVFB_FIRST_DISPLAY + index)]
+        else:
+            separator = ["--"] if command[0] == "npm" else []
+            command += [*separator, f"--coverage.reportsDirectory={os.path.join(shard_dir, 'coverage')}", *files]
+        shards.append({
+            'label': f"{target.name} shard {index + 1}/{len(groups)}",
+            'command': command,
+            'output_file': os.path.join(shard_dir, 'output.txt'),
+            'coverage_dir': os.path.join(shard_dir, 'coverage'),
+            'cwd': package_dir,
+            'env': env,
+            'cpus': target.cpus,
+            'memory_mb': target.memory_mb,
+            'timeout': coverage_timeouts()['timeout'],
+            'idle_timeout': coverage_timeouts()['idle_timeout'],
+        })
+    return shards
+
+def run_test_shards(target, groups, branch_name=None, root=None, pool=None, collect_impact=False, outcomes=None):
+    """
+    Run groups of a target's test files as shards and merge their coverage into the target's coverage directory.
+    
+    Args:
+        target: CoverageTarget with a shard_runner
+        groups: Test files of each shard, relative to the target's directory
+        branch_name: Branch being measured (only used to name output files)
+        root: Repository root (default: current directory)
+        pool: ResourcePool the shards reserve their CPUs and memory from (optional)
+        collect_impact: Also map each source to the tests of the shards that executed it
+        outcomes: Dict that receives whether every shard passed, by target name (optional)
+        
+    Returns:
+        Tuple of (merged CoverageReport, impact map or None); the report is None if a
+        shard wrote no report (partial coverage would look like a drop)
+    """
     prefix = 'base_' if branch_name else ''
-    file_path = f"{prefix}extension_coverage.txt"
+    file_path = f"{prefix}{target.name}_coverage.txt"
+    shard_root = tempfile.mkdtemp(prefix=f"coverage-{target.name}-shards-")
+    try:
+        shard_specs = shard_commands(target, groups, target.package_dir(root), shard_root)
+        log(f"Running {target.name} coverage in {len(shard_specs)} shards ({sum(len(group) for group in groups)} test files)")
+        with phase(f"{prefix}{target.name} tests ({len(shard_specs)} shards)"):
+            exit_codes = run_shards(shard_specs, pool=pool)
+        if outcomes is not None:
+            outcomes[target.name] = all(code == 0 for code in exit_codes)
+        combine_outputs([shard['output_file'] for shard in shard_specs], file_path)
+        
+        reports = [find_structured_report(shard['coverage_dir'], names=['coverage-final.json']) for shard in shard_specs]
+        missing = [shard['label'] for shard, report in zip(shard_specs, reports) if not report]
+        if missing:
+            log(f"No coverage-final.json from {', '.join(missing)} (exit codes {exit_codes}); not merging partial coverage")
+            return None, None
+        
+        with phase(f"{prefix}{target.name} shard merge"):
+            merged = merge_shard_reports(reports, target.coverage_dir(root))
+            impact_map = build_impact_map(zip(groups, reports), root) if collect_impact else None
+        return merged, impact_map
+    finally:
+        shutil.rmtree(shard_root, ignore_errors=True)
+
+def shard_weight(target, root=None):
+    """Weight of a test file for split_into_shards: its size."""
+    package_dir = target.package_dir(root) or '.'
+    return lambda path: get_file_size(os.path.join(package_dir, path))
+
+def run_sharded_coverage(target, branch_name=None, shards=2, root=None, pool=None, outcomes=None):
+    """
+    Run a target split into shards, one test runner process per shard, and merge their coverage.
     
-    # Run coverage tests
-    ext_cov = run_coverage(
-        ["xvfb-run", "-a", "npm", "run", "test:coverage"], 
-        file_path, 
-        "extension"
-    )
+    The merged coverage-final.json and coverage-summary.json are written to the target's
+    usual coverage directory, so everything downstream sees the same files as after
+    an unsharded run.
     
-    # If coverage is 0.0, try to extract from file directly
-    if ext_cov == 0.0:
-        ext_cov = extract_extension_coverage_from_file(file_path)
+    Args:
+        target: CoverageTarget with a shard_runner
+        branch_name: Branch being measured (only used to name output files)
+        shards: Number of shards (capped at the number of test files)
+        root: Repository root (default: current directory)
+        pool: ResourcePool the shards reserve their CPUs and memory from (optional)
+        outcomes: Dict that receives whether the target's tests passed, by target name (optional)
         
-    return ext_cov
+    Returns:
+        Merged line coverage percentage, or None if the target could not be sharded
+        or a shard wrote no report (partial coverage would look like a drop)
+    """
+    tests = find_test_files(target.package_dir(root) or '.', target.test_patterns, target.test_excludes)
+    groups = split_into_shards(tests, shards, weight=shard_weight(target, root))
+    if len(groups) < 2:
+        log(f"Only {len(tests)} {target.name} test files found, running the suite unsharded")
+        return None
+    
+    merged, _ = run_test_shards(target, groups, branch_name, root, pool, outcomes=outcomes)
+    if merged is None:
+        return 0.0
+    return merged.lines_pct() or 0.0
 
-def run_webview_coverage(branch_name=None):
-    """Run webview coverage tests and extract results."""
-    prefix = 'base_' if branch_name else ''
-    file_path = f"{prefix}webview_coverage.txt"
+def run_impacted_coverage(target, impact, branch_name=None, root=None, shards=1, pool=None, outcomes=None):
+    """
+    Run only the target's tests affected since its last mapped base run, and reuse that run for the rest.
     
-    # Save current directory
-    original_dir = os.getcwd()
+    Without a reference run, or when the diff can't be traced through its map, the
+    whole target runs in impact.shards shards (or shards, if more) to build a new map.
+    Either way the result and its map go to impact for the history.
     
-    try:
-        # Change to webview-ui directory
-        os.chdir('webview-ui')
+    Args:
+        target: CoverageTarget with a shard_runner
+        impact: ImpactTracker of this run
+        branch_name: Branch being measured (only used to name output files)
+        root: Repository root (default: current directory)
+        shards: Shards to run the selected tests in
+        pool: ResourcePool the shards reserve their CPUs and memory from (optional)
+        outcomes: Dict that receives whether the tests that ran passed, by target name (optional);
+            nothing is recorded when no test needed to run
         
-        # Install coverage dependency
-        returncode, stdout, stderr = run_command(["npm", "install", "--no-save", "@vitest/coverage-v8"])
-        if returncode != 0:
-            log(f"Failed to install coverage dependency: {stderr}")
+    Returns:
+        Line coverage percentage, 0.0 if it could not be measured
+    """
+    tests = find_test_files(target.package_dir(root) or '.', target.test_patterns, target.test_excludes)
+    reference = impact.references.get(target.name)
+    reason = "no mapped base run"
+    plan = None
+    if reference:
+        commit, impact_map, reference_counts = reference
+        changes = changes_since(commit, cwd=root)
+        if changes is None:
+            reason = f"{commit[:12]} can't be diffed"
+        else:
+            plan = plan_tests(impact_map, tests, changes, target.cwd, impact.target_dirs, root, target.inputs)
+            reason = plan.full_reason
+    
+    if plan is None or plan.full:
+        log(f"Running all {len(tests)} {target.name} test files to map their impact ({reason})")
+        groups = split_into_shards(tests, max(shards, impact.shards), weight=shard_weight(target, root))
+        merged, new_map = run_test_shards(target, groups, branch_name, root, pool, collect_impact=True,
+                                          outcomes=outcomes)
+        if merged is None:
             return 0.0
+        impact.store(target.name, new_map, relativize_report(merged, root))
+        return merged.lines_pct() or 0.0
+    
+    log(f"Rerunning {len(plan.tests)} of {len(tests)} {target.name} test files affected since {commit[:12]}")
+    new_map = impact_map
+    rerun = CoverageReport()
+    if plan.tests:
+        groups = split_into_shards(sorted(plan.tests), shards, weight=shard_weight(target, root))
+        merged, rerun_map = run_test_shards(target, groups, branch_name, root, pool, collect_impact=True,
+                                            outcomes=outcomes)
+        if merged is None:
+            return 0.0
+        rerun = relativize_report(merged, root)
+        new_map = update_impact_map(impact_map, rerun_map, plan.tests, tests)
+    report = combine_file_counts(reference_counts, rerun, plan, impact_map)
+    
+    # Leave the combined numbers where report parsing looks, not the rerun's partial ones
+    coverage_dir = target.coverage_dir(root)
+    os.makedirs(coverage_dir, exist_ok=True)
+    write_coverage_summary(report, os.path.join(coverage_dir, 'coverage-summary.json'))
+    if os.path.exists(os.path.join(coverage_dir, 'coverage-final.json')):
+        os.remove(os.path.join(coverage_dir, 'coverage-final.json'))
+    impact.store(target.name, new_map, report)
+    return report.lines_pct() or 0.0
+
+def run_target_coverage(target, branch_name=None, root=None, shards=1, pool=None, impact=None, outcomes=None):
+    """
+    Run one target's coverage command in its directory under root and extract the result.
+    
+    Args:
+        target: CoverageTarget to run
+        branch_name: Branch being measured (only used to name output files)
+        root: Repository root (default: current directory)
+        shards: Split the target into this many shards, if it has a shard_runner
+        pool: ResourcePool to reserve the target's CPUs and memory from (optional)
+        impact: ImpactTracker to run only the tests affected since the last mapped base run (optional)
+        outcomes: Dict that receives whether the target's tests passed, by target name (optional)
         
-        # Run coverage tests from webview-ui directory
-        web_cov = run_coverage(
-            ["npm", "run", "test:coverage"],
-            os.path.join('..', file_path),
-            "webview"
+    Returns:
+        Line coverage percentage, 0.0 if it could not be measured
+    """
+    prefix = 'base_' if branch_name else ''
+    # The output file stays relative to our directory, wherever the command runs
+    file_path = f"{prefix}{target.name}_coverage.txt"
+    package_dir = target.package_dir(root)
+    
+    if target.coverage_provider:
+        try:
+            with phase(f"{prefix}{target.name} coverage provider install"):
+                install_coverage_provider(package_dir or '.', target.coverage_provider)
+        except RuntimeError as e:
+            log(f"Failed to install coverage dependency: {e}")
+            return 0.0
+    
+    if impact is not None and target.shard_runner:
+        return run_impacted_coverage(target, impact, branch_name, root, shards, pool, outcomes)
+    
+    if shards > 1 and target.shard_runner:
+        sharded_cov = run_sharded_coverage(target, branch_name, shards, root, pool, outcomes)
+        if sharded_cov is not None:
+            return sharded_cov
+    
+    # Run coverage tests
+    started = time.time()
+    outcome = {}
+    with phase(f"{prefix}{target.name} tests"), reserve(pool, target.cpus, target.memory_mb, target.name):
+        coverage = run_coverage(
+            list(target.command),
+            file_path,
+            target.coverage_type(),
+            cwd=package_dir,
+            env=node_env(target.max_old_space_mb),
+            outcome=outcome
         )
-    finally:
-        # Always change back to original directory
-        os.chdir(original_dir)
+    if outcomes is not None:
+        outcomes[target.name] = outcome.get('returncode') == 0
+    
+    # Prefer the exact number from the machine-readable report written by this run
+    with phase(f"{prefix}{target.name} report parsing"):
+        structured_cov = structured_coverage_pct(target.coverage_dir(root), since=started, names=target.report_names())
+    if structured_cov is not None:
+        coverage = structured_cov
     
     # If coverage is 0.0, try to extract from file directly
-    if web_cov == 0.0:
-        web_cov = extract_webview_coverage_from_file(file_path)
+    if coverage == 0.0:
+        coverage = extract_coverage_from_file(file_path, target)
         
-    return web_cov
+    return coverage
 
-def run_branch_coverage(branch_name=None):
+def run_concurrently(jobs):
+    """
+    Run independent jobs in parallel threads and wait for all of them.
+    
+    Each job is expected to spend its time in a subprocess, so threads are enough
+    to keep the suites running side by side.
+    
+    Args:
+        jobs: Dict of job name to zero-argument callable
+        
+    Returns:
+        Dict of job name to the callable's return value
+        
+    Raises:
+        The first exception (including SystemExit) raised by a job, after all jobs finish
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {name: executor.submit(job) for name, job in jobs.items()}
+        for name, future in futures.items():
+            results[name] = future.result()
+    return results
+
+def run_branch_coverage(branch_name=None, parallel=True, worktree_dir=None, shards=1, targets=None, pool=None,
+                        impact=None, outcomes=None):
     """
     Run coverage tests for a branch.
     
     Args:
         branch_name: Name of the branch to checkout before running tests (optional)
+        parallel: Run the targets concurrently, as far as pool allows
+        worktree_dir: Run the branch in this git worktree instead of checking it out in place
+        shards: Split each target into this many concurrently running shards
+        targets: Coverage targets (default: the targets config)
+        pool: ResourcePool bounding the runners alive at once (default: this machine's CPUs and free memory)
+        impact: ImpactTracker to run only the tests affected since the last mapped base run (optional)
+        outcomes: Dict that receives whether each target's tests passed, by target name (optional)
         
     Returns:
-        Tuple of (extension_coverage, webview_coverage)
+        Dict of target name to line coverage percentage
     """
-    # Checkout branch if specified
-    if branch_name:
-        checkout_branch(branch_name)
+    targets = targets or load_targets()
+    root = None
+    if branch_name and worktree_dir:
+        with phase("worktree checkout"):
+            root = prepare_worktree(branch_name, worktree_dir, target_package_dirs(targets))
+        with phase("worktree install and build"):
+            prepare_worktree_build(root, target_package_dirs(targets))
+    elif branch_name:
+        # Checkout branch in place
+        with phase("git fetch and checkout"):
+            checkout_branch(branch_name)
     
     # Run coverage tests
     log(f"=== Running coverage tests{' for ' + branch_name if branch_name else ''} ===")
     
-    # Run extension and webview coverage
-    ext_cov = run_extension_coverage(branch_name)
-    web_cov = run_webview_coverage(branch_name)
+    # The targets share no state. Every target gets a thread; the pool decides which
+    # runner processes (targets or their shards) start, so the largest fit first.
+    if parallel:
+        pool = pool or ResourcePool()
+        log(f"Running {len(targets)} coverage targets on {pool}")
+        ordered = sorted(targets, key=lambda target: (-target.cpus, -target.memory_mb))
+        return run_concurrently({
+            target.name: (lambda target=target: run_target_coverage(target, branch_name, root, shards, pool, impact, outcomes))
+            for target in ordered
+        })
     
-    return ext_cov, web_cov
+    return {target.name: run_target_coverage(target, branch_name, root, shards, impact=impact, outcomes=outcomes)
+            for target in targets}
 
-def find_potential_coverage_files():
-    """Find potential coverage files in the current directory and webview-ui."""
+def find_potential_coverage_files(targets):
+    """Find potential coverage files in the current directory and each target's directory."""
     log("Searching for potential coverage files...")
     
-    # Find files in current directory
-    current_dir_files = list_directory('.')
-    for name, size in current_dir_files:
-        if 'coverage' in name.lower() and size != "DIR":
-            log(f"Found potential coverage file: {name} (size: {size} bytes)")
-    
-    # Find files in webview-ui directory
-    if os.path.exists('webview-ui') and os.path.isdir('webview-ui'):
-        webview_files = list_directory('webview-ui')
-        for name, size in webview_files:
+    for directory in target_package_dirs(targets):
+        if not os.path.isdir(directory):
+            log(f"{directory} directory not found")
+            continue
+        for name, size in list_directory(directory):
             if 'coverage' in name.lower() and size != "DIR":
-                log(f"Found potential webview coverage file: webview-ui/{name} (size: {size} bytes)")
-    else:
-        log("webview-ui directory not found")
+                path = name if directory == '.' else f"{directory}/{name}"
+                log(f"Found potential coverage file: {path} (size: {size} bytes)")
 
-def generate_warnings(base_ext_cov, pr_ext_cov, ext_decreased, ext_diff, 
-                     base_web_cov, pr_web_cov, web_decreased, web_diff):
-    """Generate warnings for coverage decreases."""
-    if not (ext_decreased or web_decreased):
-        return []
-        
-    warnings = [
-        "Test coverage has decreased in this PR",
-        f"Extension coverage: {base_ext_cov}% -> {pr_ext_cov}% (Diff: {ext_diff}%)",
-        f"Webview coverage: {base_web_cov}% -> {pr_web_cov}% (Diff: {web_diff}%)"
-    ]
+def generate_warnings(results):
+    """Generate warnings for coverage decreases and targets below their minimum."""
+    warnings = []
+    if any(result.decreased for result in results):
+        warnings.append("Test coverage has decreased in this PR")
+        warnings.extend(f"{result.target.label} coverage: {result.base}% -> {result.pr}% (Diff: {result.diff}%)"
+                        for result in results)
     
-    # Additional warning for significant decrease (more than 1%)
-    if ext_decreased and ext_diff > 1.0:
-        warnings.append(f"Extension coverage decreased by more than 1% ({ext_diff}%). Consider adding tests to cover your changes.")
-    
-    if web_decreased and web_diff > 1.0:
-        warnings.append(f"Webview coverage decreased by more than 1% ({web_diff}%). Consider adding tests to cover your changes.")
+    # Additional warning for a significant decrease (more than the target's threshold, 1% by default)
+    for result in results:
+        if result.significant:
+            warnings.append(f"{result.target.label} coverage decreased by more than "
+                            f"{result.target.thresholds['significant_decrease']:g}% ({result.diff}%). "
+                            f"Consider adding tests to cover your changes.")
+        if result.below_minimum:
+            warnings.append(f"{result.target.label} coverage {result.pr}% is below its "
+                            f"{result.target.thresholds['min_coverage']}% minimum.")
         
     return warnings
 
@@ -249,79 +699,312 @@ def output_warnings(warnings):
     for warning in warnings:
         log(f"::warning::{warning}")
 
-def output_github_results(pr_ext_cov, pr_web_cov, base_ext_cov, base_web_cov, 
-                         ext_decreased, ext_diff, web_decreased, web_diff):
-    """Output results for GitHub Actions."""
-    set_github_output("pr_extension_coverage", pr_ext_cov)
-    set_github_output("pr_webview_coverage", pr_web_cov)
-    set_github_output("base_extension_coverage", base_ext_cov)
-    set_github_output("base_webview_coverage", base_web_cov)
-    set_github_output("extension_decreased", str(ext_decreased).lower())
-    set_github_output("extension_diff", ext_diff)
-    set_github_output("webview_decreased", str(web_decreased).lower())
-    set_github_output("webview_diff", web_diff)
+def output_comment_status(outcome):
+    """
+    Report how posting the PR comment went, without failing the job over it.
+    
+    Args:
+        outcome: Result of CommentPost.wait
+    """
+    posted = outcome in ('created', 'updated', 'unchanged')
+    set_github_output("comment_posted", str(posted).lower())
+    status = {
+        'created': "posted",
+        'updated': "updated",
+        'unchanged': "unchanged, not rewritten",
+        'timeout': "still being posted when the job finished",
+    }.get(outcome, "could not be posted (see the log)")
+    github_step_summary = os.environ.get('GITHUB_STEP_SUMMARY')
+    if github_step_summary:
+        with open(github_step_summary, 'a') as f:
+            f.write(f"Coverage comment {status}.\n\n")
+    if not posted:
+        log(f"::warning::Coverage comment {status}")
+
+def output_github_results(results, patch_coverage=None):
+    """Output results for GitHub Actions: pr_<target>_coverage, base_<target>_coverage, <target>_decreased and <target>_diff."""
+    for result in results:
+        name = result.target.name
+        set_github_output(f"pr_{name}_coverage", result.pr)
+        set_github_output(f"base_{name}_coverage", result.base)
+        set_github_output(f"{name}_decreased", str(result.decreased).lower())
+        set_github_output(f"{name}_diff", result.diff)
+    set_github_output("coverage_decreased", str(any(result.decreased for result in results)).lower())
+    if patch_coverage is not None and patch_coverage.total:
+        set_github_output("patch_coverage", patch_coverage.pct())
+        set_github_output("patch_uncovered_lines", patch_coverage.total - patch_coverage.covered)
+
+def output_artifact_problems(problems):
+    """Report every missing or corrupt artifact as an error annotation and in the step summary."""
+    for problem in problems:
+        log(f"::error::PR coverage artifact {problem}")
+    github_step_summary = os.environ.get('GITHUB_STEP_SUMMARY')
+    if github_step_summary:
+        with open(github_step_summary, 'a') as f:
+            f.write("### Unusable coverage artifacts\n\n")
+            f.write("".join(f"- `{problem.path}` ({problem.target}): {problem.message}\n" for problem in problems))
+            f.write("\n")
 
-def extract_pr_coverage_from_artifacts():
+def extract_pr_coverage_from_artifacts(targets):
     """
     Extract PR branch coverage from artifact files.
     
+    Args:
+        targets: Coverage targets; each one's artifact globs find its test job's output and reports
+        
     Returns:
-        Tuple of (extension_coverage, webview_coverage)
+        Dict of target name to line coverage percentage
         
     Raises:
-        SystemExit: If the coverage files don't exist
+        SystemExit: If any target's artifacts are missing or corrupt, after reporting all of them
     """
     log("=== Extracting PR branch coverage from artifacts ===")
     
-    # Check if the coverage files exist
-    ext_file_path = "extension_coverage.txt"
-    web_file_path = "webview-ui/webview_coverage.txt"
+    coverage, problems = ingest_artifacts(targets)
+    if problems:
+        log(f"ERROR: {len(problems)} PR coverage artifacts are missing or unusable")
+        output_artifact_problems(problems)
+        find_potential_coverage_files(targets)
+        sys.exit(1)  # Exit with error code to fail the workflow
+    
+    for target in targets:
+        log(f"PR {target.name} coverage from artifacts: {coverage[target.name]}%")
+    return coverage
+
+def get_pr_changes(base_branch):
+    """
+    Get the lines the PR changed relative to the base branch.
+    
+    Args:
+        base_branch: Base branch name
+        
+    Returns:
+        Dict of path to changed line ranges, or None if the diff could not be computed
+    """
+    returncode, stdout, stderr = run_command(['git', 'fetch', 'origin', base_branch])
+    if returncode != 0:
+        log(f"Could not fetch {base_branch} for patch coverage: {stderr}")
+        return None
+    return get_changed_lines(f"origin/{base_branch}")
+
+def load_pr_line_hits(targets):
+    """
+    Load per-line hit counts from the PR's coverage reports (downloaded with the artifacts).
+    
+    Args:
+        targets: Coverage targets
+        
+    Returns:
+        Dict of source path to {line: hits}, empty if no per-line report is available
+    """
+    line_hits = {}
+    for target in targets:
+        path = find_structured_report(target.coverage_dir(), names=['coverage-final.json', 'lcov.info'])
+        if not path:
+            continue
+        try:
+            line_hits.update(load_structured_report(path, keep_lines=True).line_hits)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Could not read per-line coverage from {path}: {e}")
+    return line_hits
+
+def load_target_reports(targets, root=None):
+    """
+    Load the structured report of each coverage target, for per-file history.
     
-    # Extract extension coverage
-    log(f"Extracting extension coverage from {ext_file_path}")
-    if not file_exists(ext_file_path):
-        error_msg = f"ERROR: PR extension coverage file {ext_file_path} not found"
-        log(error_msg)
+    Args:
+        targets: Coverage targets
+        root: Repository root the reports were written under (default: current directory)
         
-        # List directory contents for debugging
-        log("Current directory contents:")
+    Returns:
+        Dict of target name to CoverageReport, for the targets that have a readable report
+    """
+    loaded = {}
+    for target in targets:
+        path = find_structured_report(target.coverage_dir(root), names=target.report_names())
+        if not path:
+            continue
         try:
-            dir_contents = list_directory('.')
-            for name, size in dir_contents:
-                log(f"  {name} - {size}\n")
-        except Exception as e:
-            log(f"Error listing directory: {e}")
+            loaded[target.name] = load_structured_report(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Could not read {target.name} report {path} for the history: {e}")
+    return loaded
+
+def record_history(history, commit, branch, coverage, kind, targets, root=None, pr_number=None, impact=None):
+    """
+    Append measured coverage of every target to the history.
+    
+    Args:
+        history: CoverageHistory
+        commit: Measured commit SHA
+        branch: Branch the commit was measured for
+        coverage: Dict of target name to line coverage percentage
+        kind: "base" or "pr"
+        targets: Coverage targets
+        root: Repository root holding the run's structured reports (default: current directory)
+        pr_number: PR number, if any
+        impact: ImpactTracker whose maps (and combined reports) to store with the runs (optional)
+    """
+    if not commit:
+        log(f"Not recording {kind} coverage in the history: unknown commit")
+        return
+    target_reports = {name: relativize_report(report, root) for name, report in load_target_reports(targets, root).items()}
+    if impact:
+        target_reports.update(impact.reports)
+    for target in targets:
+        # A zero is a failed measurement, not a data point
+        if coverage.get(target.name):
+            run_id = history.record(commit, branch, target.name, coverage[target.name], kind=kind,
+                                    report=target_reports.get(target.name), pr_number=pr_number)
+            if impact and target.name in impact.maps:
+                history.record_test_impact(run_id, impact.maps[target.name])
+    log(f"Recorded {kind} coverage of {commit[:12]} ({branch}) in the history")
+
+def target_fingerprints(targets, commit, cwd=None):
+    """Fingerprint of each target's inputs at a commit; targets that can't be fingerprinted are left out."""
+    fingerprints = {}
+    for target in targets:
+        fingerprint = target_fingerprint(commit, target, targets, cwd)
+        if fingerprint:
+            fingerprints[target.name] = fingerprint
+    return fingerprints
+
+def cached_target_results(cache_dir, fingerprints):
+    """
+    Look up cached results of targets by fingerprint.
+    
+    Args:
+        cache_dir: Cache directory
+        fingerprints: Dict of target name to fingerprint, from target_fingerprints
         
-        sys.exit(1)  # Exit with error code to fail the workflow
+    Returns:
+        Dict of target name to cache entry (see load_target_result), for the hits
+    """
+    hits = {}
+    for name, fingerprint in fingerprints.items():
+        entry = load_target_result(cache_dir, name, fingerprint)
+        if entry:
+            hits[name] = entry
+    return hits
+
+def store_target_results(cache_dir, targets, fingerprints, coverage, kind, commit, passed):
+    """
+    Cache each measured target's result under its fingerprint, if its tests passed.
+    
+    Args:
+        cache_dir: Cache directory
+        targets: Coverage targets that were measured
+        fingerprints: Dict of target name to fingerprint of the measured commit
+        coverage: Dict of target name to line coverage percentage
+        kind: "pr" or "base"
+        commit: Measured commit SHA
+        passed: Dict of target name to whether its tests passed; other targets count as failed
+    """
+    for target in targets:
+        # A zero is a failed measurement, which must not stand in for a run
+        if not coverage.get(target.name) or target.name not in fingerprints:
+            continue
+        try:
+            store_target_result(cache_dir, target.name, fingerprints[target.name], coverage[target.name], kind,
+                                commit, passed.get(target.name) is True)
+        except OSError as e:
+            log(f"Could not cache the {target.name} result: {e}")
+
+def resource_pool(args):
+    """ResourcePool from the command line limits, or None when the targets run one at a time."""
+    if getattr(args, 'sequential', False):
+        return None
+    return ResourcePool(getattr(args, 'max_cpus', None), getattr(args, 'max_memory_mb', None))
+
+def get_base_coverage(args, history=None, targets=None):
+    """
+    Get base branch coverage from the cache or history, or run it and store the result.
     
-    ext_cov = extract_extension_coverage_from_file(ext_file_path)
-    log(f"PR extension coverage from artifact: {ext_cov}%")
+    With args.target_cache, a target whose files at the base commit match the cached result
+    of a green PR or base run reuses it, and only the other targets run.
     
-    # Extract webview coverage
-    log(f"Extracting webview coverage from {web_file_path}")
-    if not file_exists(web_file_path):
-        error_msg = f"ERROR: PR webview coverage file {web_file_path} not found"
-        log(error_msg)
+    Args:
+        args: Command line arguments
+        history: CoverageHistory to look up and record base commits in (optional)
+        targets: Coverage targets (default: the targets config)
         
-        # Check if the webview-ui directory exists
-        if not os.path.exists('webview-ui'):
-            log("ERROR: webview-ui directory not found")
-        else:
-            # List webview-ui directory contents for debugging
-            log("webview-ui directory contents:")
-            try:
-                dir_contents = list_directory('webview-ui')
-                for name, size in dir_contents:
-                    log(f"  {name} - {size}")
-            except Exception as e:
-                log(f"Error listing directory: {e}")
+    Returns:
+        Dict of target name to line coverage percentage
+    """
+    targets = targets or load_targets()
+    names = [target.name for target in targets]
+    cache_dir = None if getattr(args, 'no_cache', False) else (getattr(args, 'cache_dir', None) or DEFAULT_CACHE_DIR)
+    with phase("base coverage cache lookup"):
+        cache_key = base_coverage_cache_key(args.base_branch, target_lockfiles(targets), targets_fingerprint(targets)) if cache_dir else None
+        cached = load_cached_coverage(cache_dir, cache_key) if cache_key else None
         
-        sys.exit(1)  # Exit with error code to fail the workflow
+        # The history outlives cache entries, e.g. when a new cache version drops them
+        if not cached and cache_key and history:
+            base_commit = resolve_commit(f"origin/{args.base_branch}")
+            measured = {name: history.measured(base_commit, name) for name in names} if base_commit else {}
+            if measured and all(measured.values()):
+                log(f"Base commit {base_commit[:12]} was already measured, using the history")
+                cached = measured
+    
+    if cached:
+        log(f"=== Using cached base branch coverage for {args.base_branch} ===")
+        return {name: cached[name] for name in names}
+    
+    # Targets whose files match an earlier PR or base run reuse its result
+    reused = {}
+    fingerprints = {}
+    base_commit = None
+    if cache_key and getattr(args, 'target_cache', False):
+        with phase("target result cache lookup"):
+            base_commit = resolve_commit(f"origin/{args.base_branch}")
+            fingerprints = target_fingerprints(targets, base_commit) if base_commit else {}
+            reused = {name: entry['coverage'] for name, entry in cached_target_results(cache_dir, fingerprints).items()}
+        for name, pct in reused.items():
+            log(f"Reusing cached {name} coverage for {args.base_branch}: {pct}%")
+        if len(reused) == len(targets):
+            coverage = {name: reused[name] for name in names}
+            store_cached_coverage(cache_dir, cache_key, coverage)
+            return coverage
+        targets = [target for target in targets if target.name not in reused]
+    
+    log(f"=== Running base branch coverage for {args.base_branch} ===")
+    worktree_dir = (getattr(args, 'worktree_dir', None) or DEFAULT_WORKTREE_DIR) if getattr(args, 'worktree', False) else None
+    # Maps live in the history, so impact mode needs it
+    impact = None
+    if getattr(args, 'test_impact', False):
+        if history:
+            impact = ImpactTracker(history, args.base_branch, targets, getattr(args, 'impact_shards', None) or IMPACT_SHARDS)
+        else:
+            log("Test impact analysis needs the coverage history, running every test")
+    outcomes = {}
+    coverage = run_branch_coverage(
+        args.base_branch, parallel=not getattr(args, 'sequential', False), worktree_dir=worktree_dir,
+        shards=resolve_shard_count(getattr(args, 'shards', 1)), targets=targets, pool=resource_pool(args),
+        impact=impact, outcomes=outcomes
+    )
     
-    web_cov = extract_webview_coverage_from_file(web_file_path)
-    log(f"PR webview coverage from artifact: {web_cov}%")
+    if history:
+        record_history(history, resolve_commit('HEAD', cwd=worktree_dir), args.base_branch,
+                       coverage, kind='base', targets=targets, root=worktree_dir, impact=impact)
     
-    return ext_cov, web_cov
+    if fingerprints:
+        store_target_results(cache_dir, targets, fingerprints, coverage, 'base', base_commit, outcomes)
+    coverage.update(reused)
+    
+    # Don't cache a failed measurement
+    if cache_key and all(coverage.get(name) for name in names):
+        store_cached_coverage(cache_dir, cache_key, coverage)
+    
+    return coverage
+
+def output_timing(timing_file):
+    """Write the workflow timeline to a JSON file and the GitHub step summary."""
+    try:
+        timeline.write_json(timing_file)
+        timeline.write_step_summary()
+        log(f"Workflow timing written to {timing_file}")
+    except Exception as e:
+        log(f"ERROR writing workflow timing: {e}")
 
 def process_coverage_workflow(args):
     """
@@ -331,92 +1014,122 @@ def process_coverage_workflow(args):
         args: Command line arguments
     """
     # Initialize all variables at the start
-    pr_ext_cov = 0.0
-    pr_web_cov = 0.0
-    base_ext_cov = 0.0
-    base_web_cov = 0.0
-    ext_decreased = False
-    ext_diff = 0.0
-    web_decreased = False
-    web_diff = 0.0
+    targets = []
+    pr_coverage = {}
+    base_coverage = {}
+    results = []
+    patch_coverage = None
+    trend = None
+    comment_post = None
+    history = None if getattr(args, 'no_history', False) else open_history(getattr(args, 'history_db', None) or DEFAULT_HISTORY_DB)
     
     try:
         # Validate branch name
         if not is_valid_branch_name(args.base_branch):
             raise ValueError(f"Invalid base branch name: {args.base_branch}")
         
+        targets = load_targets(getattr(args, 'targets_config', None))
+        log(f"Coverage targets: {', '.join(target.name for target in targets)}")
+        
         # Check if we're running in GitHub Actions
         is_github_actions = 'GITHUB_ACTIONS' in os.environ
         if is_github_actions:
             log("Running in GitHub Actions environment")
         
         # Extract PR branch coverage from artifacts (from test job)
-        pr_ext_cov, pr_web_cov = extract_pr_coverage_from_artifacts()
+        with phase("PR artifact extraction"):
+            pr_coverage = extract_pr_coverage_from_artifacts(targets)
         
         # Verify PR coverage values
-        if pr_ext_cov == 0.0:
-            log("WARNING: PR extension coverage is 0.0, this may indicate an issue with the coverage report")
-            find_potential_coverage_files()
+        for target in targets:
+            if pr_coverage[target.name] == 0.0:
+                log(f"WARNING: PR {target.name} coverage is 0.0, this may indicate an issue with the coverage report")
+                find_potential_coverage_files(targets)
         
-        if pr_web_cov == 0.0:
-            log("WARNING: PR webview coverage is 0.0, this may indicate an issue with the coverage report")
-            find_potential_coverage_files()
+        # Record the PR's numbers, before a base run can overwrite the PR's reports
+        if history:
+            with phase("coverage history"):
+                record_history(
+                    history, resolve_commit('HEAD'), os.environ.get('GITHUB_HEAD_REF') or f"pr-{args.pr_number}",
+                    pr_coverage, kind='pr', targets=targets,
+                    pr_number=int(args.pr_number) if args.pr_number else None
+                )
         
-        # Run base branch coverage
-        log(f"=== Running base branch coverage for {args.base_branch} ===")
-        base_ext_cov, base_web_cov = run_branch_coverage(args.base_branch)
+        # Cache each target's PR result under its fingerprint, for later base runs whose files
+        # match; only the test job knows whether the suites passed, so it has to say so
+        if getattr(args, 'target_cache', False) and not getattr(args, 'no_cache', False):
+            with phase("target result cache"):
+                head_commit = resolve_commit('HEAD')
+                if head_commit:
+                    passed = getattr(args, 'pr_tests_passed', False) is True
+                    store_target_results(
+                        getattr(args, 'cache_dir', None) or DEFAULT_CACHE_DIR, targets,
+                        target_fingerprints(targets, head_commit), pr_coverage, 'pr', head_commit,
+                        {target.name: passed for target in targets}
+                    )
         
-        # Verify base coverage values
-        if base_ext_cov == 0.0:
-            log("WARNING: Base extension coverage is 0.0, this may indicate an issue with the coverage report")
+        # Work out what the PR changed, before a base run can overwrite the PR's reports
+        with phase("patch coverage"):
+            changes = None if getattr(args, 'no_patch_coverage', False) else get_pr_changes(args.base_branch)
+            if changes is not None:
+                line_hits = load_pr_line_hits(targets)
+                if line_hits:
+                    patch_coverage = compute_patch_coverage(line_hits, changes)
+                    log(f"Patch coverage: {patch_coverage.covered}/{patch_coverage.total} changed lines covered")
         
-        if base_web_cov == 0.0:
-            log("WARNING: Base webview coverage is 0.0, this may indicate an issue with the coverage report")
+        if changes is not None and is_coverage_neutral(changes):
+            # Nothing that can move coverage changed, so the base measures the same as the PR
+            log("=== No changes affect coverage, skipping the base branch run ===")
+            base_coverage = dict(pr_coverage)
+        else:
+            # Run base branch coverage, unless this base commit was already measured
+            with phase("base branch coverage"):
+                base_coverage = get_base_coverage(args, history, targets)
         
-        # Compare coverage
-        log("=== Comparing extension coverage ===")
-        ext_decreased, ext_diff = compare_coverage(base_ext_cov, pr_ext_cov)
+        if history:
+            trend = history.branch_trend(args.base_branch, getattr(args, 'trend_commits', None) or DEFAULT_TREND_COMMITS,
+                                         targets=[target.name for target in targets])
+        
+        # Verify base coverage values
+        for target in targets:
+            if base_coverage.get(target.name, 0.0) == 0.0:
+                log(f"WARNING: Base {target.name} coverage is 0.0, this may indicate an issue with the coverage report")
         
-        log("=== Comparing webview coverage ===")
-        web_decreased, web_diff = compare_coverage(base_web_cov, pr_web_cov)
+        # Compare coverage
+        log("=== Comparing coverage ===")
+        results = compare_targets(targets, base_coverage, pr_coverage)
         
         # Print summary of coverage values
         log("\n=== Coverage Summary ===")
-        log(f"PR extension coverage: {pr_ext_cov}%")
-        log(f"Base extension coverage: {base_ext_cov}%")
-        log(f"Extension coverage change: {'+' if not ext_decreased else '-'}{ext_diff}%")
-        log(f"PR webview coverage: {pr_web_cov}%")
-        log(f"Base webview coverage: {base_web_cov}%")
-        log(f"Webview coverage change: {'+' if not web_decreased else '-'}{web_diff}%")
+        for result in results:
+            log(f"PR {result.target.name} coverage: {result.pr}%")
+            log(f"Base {result.target.name} coverage: {result.base}%")
+            log(f"{result.target.label} coverage change: {'+' if not result.decreased else '-'}{result.diff}%")
         
         # Generate and output warnings
-        warnings = generate_warnings(
-            base_ext_cov, pr_ext_cov, ext_decreased, ext_diff,
-            base_web_cov, pr_web_cov, web_decreased, web_diff
-        )
+        warnings = generate_warnings(results)
         output_warnings(warnings)
         
         # Generate comment
         log("=== Generating comment ===")
         comment = generate_comment(
-            base_ext_cov, pr_ext_cov, str(ext_decreased).lower(), ext_diff,
-            base_web_cov, pr_web_cov, str(web_decreased).lower(), web_diff
+            results,
+            patch_coverage=patch_coverage,
+            timing=timeline if getattr(args, 'timing_in_comment', False) else None,
+            trend=trend
         )
         
         # Save comment to file
         with open("coverage_comment.md", "w") as f:
             f.write(comment)
         
-        # Post comment if PR number is provided
+        # Post comment if PR number is provided, in the background: the outputs don't wait on GitHub
         if args.pr_number:
             log(f"=== Posting comment to PR #{args.pr_number} ===")
-            post_comment("coverage_comment.md", args.pr_number, args.repo, args.token)
+            comment_post = CommentPost("coverage_comment.md", args.pr_number, args.repo, args.token)
         
         # Output results for GitHub Actions
-        output_github_results(
-            pr_ext_cov, pr_web_cov, base_ext_cov, base_web_cov,
-            ext_decreased, ext_diff, web_decreased, web_diff
-        )
+        output_github_results(results, patch_coverage=patch_coverage)
         
     except Exception as e:
         log(f"ERROR in process_coverage_workflow: {e}")
@@ -424,9 +1137,13 @@ def process_coverage_workflow(args):
         
         # Try to output results even if there was an error
         try:
-            output_github_results(
-                pr_ext_cov, pr_web_cov, base_ext_cov, base_web_cov,
-                ext_decreased, ext_diff, web_decreased, web_diff
-            )
+            output_github_results(results or compare_targets(targets, base_coverage, pr_coverage))
         except Exception as e2:
             log(f"ERROR outputting GitHub results: {e2}")
+    finally:
+        if comment_post:
+            with phase("wait for comment post"):
+                output_comment_status(comment_post.wait(getattr(args, 'comment_timeout', None)))
+        if history:
+            history.close()
+        output_timing(getattr(args, 'timing_file', None) or DEFAULT_TIMING_FILE)
@@ -3,17 +3,54 @@
 Tests for coverage_check script.
 """
 
+import io
 import os
 import sys
+import json
 import unittest
 import subprocess
+import shutil
 import tempfile
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from unittest.mock import patch, MagicMock, call, mock_open
 
 # Add parent directory to path so we can import coverage modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from coverage_check import extract_coverage, compare_coverage, set_verbose, generate_comment, post_comment, set_github_output
 from coverage_check.util import log, file_exists, get_file_size, list_directory
+from coverage_check import workflow, cache, util, extraction
+from coverage_check.extraction import CoverageSummaryDetector, run_coverage
+from coverage_check.util import stream_command
+from coverage_check import reports, patch as patch_coverage, timing, shards, history, github_api, targets, scheduler, impact, benchmark, artifacts
+
+EXTENSION_REPORT = """  some test output
+=============================== Coverage summary ===============================
+Statements   : 45.10% ( 4510/10000 )
+Branches     : 30.00% ( 300/1000 )
+Functions    : 40.00% ( 400/1000 )
+Lines        : 46.25% ( 4625/10000 )
+================================================================================
+"""
+
+WEBVIEW_REPORT = """ % Coverage report from v8
+-------------------|---------|----------|---------|---------|-------------------
+File               | % Stmts | % Branch | % Funcs | % Lines | Uncovered Line #s 
+-------------------|---------|----------|---------|---------|-------------------
+All files          |   61.50 |    70.25 |   55.00 |   62.75 |                   
+ src               |   61.50 |    70.25 |   55.00 |   62.75 |                   
+"""
+
+# Targets from .github/coverage-targets.json
+TARGETS = targets.load_targets()
+
+
+def target_results(base_ext_cov, pr_ext_cov, base_web_cov, pr_web_cov):
+    """Compared results of the configured extension and webview targets."""
+    return targets.compare_targets(TARGETS, {'extension': base_ext_cov, 'webview': base_web_cov},
+                                   {'extension': pr_ext_cov, 'webview': pr_web_cov})
 
 
 class TestCoverage(unittest.TestCase):
@@ -173,10 +210,7 @@ class TestCoverage(unittest.TestCase):
 
     def test_generate_comment(self):
         """Test generate_comment function."""
-        comment = generate_comment(
-            80, 90, 'false', 10,
-            70, 75, 'false', 5
-        )
+        comment = generate_comment(target_results(80, 90, 70, 75))
         
         # Check that comment contains expected sections
         self.assertIn('Coverage Report', comment)
@@ -194,10 +228,8 @@ class TestCoverage(unittest.TestCase):
         self.assertIn('Coverage increased or remained the same', comment)
         self.assertIn('Test coverage has been maintained or improved', comment)
 
-    @patch('coverage_check.requests.get')
-    @patch('coverage_check.requests.post')
-    @patch('coverage_check.requests.patch')
-    def test_post_comment_new(self, mock_patch, mock_post, mock_get):
+    @patch('coverage_check.requests.Session.request')
+    def test_post_comment_new(self, mock_request):
         """Test post_comment function when creating a new comment."""
         # Create a temporary comment file
         comment_file = os.path.join(self.temp_dir.name, 'comment.md')
@@ -205,21 +237,20 @@ class TestCoverage(unittest.TestCase):
             f.write('<!-- COVERAGE_REPORT -->\nTest comment')
         
         # Mock the API responses
-        mock_get.return_value = MagicMock(status_code=200, json=lambda: [])
-        mock_post.return_value = MagicMock(status_code=201)
+        responses = {
+            'GET': MagicMock(status_code=200, json=lambda: [], links={}, headers={}),
+            'POST': MagicMock(status_code=201),
+        }
+        mock_request.side_effect = lambda method, url, **kwargs: responses[method]
         
         # Test post_comment function
         post_comment(comment_file, '123', 'owner/repo', 'token')
         
         # Check that the correct API calls were made
-        mock_get.assert_called_once()
-        mock_post.assert_called_once()
-        mock_patch.assert_not_called()
-
-    @patch('coverage_check.requests.get')
-    @patch('coverage_check.requests.post')
-    @patch('coverage_check.requests.patch')
-    def test_post_comment_update(self, mock_patch, mock_post, mock_get):
+        self.assertEqual([c.args[0] for c in mock_request.call_args_list], ['GET', 'POST'])
+
+    @patch('coverage_check.requests.Session.request')
+    def test_post_comment_update(self, mock_request):
         """Test post_comment function when updating an existing comment."""
         # Create a temporary comment file
         comment_file = os.path.join(self.temp_dir.name, 'comment.md')
@@ -227,19 +258,22 @@ class TestCoverage(unittest.TestCase):
             f.write('<!-- COVERAGE_REPORT -->\nTest comment')
         
         # Mock the API responses
-        mock_get.return_value = MagicMock(
-            status_code=200, 
-            json=lambda: [{'id': 456, 'body': '<!-- COVERAGE_REPORT -->\nOld comment'}]
-        )
-        mock_patch.return_value = MagicMock(status_code=200)
+        responses = {
+            'GET': MagicMock(
+                status_code=200,
+                json=lambda: [{'id': 456, 'body': '<!-- COVERAGE_REPORT -->\nOld comment'}],
+                links={}, headers={}
+            ),
+            'PATCH': MagicMock(status_code=200),
+        }
+        mock_request.side_effect = lambda method, url, **kwargs: responses[method]
         
         # Test post_comment function
         post_comment(comment_file, '123', 'owner/repo', 'token')
         
         # Check that the correct API calls were made
-        mock_get.assert_called_once()
-        mock_patch.assert_called_once()
-        mock_post.assert_not_called()
+        self.assertEqual([c.args[0] for c in mock_request.call_args_list], ['GET', 'PATCH'])
+        self.assertTrue(mock_request.call_args.args[1].endswith('/repos/owner/repo/issues/comments/456'))
 
     def test_set_github_output(self):
         """Test set_github_output function."""
@@ -278,5 +312,1798 @@ class TestCoverage(unittest.TestCase):
                 ], any_order=False)
 
 
+class TestConcurrentCoverage(unittest.TestCase):
+    """Tests for running the extension and webview suites side by side."""
+
+    @patch('coverage_check.workflow.install_coverage_provider')
+    @patch('coverage_check.workflow.run_coverage')
+    def test_run_branch_coverage_parallel(self, mock_run_coverage, mock_install_provider):
+        """Test that both suites run concurrently, each in its own directory."""
+        def slow_coverage(command, output_file, coverage_type, cwd=None, env=None, outcome=None):
+            time.sleep(0.3)
+            return 80.0 if coverage_type == 'extension' else 70.0
+
+        mock_run_coverage.side_effect = slow_coverage
+        mock_install_provider.return_value = True
+        original_dir = os.getcwd()
+
+        start = time.monotonic()
+        coverage = workflow.run_branch_coverage(pool=scheduler.ResourcePool(cpus=4, memory_mb=16384))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(coverage, {'extension': 80.0, 'webview': 70.0})
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual(os.getcwd(), original_dir)
+
+        calls = {c.args[2]: c for c in mock_run_coverage.call_args_list}
+        self.assertIsNone(calls['extension'].kwargs.get('cwd'))
+        self.assertEqual(calls['webview'].kwargs['cwd'], 'webview-ui')
+        self.assertEqual(calls['webview'].args[1], 'webview_coverage.txt')
+        self.assertIn('--max-old-space-size=', calls['webview'].kwargs['env']['NODE_OPTIONS'])
+        mock_install_provider.assert_called_once_with('webview-ui', '@vitest/coverage-v8')
+
+    def test_run_concurrently_propagates_errors(self):
+        """Test that a failing job's exception reaches the caller after all jobs finish."""
+        finished = []
+
+        def failing():
+            raise SystemExit(1)
+
+        def slow():
+            time.sleep(0.1)
+            finished.append('slow')
+            return 1
+
+        with self.assertRaises(SystemExit):
+            workflow.run_concurrently({'failing': failing, 'slow': slow})
+        self.assertEqual(finished, ['slow'])
+
+
+class TestBaseCoverageCache(unittest.TestCase):
+    """Tests for the base branch coverage cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.repo_dir = os.path.join(self.temp_dir.name, 'repo')
+        os.makedirs(self.repo_dir)
+        self.original_dir = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                       cwd=self.repo_dir, check=True, capture_output=True)
+
+    def commit_lockfile(self, content):
+        with open(os.path.join(self.repo_dir, 'package-lock.json'), 'w') as f:
+            f.write(content)
+        self.git('add', 'package-lock.json')
+        self.git('commit', '-q', '-m', 'lockfile')
+
+    def test_key_tracks_commit_and_lockfiles(self):
+        """Test that the key depends on the commit and on lockfile contents."""
+        self.git('init', '-q')
+        self.commit_lockfile('{"v": 1}')
+        os.chdir(self.repo_dir)
+
+        commit = cache.resolve_commit('HEAD')
+        hashes = cache.lockfile_hashes(commit)
+        self.assertIsNotNone(hashes['package-lock.json'])
+        self.assertIsNone(hashes['webview-ui/package-lock.json'])
+        self.assertEqual(cache.compute_cache_key(commit, hashes), cache.compute_cache_key(commit, dict(hashes)))
+
+        self.commit_lockfile('{"v": 2}')
+        new_commit = cache.resolve_commit('HEAD')
+        new_hashes = cache.lockfile_hashes(new_commit)
+        self.assertNotEqual(hashes, new_hashes)
+        self.assertNotEqual(cache.compute_cache_key(commit, hashes), cache.compute_cache_key(new_commit, new_hashes))
+        self.assertIsNone(cache.resolve_commit('does-not-exist'))
+
+    def test_store_and_load(self):
+        """Test that stored entries round-trip and unknown keys miss."""
+        self.assertIsNone(cache.load_cached_coverage(self.cache_dir, 'missing'))
+        cache.store_cached_coverage(self.cache_dir, 'abc', {'extension': 81.5, 'webview': 64.2})
+        entry = cache.load_cached_coverage(self.cache_dir, 'abc')
+        self.assertEqual((entry['extension'], entry['webview']), (81.5, 64.2))
+        self.assertEqual(os.listdir(self.cache_dir), ['abc.json'])
+
+    @patch('coverage_check.workflow.run_branch_coverage')
+    @patch('coverage_check.workflow.base_coverage_cache_key')
+    def test_get_base_coverage_uses_cache(self, mock_key, mock_run):
+        """Test that a cache hit skips checking out and running the base branch."""
+        mock_key.return_value = 'key1'
+        mock_run.return_value = {'extension': 80.0, 'webview': 70.0}
+        args = MagicMock(base_branch='main', cache_dir=self.cache_dir, no_cache=False, sequential=True, shards=1)
+
+        self.assertEqual(workflow.get_base_coverage(args), {'extension': 80.0, 'webview': 70.0})
+        self.assertEqual(workflow.get_base_coverage(args), {'extension': 80.0, 'webview': 70.0})
+        mock_run.assert_called_once()
+
+        # Failed measurements are not cached
+        mock_key.return_value = 'key2'
+        mock_run.return_value = {'extension': 0.0, 'webview': 70.0}
+        workflow.get_base_coverage(args)
+        workflow.get_base_coverage(args)
+        self.assertEqual(mock_run.call_count, 3)
+
+
+class TestWorktree(unittest.TestCase):
+    """Tests for materializing the base branch in a separate worktree."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.origin = os.path.join(root, 'origin')
+        self.clone = os.path.join(root, 'clone')
+        self.worktree_dir = os.path.join(root, 'worktree')
+        self.git(root, 'init', '-q', '-b', 'main', self.origin)
+        self.commit(self.origin, 'src.ts', 'v1')
+        self.commit(self.origin, 'webview-ui/package.json', '{}')
+        self.git(root, 'clone', '-q', self.origin, self.clone)
+        self.git(self.clone, 'checkout', '-q', '-b', 'feature')
+        self.original_dir = os.getcwd()
+        os.chdir(self.clone)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def git(self, cwd, *args):
+        subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                       cwd=cwd, check=True, capture_output=True)
+
+    def commit(self, repo, name, content):
+        os.makedirs(os.path.dirname(os.path.join(repo, name)), exist_ok=True)
+        with open(os.path.join(repo, name), 'w') as f:
+            f.write(content)
+        self.git(repo, 'add', name)
+        self.git(repo, 'commit', '-q', '-m', name)
+
+    def read(self, *parts):
+        with open(os.path.join(*parts)) as f:
+            return f.read()
+
+    def test_prepare_worktree_leaves_current_tree_alone(self):
+        """Test that the base branch is materialized without touching the PR checkout."""
+        path = workflow.prepare_worktree('main', self.worktree_dir)
+        self.assertEqual(self.read(path, 'src.ts'), 'v1')
+        head = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], capture_output=True, text=True).stdout
+        self.assertEqual(head.strip(), 'feature')
+
+        # node_modules survives moving the worktree to a newer base commit
+        os.makedirs(os.path.join(path, 'node_modules'))
+        with open(os.path.join(path, 'node_modules', 'marker'), 'w') as f:
+            f.write('kept')
+        self.commit(self.origin, 'src.ts', 'v2')
+        workflow.prepare_worktree('main', self.worktree_dir)
+        self.assertEqual(self.read(path, 'src.ts'), 'v2')
+        self.assertEqual(self.read(path, 'node_modules', 'marker'), 'kept')
+
+    def test_stale_worktree_is_recreated(self):
+        """Test that an unregistered leftover directory is replaced but keeps node_modules."""
+        path = workflow.prepare_worktree('main', self.worktree_dir)
+        os.makedirs(os.path.join(path, 'webview-ui', 'node_modules'))
+        os.makedirs(os.path.join(path, 'node_modules'))
+        with open(os.path.join(path, 'webview-ui', 'node_modules', 'marker'), 'w') as f:
+            f.write('kept')
+        # Simulate a fresh clone: the repository no longer knows about the worktree
+        shutil.rmtree(os.path.join(self.clone, '.git', 'worktrees'))
+
+        workflow.prepare_worktree('main', self.worktree_dir)
+        self.assertIn(os.path.realpath(path), workflow.list_worktrees())
+        self.assertEqual(self.read(path, 'webview-ui', 'node_modules', 'marker'), 'kept')
+
+    def test_invalid_branch_name(self):
+        with self.assertRaises(ValueError):
+            workflow.prepare_worktree('main;rm', self.worktree_dir)
+
+    @patch('coverage_check.workflow.run_command')
+    def test_install_dependencies_reuses_matching_lockfile(self, mock_run_command):
+        """Test that npm ci only runs when the lockfile changed since the last install."""
+        mock_run_command.return_value = (0, '', '')
+        package_dir = os.path.join(self.temp_dir.name, 'package')
+        os.makedirs(package_dir)
+        with open(os.path.join(package_dir, 'package-lock.json'), 'w') as f:
+            f.write('{"lockfileVersion": 3}')
+
+        self.assertTrue(workflow.install_dependencies(package_dir))
+        self.assertFalse(workflow.install_dependencies(package_dir))
+        with open(os.path.join(package_dir, 'package-lock.json'), 'w') as f:
+            f.write('{"lockfileVersion": 3, "changed": true}')
+        self.assertTrue(workflow.install_dependencies(package_dir))
+        self.assertEqual(mock_run_command.call_count, 2)
+        mock_run_command.assert_called_with(['npm', 'ci'], cwd=package_dir, timeout=workflow.INSTALL_TIMEOUT_S)
+
+    @patch('coverage_check.workflow.run_command')
+    def test_install_coverage_provider_reuses_prepared_node_modules(self, mock_run_command):
+        """Test that the provider install is skipped until the lockfile or provider version changes."""
+        package_dir = os.path.join(self.temp_dir.name, 'webview')
+        provider_dir = os.path.join(package_dir, 'node_modules', '@vitest', 'coverage-v8')
+
+        def fake_install(command, cwd=None, timeout=None):
+            os.makedirs(provider_dir, exist_ok=True)
+            with open(os.path.join(provider_dir, 'package.json'), 'w') as f:
+                f.write('{}')
+            return 0, '', ''
+
+        def write_manifest(version):
+            with open(os.path.join(package_dir, 'package.json'), 'w') as f:
+                json.dump({'devDependencies': {'@vitest/coverage-v8': version}}, f)
+
+        mock_run_command.side_effect = fake_install
+        os.makedirs(package_dir)
+        with open(os.path.join(package_dir, 'package-lock.json'), 'w') as f:
+            f.write('{"lockfileVersion": 3}')
+        write_manifest('^3.0.9')
+
+        self.assertTrue(workflow.install_coverage_provider(package_dir))
+        self.assertFalse(workflow.install_coverage_provider(package_dir))
+        mock_run_command.assert_called_once_with(
+            ['npm', 'install', '--no-save', '@vitest/coverage-v8'], cwd=package_dir, timeout=workflow.INSTALL_TIMEOUT_S
+        )
+
+        write_manifest('^3.1.0')
+        self.assertTrue(workflow.install_coverage_provider(package_dir))
+        self.assertFalse(workflow.install_coverage_provider(package_dir))
+
+        # A fresh npm ci wipes node_modules, stamp included
+        shutil.rmtree(os.path.join(package_dir, 'node_modules'))
+        self.assertTrue(workflow.install_coverage_provider(package_dir))
+        self.assertEqual(mock_run_command.call_count, 3)
+
+        mock_run_command.side_effect = None
+        mock_run_command.return_value = (1, '', 'network error')
+        write_manifest('^4.0.0')
+        with self.assertRaises(RuntimeError):
+            workflow.install_coverage_provider(package_dir)
+
+
+class TestStreamingCoverage(unittest.TestCase):
+    """Tests for streaming command output and detecting the summary incrementally."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, 'output.txt')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_detector_finds_summary_at_its_line(self):
+        """Test that the percentage is available as soon as the summary line is fed."""
+        for coverage_type, report, expected in (('extension', EXTENSION_REPORT, 46.25), ('webview', WEBVIEW_REPORT, 62.75)):
+            with self.subTest(coverage_type=coverage_type):
+                detector = CoverageSummaryDetector(coverage_type)
+                found_at = [i for i, line in enumerate(report.splitlines()) if detector.feed(line)]
+                self.assertEqual(detector.coverage_pct, expected)
+                self.assertEqual(len(found_at), 1)
+                self.assertIn(str(expected), report.splitlines()[found_at[0]])
+                self.assertTrue(detector.summary_lines)
+
+    def test_detector_ignores_noise(self):
+        detector = CoverageSummaryDetector('extension')
+        for _ in range(1000):
+            detector.feed('noise line without a summary\n')
+        self.assertIsNone(detector.coverage_pct)
+        self.assertEqual(detector.summary_lines, [])
+
+    @patch('coverage_check.util.is_safe_command', return_value=True)
+    def test_stream_command_tees_lines(self, mock_safe):
+        """Test that output reaches the file and the callback line by line, stderr included."""
+        seen = []
+        script = "import sys; print('one'); sys.stderr.write('two' + chr(10)); print('three')"
+        with patch('sys.stdout', new=MagicMock()):
+            returncode = stream_command([sys.executable, '-c', script], self.output_file, on_line=seen.append)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(sorted(seen), ['one\n', 'three\n', 'two\n'])
+        with open(self.output_file) as f:
+            self.assertEqual(sorted(f.read().splitlines()), ['one', 'three', 'two'])
+
+    @patch('coverage_check.util.is_safe_command', return_value=True)
+    @patch('coverage_check.extraction.is_safe_command', return_value=True)
+    @patch('coverage_check.extraction.extract_coverage')
+    def test_run_coverage_uses_streamed_summary(self, mock_extract, mock_safe, mock_util_safe):
+        """Test that run_coverage does not rescan the file when the summary was streamed."""
+        script = f"print({EXTENSION_REPORT!r})"
+        with patch('sys.stdout', new=MagicMock()):
+            coverage = run_coverage([sys.executable, '-c', script], self.output_file, 'extension')
+        self.assertEqual(coverage, 46.25)
+        mock_extract.assert_not_called()
+
+    def test_scan_matches_line_by_line_detection(self):
+        """Test that the single-pass scan finds what feeding every line finds, whatever the chunk boundaries."""
+        noise = ''.join(f"test {i} passed, Lines of output: {i}\n" for i in range(300))
+        for coverage_type, report, expected in (('extension', EXTENSION_REPORT, 46.25), ('webview', WEBVIEW_REPORT, 62.75)):
+            content = noise + report + noise
+            with open(self.output_file, 'w') as f:
+                f.write(content)
+            reference = CoverageSummaryDetector(coverage_type)
+            for line in content.splitlines():
+                reference.feed(line)
+            for chunk_size in (7, 64, 4096, None):
+                with self.subTest(coverage_type=coverage_type, chunk_size=chunk_size):
+                    scan = extraction.scan_chunks(extraction.read_chunks(self.output_file, chunk_size), coverage_type)
+                    self.assertEqual(scan.coverage_pct, expected)
+                    self.assertEqual(scan.summary_lines, reference.summary_lines)
+                    self.assertTrue(content.endswith(scan.tail))
+
+    def test_scan_reports_every_metric(self):
+        with open(self.output_file, 'w') as f:
+            f.write(EXTENSION_REPORT)
+        self.assertEqual(extraction.scan_coverage_file(self.output_file, 'extension').metrics(),
+                         {'statements': 45.1, 'branches': 30.0, 'functions': 40.0, 'lines': 46.25})
+        with open(self.output_file, 'w') as f:
+            f.write(WEBVIEW_REPORT)
+        self.assertEqual(extraction.scan_coverage_file(self.output_file, 'webview').metrics(),
+                         {'statements': 61.5, 'branches': 70.25, 'functions': 55.0, 'lines': 62.75})
+        self.assertEqual(CoverageSummaryDetector('webview').metrics(), {})
+
+    def test_missing_summary_reads_the_file_once(self):
+        """Test that the fallbacks after a miss share one scan, and the diagnostics log its tail."""
+        with open(self.output_file, 'w') as f:
+            for i in range(20000):
+                f.write(f"test {i} passed\n")
+        target = targets.find_target(TARGETS, 'extension')
+        output = io.StringIO()
+        with patch('coverage_check.extraction.read_chunks', wraps=extraction.read_chunks) as mock_read, \
+                patch('sys.stdout', new=output):
+            self.assertEqual(extract_coverage(self.output_file, 'extension'), 0.0)
+            self.assertEqual(workflow.extract_coverage_from_file(self.output_file, target), 0.0)
+        self.assertEqual(mock_read.call_count, 1)
+        self.assertIn('Last 64 KB of the file', output.getvalue())
+        self.assertIn('test 19999 passed', output.getvalue())
+        self.assertNotIn('test 0 passed', output.getvalue())
+
+    def test_extract_coverage_streams_file(self):
+        """Test extract_coverage on a report buried in log noise."""
+        with open(self.output_file, 'w') as f:
+            for i in range(5000):
+                f.write(f"test {i} passed\n")
+            f.write(WEBVIEW_REPORT)
+        with patch('sys.stdout', new=MagicMock()):
+            self.assertEqual(extract_coverage(self.output_file, 'webview'), 62.75)
+
+
+def istanbul_file_entry(path, statement_hits, function_hits=(), branch_hits=()):
+    """Build a coverage-final.json entry with one statement per line, starting at line 1."""
+    return {
+        'path': path,
+        'statementMap': {str(i): {'start': {'line': i + 1, 'column': 0}, 'end': {'line': i + 1, 'column': 10}}
+                         for i in range(len(statement_hits))},
+        's': {str(i): hits for i, hits in enumerate(statement_hits)},
+        'fnMap': {},
+        'f': {str(i): hits for i, hits in enumerate(function_hits)},
+        'branchMap': {},
+        'b': {str(i): list(hits) for i, hits in enumerate(branch_hits)},
+    }
+
+
+class TestStructuredReports(unittest.TestCase):
+    """Tests for the istanbul json and lcov parsers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        return path
+
+    def test_iter_json_object_small_chunks(self):
+        """Test that streaming with tiny chunks decodes the same values as json.load."""
+        data = {'a': {'x': [1, 2, 3], 's': 'text with } and "quotes"'}, 'b': 12345678, 'c': True, 'd': None}
+        path = self.write('data.json', json.dumps(data, indent=2))
+        for chunk_size in (1, 3, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(dict(reports.iter_json_object(path, chunk_size=chunk_size)), data)
+        self.assertEqual(list(reports.iter_json_object(self.write('empty.json', ' { } '))), [])
+
+    def test_parse_coverage_final(self):
+        """Test per-file counts and line hits from coverage-final.json."""
+        path = self.write('coverage-final.json', {
+            '/src/a.ts': istanbul_file_entry('/src/a.ts', [1, 0, 3, 0], function_hits=[1, 0], branch_hits=[(1, 0), (0, 0)]),
+            '/src/b.ts': istanbul_file_entry('/src/b.ts', [2, 2]),
+        })
+        report = reports.parse_coverage_final(path, keep_lines=True)
+        a = report.files['/src/a.ts']
+        self.assertEqual((a.statements_covered, a.statements_total), (2, 4))
+        self.assertEqual((a.functions_covered, a.functions_total), (1, 2))
+        self.assertEqual((a.branches_covered, a.branches_total), (1, 4))
+        self.assertEqual((a.lines_covered, a.lines_total), (2, 4))
+        self.assertEqual(report.line_hits['/src/a.ts'], {1: 1, 2: 0, 3: 3, 4: 0})
+        self.assertEqual((report.total.lines_covered, report.total.lines_total), (4, 6))
+        self.assertEqual(report.lines_pct(), 66.66)
+
+    def test_parse_coverage_summary(self):
+        """Test that the summary's own total is used."""
+        metric = lambda covered, total: {'covered': covered, 'total': total, 'skipped': 0, 'pct': 0}
+        path = self.write('coverage-summary.json', {
+            'total': {m: metric(75, 100) for m in reports.METRICS},
+            '/src/a.ts': {m: metric(75, 100) for m in reports.METRICS},
+        })
+        report = reports.parse_coverage_summary(path)
+        self.assertEqual(report.lines_pct(), 75.0)
+        self.assertEqual(list(report.files), ['/src/a.ts'])
+
+    def test_parse_lcov(self):
+        path = self.write('lcov.info', "TN:\nSF:/src/a.ts\nFNF:2\nFNH:1\nDA:1,5\nDA:2,0\nDA:4,1\nLF:3\nLH:2\n"
+                                       "BRF:2\nBRH:1\nend_of_record\nSF:/src/b.ts\nDA:1,0\nend_of_record\n")
+        report = reports.parse_lcov(path, keep_lines=True)
+        a = report.files['/src/a.ts']
+        self.assertEqual((a.lines_covered, a.lines_total, a.functions_covered, a.branches_total), (2, 3, 1, 2))
+        self.assertEqual(report.line_hits['/src/b.ts'], {1: 0})
+        self.assertEqual(report.lines_pct(), 50.0)
+
+    def test_structured_coverage_pct_prefers_fresh_reports(self):
+        """Test report preference order and that stale reports are ignored."""
+        self.assertIsNone(reports.structured_coverage_pct(self.dir))
+        self.write('lcov.info', "SF:/a.ts\nDA:1,1\nDA:2,0\nend_of_record\n")
+        self.write('coverage-final.json', {'/a.ts': istanbul_file_entry('/a.ts', [1, 1, 1, 0])})
+        with patch('sys.stdout', new=MagicMock()):
+            self.assertEqual(reports.structured_coverage_pct(self.dir), 75.0)
+            self.assertIsNone(reports.structured_coverage_pct(self.dir, since=time.time() + 60))
+
+
+class TestPatchCoverage(unittest.TestCase):
+    """Tests for changed-lines coverage."""
+
+    DIFF = """diff --git a/src/a.ts b/src/a.ts
+index 1111111..2222222 100644
+--- a/src/a.ts
++++ b/src/a.ts
+@@ -3,0 +4,3 @@ function a() {
++const x = 1
++++counter
++const y = 2
+@@ -10 +13 @@ function b() {
+-old
++new
+@@ -20,2 +22,0 @@
+-removed
+-removed
+diff --git a/docs/guide.md b/docs/guide.md
+--- a/docs/guide.md
++++ b/docs/guide.md
+@@ -1 +1 @@
+-a
++b
+diff --git a/src/gone.ts b/src/gone.ts
+deleted file mode 100644
+--- a/src/gone.ts
++++ /dev/null
+@@ -1,2 +0,0 @@
+-x
+-y
+"""
+
+    def test_parse_diff(self):
+        changes = patch_coverage.parse_diff(self.DIFF)
+        self.assertEqual(changes['src/a.ts'], [(4, 6), (13, 13)])
+        self.assertEqual(changes['docs/guide.md'], [(1, 1)])
+        self.assertEqual(changes['src/gone.ts'], [])
+        self.assertFalse(patch_coverage.is_coverage_neutral(changes))
+        self.assertTrue(patch_coverage.is_coverage_neutral({'docs/guide.md': [(1, 1)], 'README.md': []}))
+        self.assertTrue(patch_coverage.is_coverage_neutral({}))
+
+    def test_compute_patch_coverage(self):
+        """Test intersecting line hits with changed ranges, matching paths from another machine."""
+        changes = patch_coverage.parse_diff(self.DIFF)
+        line_hits = {
+            # Absolute path from the CI machine that ran the tests
+            '/home/runner/work/repo/repo/src/a.ts': {1: 1, 4: 2, 5: 0, 6: 0, 7: 1, 13: 1},
+            '/home/runner/work/repo/repo/src/untouched.ts': {1: 0},
+        }
+        result = patch_coverage.compute_patch_coverage(line_hits, changes, root='/elsewhere')
+        self.assertEqual(result.files, {'src/a.ts': {'covered': [4, 13], 'uncovered': [5, 6]}})
+        self.assertEqual((result.covered, result.total, result.pct()), (2, 4, 50.0))
+
+        section = patch_coverage.format_patch_coverage(result)
+        self.assertIn('2 of 4 changed lines covered', section)
+        self.assertIn('| `src/a.ts` | 2/4 | 5-6 |', section)
+
+    def test_large_diff(self):
+        """Test that many ranges over a large file are intersected correctly."""
+        changes = {'big.ts': [(i, i + 4) for i in range(1, 200000, 10)]}
+        line_hits = {'big.ts': {line: line % 2 for line in range(1, 200001)}}
+        result = patch_coverage.compute_patch_coverage(line_hits, changes)
+        self.assertEqual(result.total, 100000)
+        self.assertEqual(result.covered, 60000)
+
+    def test_format_line_ranges(self):
+        self.assertEqual(patch_coverage.format_line_ranges([7, 1, 2, 3, 9, 10]), '1-3, 7, 9-10')
+
+    def test_get_changed_lines(self):
+        """Test the diff against the merge base in a real repository."""
+        with tempfile.TemporaryDirectory() as repo:
+            git = lambda *args: subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args],
+                                               cwd=repo, check=True, capture_output=True)
+            git('init', '-q', '-b', 'main')
+            with open(os.path.join(repo, 'a.ts'), 'w') as f:
+                f.write('one\ntwo\nthree\n')
+            git('add', 'a.ts')
+            git('commit', '-q', '-m', 'base')
+            git('checkout', '-q', '-b', 'feature')
+            with open(os.path.join(repo, 'a.ts'), 'w') as f:
+                f.write('one\nTWO\nthree\nfour\n')
+            git('commit', '-q', '-am', 'change')
+            with patch('sys.stdout', new=MagicMock()):
+                changes = patch_coverage.get_changed_lines('main', cwd=repo)
+        self.assertEqual(changes, {'a.ts': [(2, 2), (4, 4)]})
+
+    def test_comment_includes_patch_section(self):
+        result = patch_coverage.PatchCoverage()
+        result.add('src/a.ts', [1], [2, 3])
+        comment = generate_comment(target_results(80, 80, 70, 70), patch_coverage=result)
+        self.assertIn('### Patch Coverage', comment)
+        self.assertLess(comment.index('### Patch Coverage'), comment.index('### Overall Assessment'))
+
+
+class TestTiming(unittest.TestCase):
+    """Tests for the phase timeline."""
+
+    def test_nested_phases(self):
+        timeline = timing.Timeline()
+        with timeline.phase('outer'):
+            with timeline.phase('inner'):
+                time.sleep(0.05)
+            timeline.record_command(['npm', 'ci'], 0.01, 2048, 0)
+        entries = {entry['name']: entry for entry in timeline.sorted_entries()}
+        self.assertIsNone(entries['outer']['parent'])
+        self.assertEqual(entries['inner']['parent'], 'outer')
+        self.assertEqual(entries['npm ci']['parent'], 'outer')
+        self.assertEqual(entries['outer']['output_bytes'], 2048)
+        self.assertGreaterEqual(entries['outer']['wall_s'], entries['inner']['wall_s'])
+        self.assertGreaterEqual(entries['inner']['wall_s'], 0.05)
+
+        table = timeline.markdown_table()
+        self.assertIn('| outer |', table)
+        self.assertIn('↳ `npm ci`', table)
+        self.assertIn('2 KB', table)
+        self.assertNotIn('npm ci', timeline.comment_section())
+
+    def test_write_outputs(self):
+        timeline = timing.Timeline()
+        with timeline.phase('step'):
+            pass
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path = os.path.join(temp_dir, 'timing.json')
+            summary_path = os.path.join(temp_dir, 'summary.md')
+            timeline.write_json(json_path)
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)['entries'][0]['name'], 'step')
+            with patch.dict('os.environ', {'GITHUB_STEP_SUMMARY': summary_path}):
+                self.assertTrue(timeline.write_step_summary())
+            with open(summary_path) as f:
+                self.assertIn('Coverage Workflow Timing', f.read())
+
+    @patch('coverage_check.util.is_safe_command', return_value=True)
+    def test_stream_command_records_child_usage(self, mock_safe):
+        """Test that streamed commands are recorded with their own CPU time and peak RSS."""
+        with tempfile.TemporaryDirectory() as temp_dir, patch('sys.stdout', new=MagicMock()):
+            output_file = os.path.join(temp_dir, 'out.txt')
+            with timing.phase('streaming'):
+                stream_command([sys.executable, '-c', 'print("x" * 999)'], output_file)
+        command = [e for e in timing.timeline.sorted_entries() if e['kind'] == 'command'][-1]
+        self.assertEqual(command['parent'], 'streaming')
+        self.assertEqual(command['output_bytes'], 1000)
+        self.assertEqual(command['returncode'], 0)
+        if hasattr(os, 'wait4'):
+            self.assertGreater(command['children_peak_rss_mb'], 0)
+            self.assertIsNotNone(command['children_cpu_s'])
+
+
+class TestShardedCoverage(unittest.TestCase):
+    """Tests for splitting suites into shards and merging their coverage."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.original_dir = os.getcwd()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def write_json(self, path, data):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return path
+
+    def test_split_into_shards_balances_weight(self):
+        """Test that files are spread so the heaviest shard stays close to the average."""
+        weights = {'a': 8, 'b': 7, 'c': 6, 'd': 5, 'e': 4, 'f': 2}
+        groups = shards.split_into_shards(list(weights), 3, weight=weights.get)
+        self.assertEqual(sorted(path for group in groups for path in group), sorted(weights))
+        self.assertEqual(sorted(sum(weights[path] for path in group) for group in groups), [10, 11, 11])
+
+        # Never more shards than files
+        self.assertEqual(shards.split_into_shards(['a', 'b'], 8, weight=weights.get), [['a'], ['b']])
+        self.assertEqual(shards.split_into_shards([], 4), [])
+
+    def test_find_test_files_skips_excluded(self):
+        for path in ('src/a.test.js', 'src/test/e2e/b.test.js', 'out/src/c.test.js', 'src/d.js'):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        extension = targets.find_target(TARGETS, 'extension')
+        found = shards.find_test_files('.', extension.test_patterns, extension.test_excludes)
+        self.assertEqual(found, ['out/src/c.test.js', 'src/a.test.js'])
+
+    def test_merge_adds_hits_across_shards(self):
+        """Test that counts of the same file add up, so lines covered by any shard count as covered."""
+        first = self.write_json('one/coverage-final.json', {
+            '/src/a.ts': istanbul_file_entry('/src/a.ts', [1, 0, 0, 0], [1, 0], [[1, 0]]),
+            '/src/only-one.ts': istanbul_file_entry('/src/only-one.ts', [0, 0]),
+        })
+        second = self.write_json('two/coverage-final.json', {
+            '/src/a.ts': istanbul_file_entry('/src/a.ts', [0, 2, 0, 0], [0, 0], [[0, 3]]),
+        })
+        merger = shards.CoverageMerger()
+        merger.add_report(first)
+        merger.add_report(second)
+
+        entry = merger.files['/src/a.ts']
+        self.assertEqual(entry['s'], {'0': 1, '1': 2, '2': 0, '3': 0})
+        self.assertEqual(entry['f'], {'0': 1, '1': 0})
+        self.assertEqual(entry['b'], {'0': [1, 3]})
+        report = merger.report()
+        self.assertEqual(report.total.lines_covered, 2)
+        self.assertEqual(report.total.lines_total, 6)
+        self.assertEqual(report.total.branches_covered, 2)
+
+    def test_merge_matches_differing_maps_by_location(self):
+        """Test that entries instrumented differently are matched by source location."""
+        target = istanbul_file_entry('/src/a.ts', [1, 0])
+        entry = istanbul_file_entry('/src/a.ts', [0, 0, 4])
+        # Same statements, listed under different ids
+        entry['statementMap'] = {'0': entry['statementMap']['2'], '1': entry['statementMap']['1'],
+                                 '2': entry['statementMap']['0']}
+        entry['s'] = {'0': 4, '1': 5, '2': 0}
+        shards.merge_file_coverage(target, entry)
+        self.assertEqual(target['s'], {'0': 1, '1': 5, '2': 4})
+        self.assertEqual(target['statementMap']['2']['start']['line'], 3)
+
+    def test_merged_reports_read_back_like_an_unsharded_run(self):
+        shard_reports = [
+            self.write_json(f'shard-{i}/coverage-final.json',
+                            {'/src/a.ts': istanbul_file_entry('/src/a.ts', hits)})
+            for i, hits in enumerate([[1, 0, 0], [0, 0, 1]])
+        ]
+        merged = shards.merge_shard_reports(shard_reports, 'coverage')
+        self.assertEqual(merged.lines_pct(), 66.66)
+        self.assertEqual(reports.parse_coverage_final('coverage/coverage-final.json').lines_pct(), 66.66)
+        self.assertEqual(reports.parse_coverage_summary('coverage/coverage-summary.json').lines_pct(), 66.66)
+        self.assertEqual(reports.structured_coverage_pct('coverage'), 66.66)
+
+    @patch('coverage_check.workflow.run_shards')
+    def test_run_sharded_webview_coverage(self, mock_run_shards):
+        """Test that each shard gets its own files and report directory and the reports are merged."""
+        for name in ('a', 'b', 'c'):
+            path = os.path.join('webview-ui', 'src', f'{name}.test.ts')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(name * 10)
+
+        def fake_run_shards(specs, pool=None):
+            for index, spec in enumerate(specs):
+                with open(spec['output_file'], 'w') as f:
+                    f.write(f"shard {index} output\n")
+                hits = [1 if i == index else 0 for i in range(4)]
+                self.write_json(os.path.join(spec['coverage_dir'], 'coverage-final.json'),
+                                {'/src/a.ts': istanbul_file_entry('/src/a.ts', hits)})
+            return [0] * len(specs)
+
+        mock_run_shards.side_effect = fake_run_shards
+        coverage = workflow.run_sharded_coverage(targets.find_target(TARGETS, 'webview'), shards=2)
+
+        self.assertEqual(coverage, 50.0)
+        specs = mock_run_shards.call_args.args[0]
+        self.assertEqual(len(specs), 2)
+        files = [arg for spec in specs for arg in spec['command'] if arg.endswith('.test.ts')]
+        self.assertEqual(sorted(files), ['src/a.test.ts', 'src/b.test.ts', 'src/c.test.ts'])
+        for spec in specs:
+            self.assertEqual(spec['cwd'], 'webview-ui')
+            self.assertIn(f"--coverage.reportsDirectory={spec['coverage_dir']}", spec['command'])
+        self.assertEqual(reports.structured_coverage_pct(os.path.join('webview-ui', 'coverage')), 50.0)
+        with open('webview_coverage.txt') as f:
+            self.assertIn('shard 1 output', f.read())
+        # Shard directories are cleaned up
+        self.assertFalse(os.path.exists(specs[0]['output_file']))
+
+    @patch('coverage_check.workflow.run_shards')
+    def test_missing_shard_report_is_not_merged(self, mock_run_shards):
+        for name in ('a', 'b'):
+            os.makedirs('src', exist_ok=True)
+            open(os.path.join('src', f'{name}.test.js'), 'w').close()
+        mock_run_shards.return_value = [1, 1]
+        self.assertEqual(workflow.run_sharded_coverage(targets.find_target(TARGETS, 'extension'), shards=4), 0.0)
+        specs = mock_run_shards.call_args.args[0]
+        self.assertEqual(specs[0]['env'][shards.SHARD_FILES_ENV], 'src/a.test.js')
+        self.assertEqual(specs[0]['command'][:4], ['xvfb-run', '-a', '-n', '100'])
+
+    def test_single_test_file_runs_unsharded(self):
+        os.makedirs('src')
+        open(os.path.join('src', 'a.test.js'), 'w').close()
+        self.assertIsNone(workflow.run_sharded_coverage(targets.find_target(TARGETS, 'extension'), shards=4))
+
+
+class TestCoverageHistory(unittest.TestCase):
+    """Tests for the SQLite coverage history."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history = history.CoverageHistory(os.path.join(self.temp_dir.name, 'cache', 'history.db'))
+
+    def tearDown(self):
+        self.history.close()
+        self.temp_dir.cleanup()
+
+    def report(self, covered, total):
+        report = reports.CoverageReport()
+        counts = reports.CoverageCounts()
+        counts.add('lines', covered, total)
+        counts.add('statements', covered, total)
+        report.add_file('/src/a.ts', counts)
+        return report
+
+    def test_record_replaces_earlier_measurement(self):
+        """Test that re-recording a commit keeps one run and its latest per-file rows."""
+        self.history.record('c1', 'main', 'extension', 50.0, report=self.report(1, 2))
+        self.history.record('c1', 'main', 'extension', 75.0, report=self.report(3, 4))
+        self.assertEqual(self.history.measured('c1', 'extension'), 75.0)
+        self.assertIsNone(self.history.measured('c1', 'webview'))
+        self.assertIsNone(self.history.measured('c1', 'extension', kind='pr'))
+
+        files = self.history.file_coverage('c1', 'extension')
+        self.assertEqual(list(files), ['/src/a.ts'])
+        self.assertEqual((files['/src/a.ts']['lines_covered'], files['/src/a.ts']['lines_total']), (3, 4))
+        count = self.history.conn.execute("SELECT COUNT(*) FROM file_coverage").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_branch_trend_newest_first(self):
+        for index in range(5):
+            self.history.record(f'c{index}', 'main', 'extension', 70.0 + index)
+            self.history.record(f'c{index}', 'main', 'webview', 60.0 + index)
+        self.history.record('pr1', 'feature', 'extension', 99.0, kind='pr')
+
+        trend = self.history.branch_trend('main', limit=3)
+        self.assertEqual([entry['commit'] for entry in trend], ['c4', 'c3', 'c2'])
+        self.assertEqual((trend[0]['extension'], trend[0]['webview']), (74.0, 64.0))
+
+        section = history.format_trend(trend)
+        self.assertIn('last 3 commits', section)
+        self.assertIn('| `c4` | 74.00% | 64.00% |', section)
+        self.assertEqual(history.format_trend([]), '')
+
+    def test_trend_query_uses_index(self):
+        plan = self.history.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT commit_sha, lines_pct, recorded_at FROM coverage_runs "
+            "WHERE branch = ? AND target = ? AND kind = 'base' ORDER BY recorded_at DESC LIMIT ?",
+            ('main', 'extension', 10)
+        ).fetchall()
+        details = ' '.join(row[-1] for row in plan)
+        self.assertIn('idx_coverage_runs_trend', details)
+        self.assertNotIn('TEMP B-TREE', details)
+
+    def test_reopening_keeps_data(self):
+        self.history.record('c1', 'main', 'webview', 60.0)
+        self.history.close()
+        self.history = history.CoverageHistory(self.history.db_path)
+        self.assertEqual(self.history.measured('c1', 'webview'), 60.0)
+        self.assertEqual(self.history.conn.execute("PRAGMA user_version").fetchone()[0], len(history.SCHEMA))
+
+    @patch('coverage_check.workflow.run_branch_coverage')
+    @patch('coverage_check.workflow.resolve_commit')
+    @patch('coverage_check.workflow.base_coverage_cache_key')
+    def test_get_base_coverage_reuses_measured_commit(self, mock_key, mock_resolve, mock_run):
+        """Test that a base commit already in the history is not measured again."""
+        mock_key.return_value = 'key1'
+        mock_resolve.return_value = 'base1'
+        mock_run.return_value = {'extension': 80.0, 'webview': 70.0}
+        args = MagicMock(base_branch='main', cache_dir=os.path.join(self.temp_dir.name, 'json-cache'),
+                         no_cache=False, sequential=True, worktree=False, shards=1)
+
+        self.assertEqual(workflow.get_base_coverage(args, self.history), {'extension': 80.0, 'webview': 70.0})
+        self.assertEqual(self.history.measured('base1', 'extension'), 80.0)
+
+        # Lose the JSON cache entry; the history still knows the commit
+        shutil.rmtree(args.cache_dir)
+        self.assertEqual(workflow.get_base_coverage(args, self.history), {'extension': 80.0, 'webview': 70.0})
+        mock_run.assert_called_once()
+
+    def test_comment_includes_trend(self):
+        self.history.record('abcdef123456', 'main', 'extension', 80.0)
+        comment = generate_comment(target_results(80, 81, 70, 70),
+                                   trend=self.history.branch_trend('main'))
+        self.assertIn('Base branch coverage trend', comment)
+        self.assertIn('`abcdef12`', comment)
+        self.assertLess(comment.index('Overall Assessment'), comment.index('coverage trend'))
+
+
+class FakeGitHub:
+    """
+    Local stand-in for the GitHub REST API, serving one PR's comments.
+
+    Listings are paginated with Link headers and answer If-None-Match with 304;
+    rate_limited makes the next N requests fail with a rate-limit 403, and slow_posts
+    makes the next N POSTs create their comment but answer only after post_delay seconds.
+    """
+
+    def __init__(self, comments=None, per_page=None):
+        self.comments = list(comments or [])
+        self.per_page = per_page
+        self.requests = []
+        self.rate_limited = 0
+        self.slow_posts = 0
+        self.post_delay = 1.0
+        self.next_id = 1000
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def handle_request(self, method):
+                url = urlparse(self.path)
+                fake.requests.append((method, url.path, self.headers.get('If-None-Match')))
+                if fake.rate_limited:
+                    fake.rate_limited -= 1
+                    return self.send_json(403, {'message': 'API rate limit exceeded'}, {
+                        'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 1)
+                    })
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length)) if length else None
+                if method == 'GET' and url.path.endswith('/comments'):
+                    return fake.list_comments(self, url)
+                if method == 'POST' and url.path.endswith('/comments'):
+                    comment = {'id': fake.next_id, 'body': payload['body']}
+                    fake.next_id += 1
+                    fake.comments.append(comment)
+                    if fake.slow_posts:
+                        fake.slow_posts -= 1
+                        time.sleep(fake.post_delay)
+                    return self.send_json(201, comment)
+                if method == 'PATCH':
+                    comment_id = int(url.path.rsplit('/', 1)[-1])
+                    for comment in fake.comments:
+                        if comment['id'] == comment_id:
+                            comment['body'] = payload['body']
+                            return self.send_json(200, comment)
+                self.send_json(404, {'message': 'Not Found'})
+
+            def do_GET(self):
+                self.handle_request('GET')
+
+            def do_POST(self):
+                self.handle_request('POST')
+
+            def do_PATCH(self):
+                self.handle_request('PATCH')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def list_comments(self, handler, url):
+        query = parse_qs(url.query)
+        per_page = self.per_page or int(query.get('per_page', ['30'])[0])
+        page = int(query.get('page', ['1'])[0])
+        items = self.comments[(page - 1) * per_page:page * per_page]
+        etag = f'W/"{hash(json.dumps(items))}"'
+        if handler.headers.get('If-None-Match') == etag:
+            return handler.send_json(304, headers={'ETag': etag})
+        headers = {'ETag': etag}
+        if page * per_page < len(self.comments):
+            headers['Link'] = f'<{self.url}{url.path}?per_page={per_page}&page={page + 1}>; rel="next"'
+        handler.send_json(200, items, headers)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestGitHubClient(unittest.TestCase):
+    """Tests for the GitHub client against a local stand-in server."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.etag_cache = os.path.join(self.temp_dir.name, 'etags.json')
+        self.comment_file = os.path.join(self.temp_dir.name, 'comment.md')
+        with open(self.comment_file, 'w') as f:
+            f.write('<!-- COVERAGE_REPORT -->\nNew report')
+        self.sleeps = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, comments, per_page=None):
+        server = FakeGitHub(comments, per_page)
+        self.addCleanup(server.close)
+        return server
+
+    def client(self, server):
+        return github_api.GitHubClient('token', api_url=server.url, etag_cache_path=self.etag_cache,
+                                       sleep=self.sleeps.append)
+
+    def test_existing_comment_found_beyond_first_page(self):
+        """Test that the coverage comment is updated, not duplicated, on a busy PR."""
+        comments = [{'id': i, 'body': f'comment {i}'} for i in range(1, 6)]
+        comments.append({'id': 99, 'body': '<!-- COVERAGE_REPORT -->\nOld report'})
+        server = self.serve(comments, per_page=2)
+
+        with self.client(server) as client:
+            self.assertEqual(post_comment(self.comment_file, '7', 'owner/repo', client=client), 'updated')
+
+        self.assertEqual(len(server.comments), 6)
+        self.assertEqual(server.comments[-1]['body'], '<!-- COVERAGE_REPORT -->\nNew report')
+        methods = [method for method, _, _ in server.requests]
+        self.assertEqual(methods, ['GET', 'GET', 'GET', 'PATCH'])
+
+    def test_conditional_requests_reuse_cached_pages(self):
+        """Test that a second run revalidates pages with If-None-Match and gets 304s."""
+        server = self.serve([{'id': i, 'body': f'comment {i}'} for i in range(1, 4)], per_page=2)
+        with self.client(server) as client:
+            post_comment(self.comment_file, '7', 'owner/repo', client=client)
+        self.assertEqual(server.comments[-1]['body'], '<!-- COVERAGE_REPORT -->\nNew report')
+        self.assertTrue(os.path.exists(self.etag_cache))
+
+        server.requests.clear()
+        with self.client(server) as client:
+            found = client.find_issue_comment('owner/repo', 7)
+        self.assertEqual(found['id'], server.comments[-1]['id'])
+        # Page 1 is unchanged and revalidated; page 2 changed when the comment was added
+        self.assertIsNotNone(server.requests[0][2])
+        self.assertEqual(len(server.requests), 2)
+
+        server.requests.clear()
+        with self.client(server) as client:
+            self.assertIsNotNone(client.find_issue_comment('owner/repo', 7))
+        self.assertTrue(all(if_none_match for _, _, if_none_match in server.requests))
+
+    def test_rate_limit_waits_for_reset(self):
+        server = self.serve([])
+        server.rate_limited = 2
+        with self.client(server) as client:
+            self.assertIsNone(client.find_issue_comment('owner/repo', 7))
+            self.assertEqual(client.request_count, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 < delay <= github_api.MAX_BACKOFF_S for delay in self.sleeps))
+
+    def test_gives_up_after_max_retries(self):
+        server = self.serve([])
+        server.rate_limited = 10
+        with self.client(server) as client:
+            with self.assertRaises(github_api.GitHubError) as raised:
+                client.find_issue_comment('owner/repo', 7)
+        self.assertEqual(raised.exception.status_code, 403)
+        self.assertEqual(len(server.requests), github_api.MAX_RETRIES + 1)
+
+    @patch('coverage_check.github_api.REQUEST_TIMEOUT_S', 0.2)
+    def test_timed_out_create_is_not_resent(self):
+        """Test that a POST GitHub applied but answered too late leaves one comment, found afterwards."""
+        server = self.serve([{'id': 1, 'body': 'comment 1'}])
+        server.slow_posts = 1
+        with self.client(server) as client:
+            self.assertEqual(post_comment(self.comment_file, '7', 'owner/repo', client=client), 'created')
+        self.assertEqual([method for method, _, _ in server.requests], ['GET', 'POST', 'GET'])
+        self.assertEqual(len(server.comments), 2)
+        self.assertEqual(self.sleeps, [])
+
+        # A rate-limited POST was rejected, so it is sent again
+        server.comments = server.comments[:1]
+        server.requests.clear()
+        with self.client(server) as client:
+            server.rate_limited = 1
+            self.assertEqual(client.create_issue_comment('owner/repo', 7, 'body').status_code, 201)
+        self.assertEqual([method for method, _, _ in server.requests], ['POST', 'POST'])
+        self.assertEqual(len(server.comments), 2)
+
+    def test_unchanged_report_is_not_rewritten(self):
+        """Test that a re-run with the same numbers skips the PATCH despite a new timestamp."""
+        def write_comment(pr_ext_cov):
+            comment = generate_comment(target_results(80, pr_ext_cov, 70, 70))
+            with open(self.comment_file, 'w') as f:
+                f.write(comment)
+            return comment
+
+        server = self.serve([])
+        first = write_comment(80)
+        with self.client(server) as client:
+            post_comment(self.comment_file, '7', 'owner/repo', client=client)
+        self.assertEqual(server.comments[0]['body'], first)
+
+        time.sleep(0.01)
+        second = write_comment(80)
+        self.assertNotEqual(first, second)
+        self.assertEqual(github_api.comment_hash(first), github_api.comment_hash(second))
+        server.requests.clear()
+        with self.client(server) as client:
+            post_comment(self.comment_file, '7', 'owner/repo', client=client)
+        self.assertEqual([method for method, _, _ in server.requests], ['GET'])
+        self.assertEqual(server.comments[0]['body'], first)
+
+        # Changed numbers are written
+        third = write_comment(81)
+        self.assertNotEqual(github_api.comment_hash(first), github_api.comment_hash(third))
+        with self.client(server) as client:
+            post_comment(self.comment_file, '7', 'owner/repo', client=client)
+        self.assertEqual(server.comments[0]['body'], third)
+
+    def test_comment_without_hash_is_updated(self):
+        server = self.serve([{'id': 5, 'body': '<!-- COVERAGE_REPORT -->\nOld report'}])
+        with open(self.comment_file, 'w') as f:
+            f.write(generate_comment(target_results(80, 80, 70, 70)))
+        with self.client(server) as client:
+            post_comment(self.comment_file, '7', 'owner/repo', client=client)
+        self.assertIsNotNone(github_api.comment_hash(server.comments[0]['body']))
+
+    def test_connection_is_reused(self):
+        server = self.serve([{'id': 1, 'body': 'x'}] * 5, per_page=1)
+        with self.client(server) as client:
+            with patch.object(client.session, 'request', wraps=client.session.request) as mock_request:
+                list(client.iter_paginated('repos/owner/repo/issues/7/comments'))
+        self.assertEqual(mock_request.call_count, 5)
+
+
+class TestBackgroundCommentPost(unittest.TestCase):
+    """Tests for posting the PR comment while the workflow writes its outputs."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, 'output')
+        self.summary_file = os.path.join(self.temp_dir.name, 'summary')
+        env = patch.dict(os.environ, {'GITHUB_OUTPUT': self.output_file, 'GITHUB_STEP_SUMMARY': self.summary_file})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    @patch('coverage_check.github_api.post_comment', return_value='created')
+    def test_post_reports_outcome(self, mock_post):
+        with patch('sys.stdout', new=MagicMock()):
+            post = github_api.CommentPost('comment.md', '7', 'owner/repo', 'token')
+            outcome = post.wait(5)
+            workflow.output_comment_status(outcome)
+        self.assertEqual(outcome, 'created')
+        mock_post.assert_called_once_with('comment.md', '7', 'owner/repo', 'token')
+        self.assertIn('comment_posted=true', self.read(self.output_file))
+        self.assertIn('Coverage comment posted.', self.read(self.summary_file))
+
+    def test_slow_post_is_not_waited_for(self):
+        """Test that a hung API call costs the bounded wait, not the job."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with patch('coverage_check.github_api.post_comment', side_effect=lambda *args: release.wait(10)), \
+                patch('sys.stdout', new=MagicMock()):
+            started = time.monotonic()
+            post = github_api.CommentPost('comment.md', '7', 'owner/repo')
+            outcome = post.wait(0.1)
+            workflow.output_comment_status(outcome)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(outcome, 'timeout')
+        self.assertTrue(post._thread.daemon)
+        self.assertIn('comment_posted=false', self.read(self.output_file))
+        self.assertIn('still being posted', self.read(self.summary_file))
+
+    @patch('coverage_check.github_api.post_comment', side_effect=RuntimeError('boom'))
+    def test_failed_post_does_not_raise(self, mock_post):
+        with patch('sys.stdout', new=MagicMock()):
+            post = github_api.CommentPost('comment.md', '7', 'owner/repo')
+            self.assertIsNone(post.wait(5))
+            workflow.output_comment_status(None)
+        self.assertIsInstance(post.error, RuntimeError)
+        self.assertIn('comment_posted=false', self.read(self.output_file))
+
+
+@unittest.skipUnless(os.name == 'posix', 'process groups are POSIX only')
+@patch('coverage_check.util.WATCHDOG_POLL_S', 0.05)
+@patch('coverage_check.util.TERMINATE_GRACE_S', 0.5)
+@patch('coverage_check.util.is_safe_command', return_value=True)
+class TestCommandTimeouts(unittest.TestCase):
+    """Tests for command timeouts, the idle watchdog and salvaging partial output."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, 'output.txt')
+        self.pid_file = os.path.join(self.temp_dir.name, 'grandchild.pid')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def hanging_script(self, before='', ignore_term=False):
+        """Python that prints `before`, spawns a sleeping grandchild and hangs."""
+        return (
+            "import signal, subprocess, sys, time\n"
+            + ("signal.signal(signal.SIGTERM, signal.SIG_IGN)\n" if ignore_term else "")
+            + f"child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            + f"open({self.pid_file!r}, 'w').write(str(child.pid))\n"
+            + f"sys.stdout.write({before!r}); sys.stdout.flush()\n"
+            + "time.sleep(60)\n"
+        )
+
+    def assert_grandchild_stopped(self):
+        with open(self.pid_file) as f:
+            pid = int(f.read())
+        # Reaped by init once its parent is gone; give it a moment
+        for _ in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return
+            time.sleep(0.05)
+        self.fail(f"grandchild {pid} still running")
+
+    def test_run_command_timeout_kills_process_group(self, mock_safe):
+        started = time.monotonic()
+        with patch('sys.stdout', new=MagicMock()):
+            returncode, stdout, stderr = util.run_command(
+                [sys.executable, '-c', self.hanging_script('partial\n')], timeout=1
+            )
+        self.assertEqual(returncode, util.TIMEOUT_EXIT_CODE)
+        self.assertIn('partial', stdout)
+        self.assertIn('Timed out', stderr)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assert_grandchild_stopped()
+
+    def test_idle_watchdog_keeps_partial_output(self, mock_safe):
+        with patch('sys.stdout', new=MagicMock()):
+            returncode = stream_command([sys.executable, '-c', self.hanging_script('line one\n')],
+                                        self.output_file, idle_timeout=0.5)
+        self.assertEqual(returncode, util.TIMEOUT_EXIT_CODE)
+        with open(self.output_file) as f:
+            self.assertEqual(f.read(), 'line one\n')
+        self.assert_grandchild_stopped()
+
+    def test_sigterm_ignored_escalates_to_sigkill(self, mock_safe):
+        started = time.monotonic()
+        with patch('sys.stdout', new=MagicMock()):
+            returncode = stream_command([sys.executable, '-c', self.hanging_script('x\n', ignore_term=True)],
+                                        self.output_file, timeout=0.5)
+        self.assertEqual(returncode, util.TIMEOUT_EXIT_CODE)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assert_grandchild_stopped()
+
+    def test_finished_command_is_not_stopped(self, mock_safe):
+        with patch('sys.stdout', new=MagicMock()):
+            returncode = stream_command([sys.executable, '-c', 'print("done")'], self.output_file,
+                                        timeout=30, idle_timeout=30)
+        self.assertEqual(returncode, 0)
+
+    @patch('coverage_check.extraction.is_safe_command', return_value=True)
+    @patch('coverage_check.extraction.COVERAGE_FINISH_TIMEOUT_S', 0.3)
+    def test_hang_after_summary_is_salvaged(self, mock_extraction_safe, mock_safe):
+        """Test that a runner hanging after printing its summary is stopped quickly and its number kept."""
+        started = time.monotonic()
+        with patch('sys.stdout', new=MagicMock()):
+            coverage = run_coverage([sys.executable, '-c', self.hanging_script(WEBVIEW_REPORT)],
+                                    self.output_file, 'webview')
+        self.assertEqual(coverage, 62.75)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assert_grandchild_stopped()
+
+    @patch('coverage_check.extraction.is_safe_command', return_value=True)
+    @patch('coverage_check.extraction.COVERAGE_IDLE_TIMEOUT_S', 0.5)
+    def test_hang_without_summary_reports_zero(self, mock_extraction_safe, mock_safe):
+        """Test that a runner hanging before any summary is stopped by the idle watchdog."""
+        started = time.monotonic()
+        with patch('sys.stdout', new=MagicMock()):
+            coverage = run_coverage([sys.executable, '-c', self.hanging_script('  some test output\n')],
+                                    self.output_file, 'extension')
+        self.assertEqual(coverage, 0.0)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assert_grandchild_stopped()
+
+
+class TestCoverageTargets(unittest.TestCase):
+    """Tests for config-driven coverage targets and the resource-bounded scheduler."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, 'coverage-targets.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_config(self, entries):
+        with open(self.config_path, 'w') as f:
+            json.dump({'targets': entries}, f)
+        return self.config_path
+
+    def cli_target(self, **overrides):
+        entry = {'name': 'cli', 'label': 'CLI', 'command': ['npm', 'run', 'test:coverage'], 'cwd': 'cli',
+                 'text_format': 'text', 'cpus': 1, 'memory_mb': 1024}
+        entry.update(overrides)
+        return entry
+
+    def test_default_config_matches_the_ci_artifacts(self):
+        self.assertEqual([target.name for target in TARGETS], ['extension', 'webview'])
+        extension, webview = TARGETS
+        self.assertEqual((extension.artifact, webview.artifact), ('extension_coverage.txt', 'webview-ui/webview_coverage.txt'))
+        self.assertEqual((extension.coverage_type(), webview.coverage_type()), ('extension', 'webview'))
+        self.assertEqual(targets.target_lockfiles(TARGETS), ['package-lock.json', 'webview-ui/package-lock.json'])
+        # The webview imports sources of the extension through the @shared alias
+        self.assertIn('src/shared', webview.inputs)
+
+    def test_invalid_configs_are_rejected(self):
+        for entries in ([self.cli_target(), self.cli_target()],
+                        [self.cli_target(name='Bad-Name')],
+                        [self.cli_target(command='npm test')],
+                        [self.cli_target(cwd='../elsewhere')],
+                        [self.cli_target(report_format='xml')],
+                        [self.cli_target(colour='blue')],
+                        [self.cli_target(thresholds={'max_drop': 1})],
+                        []):
+            with self.subTest(entries=entries), self.assertRaises(ValueError):
+                targets.load_targets(self.write_config(entries))
+
+    def test_added_target_flows_through_comment_and_outputs(self):
+        """Test that a target added to the config is compared, commented on and output without code changes."""
+        with open(targets.DEFAULT_TARGETS_CONFIG) as f:
+            entries = json.load(f)['targets']
+        config = self.write_config(entries + [self.cli_target(thresholds={'max_decrease': 0.5, 'min_coverage': 60})])
+        loaded = targets.load_targets(config)
+        results = targets.compare_targets(loaded, {'extension': 80, 'webview': 70, 'cli': 65},
+                                          {'extension': 80, 'webview': 70, 'cli': 64.75})
+
+        cli = results[2]
+        self.assertFalse(cli.decreased)
+        self.assertFalse(cli.below_minimum)
+        comment = generate_comment(results)
+        self.assertIn('### CLI Coverage', comment)
+        self.assertIn('Test coverage has been maintained or improved', comment)
+
+        with patch('coverage_check.workflow.set_github_output') as mock_output:
+            workflow.output_github_results(results)
+        outputs = {c.args[0]: c.args[1] for c in mock_output.call_args_list}
+        self.assertEqual(outputs['pr_cli_coverage'], 64.75)
+        self.assertEqual(outputs['cli_decreased'], 'false')
+        self.assertEqual(outputs['extension_decreased'], 'false')
+        self.assertEqual(outputs['coverage_decreased'], 'false')
+
+        # Past the tolerated decrease and below the minimum
+        results = targets.compare_targets(loaded, {'cli': 65}, {'cli': 58})
+        self.assertTrue(results[2].decreased)
+        self.assertTrue(results[2].below_minimum)
+        warnings = workflow.generate_warnings(results)
+        self.assertIn('CLI coverage: 65.0% -> 58.0% (Diff: 7.0%)', warnings)
+        self.assertTrue(any('below its 60% minimum' in warning for warning in warnings))
+        self.assertTrue(any('decreased by more than 1%' in warning for warning in warnings))
+
+    @patch('coverage_check.workflow.install_coverage_provider')
+    @patch('coverage_check.workflow.run_coverage')
+    def test_run_branch_coverage_runs_every_configured_target(self, mock_run_coverage, mock_install_provider):
+        loaded = targets.load_targets(self.write_config([self.cli_target(), self.cli_target(name='server', cwd='.')]))
+        mock_run_coverage.side_effect = lambda command, output_file, coverage_type, cwd=None, env=None, outcome=None: 50.0
+        coverage = workflow.run_branch_coverage(targets=loaded, pool=scheduler.ResourcePool(cpus=2, memory_mb=4096))
+        self.assertEqual(coverage, {'cli': 50.0, 'server': 50.0})
+        cwds = sorted(str(c.kwargs['cwd']) for c in mock_run_coverage.call_args_list)
+        self.assertEqual(cwds, ['None', 'cli'])
+        mock_install_provider.assert_not_called()
+
+    def test_pool_bounds_concurrency_by_cpu_and_memory(self):
+        """Test that jobs only start while their CPUs and memory fit, and oversized jobs run alone."""
+        pool = scheduler.ResourcePool(cpus=4, memory_mb=2500)
+
+        def job(cpus, memory_mb):
+            with pool.reserve(cpus, memory_mb):
+                time.sleep(0.05)
+
+        def run(jobs):
+            pool.peak_running = 0
+            threads = [threading.Thread(target=job, args=spec) for spec in jobs]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+            return pool.peak_running
+
+        # Memory is the limit: two 1000 MB jobs fit in 2500 MB
+        self.assertEqual(run([(1, 1000)] * 6), 2)
+        # CPUs are the limit
+        self.assertEqual(run([(2, 100)] * 6), 2)
+        # Larger than the whole pool: clamped, so it runs alone instead of waiting forever
+        self.assertEqual(run([(8, 10000), (8, 10000)]), 1)
+        self.assertEqual((pool.used_cpus, pool.used_memory_mb, pool.running), (0, 0, 0))
+
+    @patch('builtins.open', side_effect=OSError)
+    def test_available_memory_falls_back_to_sysconf(self, mock_file):
+        with patch('os.sysconf', side_effect=lambda name: {'SC_AVPHYS_PAGES': 2048, 'SC_PAGE_SIZE': 4096}[name]):
+            self.assertEqual(scheduler.available_memory_mb(), 8)
+
+
+class TestTestImpact(unittest.TestCase):
+    """Tests for mapping sources to tests and rerunning only the affected ones."""
+
+    IMPACT_MAP = {
+        'src/a.ts': {'out/src/a.test.js'},
+        'src/b.ts': {'out/src/b.test.js'},
+        'src/util.ts': {'out/src/b.test.js', 'out/src/c.test.js'},
+        'src/dead.ts': set(),
+    }
+    TESTS = ['out/src/a.test.js', 'out/src/b.test.js', 'out/src/c.test.js']
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = os.path.realpath(self.temp_dir.name)
+        self.original_dir = os.getcwd()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def write(self, path, content=''):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def plan(self, *paths):
+        for path in paths:
+            if 'deleted' not in path:
+                self.write(path)
+        changes = {path.replace('deleted/', ''): [(1, 1)] for path in paths}
+        return impact.plan_tests(self.IMPACT_MAP, self.TESTS, changes, '.', ['.', 'webview-ui'])
+
+    def test_plan_selects_tests_of_changed_sources(self):
+        self.assertEqual(self.plan('src/a.ts').tests, {'out/src/a.test.js'})
+        self.assertEqual(self.plan('src/util.ts', 'README.md').tests, {'out/src/b.test.js', 'out/src/c.test.js'})
+        # Another target's files and sources no test executes select nothing
+        plan = self.plan('webview-ui/src/x.ts', 'src/dead.ts')
+        self.assertFalse(plan.full)
+        self.assertEqual(plan.tests, set())
+
+    def test_plan_changed_test_reruns_tests_sharing_its_sources(self):
+        """Test that a changed test source reruns, with every test that executes the same sources."""
+        plan = self.plan('src/b.test.ts')
+        self.assertEqual(plan.tests, {'out/src/b.test.js', 'out/src/c.test.js'})
+
+    def test_plan_deleted_source_is_dropped(self):
+        plan = self.plan('deleted/src/a.ts')
+        self.assertEqual(plan.deleted_sources, {'src/a.ts'})
+        self.assertEqual(plan.tests, {'out/src/a.test.js'})
+
+    def test_plan_untraceable_changes_run_everything(self):
+        self.assertIn('src/new.ts', self.plan('src/new.ts').full_reason)
+        self.assertIn('new test file', self.plan('src/d.test.ts').full_reason)
+        self.assertTrue(self.plan('package.json').full)
+
+    def test_plan_follows_declared_inputs_outside_the_target(self):
+        """Test that a change to sources the webview imports from the extension isn't skipped."""
+        impact_map = {'webview-ui/src/App.tsx': {'src/App.test.tsx'}, 'src/shared/mcp.ts': {'src/Mcp.test.tsx'}}
+        tests = ['src/App.test.tsx', 'src/Mcp.test.tsx']
+
+        def plan(path, inputs=('src/shared',)):
+            self.write(path)
+            return impact.plan_tests(impact_map, tests, {path: [(1, 1)]}, 'webview-ui', ['.', 'webview-ui'],
+                                     inputs=inputs)
+
+        self.assertEqual(plan('src/shared/mcp.ts').tests, {'src/Mcp.test.tsx'})
+        self.assertIn('src/shared/api.ts', plan('src/shared/api.ts').full_reason)
+        # Extension files the webview doesn't build from can't affect it
+        other = plan('src/core/task.ts')
+        self.assertFalse(other.full)
+        self.assertEqual(other.tests, set())
+        self.assertEqual(plan('src/shared/api.ts', inputs=()).tests, set())
+
+    def test_combine_takes_rerun_counts_only_when_all_their_tests_reran(self):
+        def counts(covered, total):
+            result = reports.CoverageCounts()
+            result.add('lines', covered, total)
+            return result
+
+        reference = {'src/a.ts': counts(5, 10), 'src/util.ts': counts(8, 10), 'src/gone.ts': counts(1, 1)}
+        rerun = reports.CoverageReport()
+        rerun.add_file('src/a.ts', counts(9, 12))
+        rerun.add_file('src/util.ts', counts(2, 10))
+        rerun.add_file('src/new.ts', counts(1, 4))
+        plan = impact.ImpactPlan()
+        plan.tests = {'out/src/a.test.js'}
+        plan.deleted_sources = {'src/gone.ts'}
+        impact_map = dict(self.IMPACT_MAP, **{'src/gone.ts': set()})
+
+        combined = impact.combine_file_counts(reference, rerun, plan, impact_map)
+        lines = {path: (c.lines_covered, c.lines_total) for path, c in combined.files.items()}
+        # util.ts is also executed by tests that didn't rerun, so it keeps its reference counts
+        self.assertEqual(lines, {'src/a.ts': (9, 12), 'src/util.ts': (8, 10), 'src/new.ts': (1, 4)})
+        self.assertEqual(combined.lines_pct(), 69.23)
+
+    def git(self, *args):
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+
+    @patch('coverage_check.workflow.run_shards')
+    def test_base_runs_map_then_rerun_affected_tests(self, mock_run_shards):
+        """Test that a mapped base run is followed by a run of only the tests its diff affects."""
+        target = targets.CoverageTarget('lib', ['npx', 'vitest', 'run', '--coverage'], cwd='lib',
+                                        shard_runner='vitest', test_patterns=['*.test.ts'])
+        # Each test executes its own source; the second run makes a.ts fully covered
+        hits = {'a': [1, 0], 'b': [1, 1], 'c': [0, 0]}
+
+        def fake_run_shards(specs, pool=None):
+            for spec in specs:
+                files = [arg for arg in spec['command'] if arg.endswith('.test.ts')]
+                entries = {}
+                for name in 'abc':
+                    path = os.path.join(self.dir, 'lib', f'{name}.ts')
+                    executed = f'{name}.test.ts' in files
+                    entries[path] = istanbul_file_entry(path, hits[name] if executed else [0, 0])
+                with open(spec['output_file'], 'w') as f:
+                    f.write('done\n')
+                os.makedirs(spec['coverage_dir'])
+                with open(os.path.join(spec['coverage_dir'], 'coverage-final.json'), 'w') as f:
+                    json.dump(entries, f)
+            return [0] * len(specs)
+
+        mock_run_shards.side_effect = fake_run_shards
+        for name in 'abc':
+            self.write(f'lib/{name}.ts', name)
+            self.write(f'lib/{name}.test.ts', name * 10)
+        self.write('.gitignore', 'coverage/\n*_coverage.txt\nhistory.db\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        first = self.git('commit', '-q', '-m', 'first')
+
+        with history.CoverageHistory(os.path.join(self.dir, 'history.db')) as store, \
+                patch('sys.stdout', new=MagicMock()):
+            tracker = impact.ImpactTracker(store, 'main', [target], shards=3)
+            coverage = workflow.run_target_coverage(target, 'main', impact=tracker)
+            self.assertEqual(coverage, 50.0)
+            self.assertEqual(len(mock_run_shards.call_args.args[0]), 3)
+            self.assertEqual(tracker.maps['lib']['lib/a.ts'], {'a.test.ts'})
+            # No test executes c.ts, so changing it reruns nothing
+            self.assertEqual(tracker.maps['lib']['lib/c.ts'], set())
+            workflow.record_history(store, first, 'main', {'lib': coverage}, 'base', [target], impact=tracker)
+
+            self.write('lib/a.ts', 'a changed')
+            self.git('commit', '-q', '-am', 'second')
+            hits['a'] = [1, 1]
+            tracker = impact.ImpactTracker(store, 'main', [target], shards=3)
+            self.assertEqual(tracker.references['lib'][0], first)
+            coverage = workflow.run_target_coverage(target, 'main', impact=tracker)
+
+            specs = mock_run_shards.call_args.args[0]
+            self.assertEqual([arg for spec in specs for arg in spec['command'] if arg.endswith('.test.ts')],
+                             ['a.test.ts'])
+            # a.ts from the rerun, b.ts and c.ts from the first run
+            self.assertEqual(coverage, 66.66)
+            self.assertEqual(reports.structured_coverage_pct(os.path.join('lib', 'coverage')), 66.66)
+            self.assertFalse(os.path.exists(os.path.join('lib', 'coverage', 'coverage-final.json')))
+            self.assertEqual(tracker.maps['lib']['lib/b.ts'], {'b.test.ts'})
+            second = self.git('rev-parse', 'HEAD')
+            workflow.record_history(store, second, 'main', {'lib': coverage}, 'base', [target], impact=tracker)
+
+            # Nothing the map traces changed: nothing reruns and the last numbers stand
+            mock_run_shards.reset_mock()
+            self.write('lib/notes.md', 'notes')
+            self.write('lib/c.ts', 'c changed')
+            self.git('add', '.')
+            self.git('commit', '-q', '-m', 'third')
+            tracker = impact.ImpactTracker(store, 'main', [target], shards=3)
+            self.assertEqual(tracker.references['lib'][0], second)
+            self.assertEqual(workflow.run_target_coverage(target, 'main', impact=tracker), 66.66)
+            mock_run_shards.assert_not_called()
+            self.assertEqual(store.test_impact(store.latest_impact_run('main', 'lib')['run_id'])['lib/c.ts'], set())
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the overhead benchmark."""
+
+    def test_every_case_runs_on_small_inputs(self):
+        """Test that each case parses its synthetic input correctly (measure raises otherwise)."""
+        with patch('sys.stdout', new=MagicMock()):
+            record = benchmark.run_benchmarks([0.02], repeat=1)
+        self.assertEqual([result['case'] for result in record['results']], [case.name for case in benchmark.CASES])
+        for result in record['results']:
+            self.assertGreater(result['input_bytes'], 0.02 * 1024 * 1024 * 0.9)
+            self.assertIsNotNone(result['peak_mb'])
+
+    def test_case_selection(self):
+        with patch('sys.stdout', new=MagicMock()):
+            record = benchmark.run_benchmarks([0.01], ['extract_coverage', 'parse_coverage_final'], repeat=1, memory=False)
+            self.assertEqual([result['case'] for result in record['results']],
+                             ['extract_coverage[extension]', 'extract_coverage[webview]', 'parse_coverage_final'])
+            self.assertIsNone(record['results'][0]['peak_mb'])
+            with self.assertRaises(ValueError):
+                benchmark.run_benchmarks([0.01], ['no_such_case'])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': [{'case': 'a', 'size_mb': 1.0, 'seconds': 1.0, 'peak_mb': 5.0},
+                                {'case': 'b', 'size_mb': 1.0, 'seconds': 1.0, 'peak_mb': 5.0}]}
+        current = {'results': [{'case': 'a', 'size_mb': 1.0, 'seconds': 1.1, 'peak_mb': 5.0},
+                               {'case': 'b', 'size_mb': 1.0, 'seconds': 1.5, 'peak_mb': 9.0},
+                               {'case': 'c', 'size_mb': 1.0, 'seconds': 1.0, 'peak_mb': 1.0}]}
+        rows = benchmark.compare_benchmarks(current, baseline)
+        self.assertEqual([(row['case'], row['regressed']) for row in rows], [('a', False), ('b', True)])
+        self.assertIn('| b | 1.0 | 1.0 | 1.5 | 1.5x ⚠️ | 5.0 → 9.0 |', benchmark.format_comparison(rows))
+
+class TestTargetResultCache(unittest.TestCase):
+    """Tests for reusing a target's result when its files match a cached run."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = os.path.realpath(self.temp_dir.name)
+        self.cache_dir = os.path.join(self.dir, '.coverage-cache')
+        self.original_dir = os.getcwd()
+        os.chdir(self.dir)
+        self.targets = [
+            targets.CoverageTarget('extension', ['npm', 'test'], artifact='extension_coverage.txt'),
+            targets.CoverageTarget('webview', ['npm', 'test'], cwd='webview-ui'),
+        ]
+        for path in ('src/a.ts', 'package-lock.json', 'README.md', 'webview-ui/src/b.ts',
+                     'webview-ui/package-lock.json'):
+            self.write(path, path)
+        self.write('.gitignore', '.coverage-cache/\ncoverage/\n*_coverage.txt\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'first')
+        self.patcher = patch('sys.stdout', new=MagicMock())
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def write(self, path, content=''):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def git(self, *args):
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+
+    def commit_change(self, path):
+        self.write(path, f'{path} changed')
+        return self.git('commit', '-q', '-am', f'change {path}')
+
+    def test_fingerprint_covers_only_the_targets_own_files(self):
+        """Test that a target's fingerprint ignores nested targets and files that can't change coverage."""
+        first = workflow.target_fingerprints(self.targets, 'HEAD')
+        self.assertEqual(set(first), {'extension', 'webview'})
+        files = dict(cache.target_input_files('HEAD', self.targets[0], self.targets))
+        self.assertEqual(sorted(files), ['.gitignore', 'package-lock.json', 'src/a.ts'])
+
+        self.commit_change('webview-ui/src/b.ts')
+        second = workflow.target_fingerprints(self.targets, 'HEAD')
+        self.assertEqual(second['extension'], first['extension'])
+        self.assertNotEqual(second['webview'], first['webview'])
+
+        self.commit_change('README.md')
+        self.assertEqual(workflow.target_fingerprints(self.targets, 'HEAD'), second)
+
+        self.commit_change('package-lock.json')
+        third = workflow.target_fingerprints(self.targets, 'HEAD')
+        self.assertNotEqual(third['extension'], second['extension'])
+        self.assertEqual(third['webview'], second['webview'])
+        self.assertIsNone(cache.target_fingerprint('does-not-exist', self.targets[0], self.targets))
+
+    def test_declared_inputs_outside_the_directory_are_fingerprinted(self):
+        """Test that a change to sources the webview imports from the extension misses its cache."""
+        webview = targets.CoverageTarget('webview', ['npm', 'test'], cwd='webview-ui', inputs=['src/shared'])
+        with_inputs = [self.targets[0], webview]
+        self.write('src/shared/api.ts', 'export const api = 1')
+        self.git('add', '.')
+        head = self.git('commit', '-q', '-m', 'shared')
+        fingerprints = workflow.target_fingerprints(with_inputs, head)
+        self.assertIn('src/shared/api.ts', dict(cache.target_input_files(head, webview, with_inputs)))
+        workflow.store_target_results(self.cache_dir, with_inputs, fingerprints, {'webview': 65.0}, 'pr', head,
+                                      {'webview': True})
+        self.assertEqual(workflow.cached_target_results(self.cache_dir, fingerprints)['webview']['coverage'], 65.0)
+
+        # Only the shared source changed: both suites run again
+        head = self.commit_change('src/shared/api.ts')
+        changed = workflow.target_fingerprints(with_inputs, head)
+        self.assertNotEqual(changed['webview'], fingerprints['webview'])
+        self.assertNotEqual(changed['extension'], fingerprints['extension'])
+        self.assertEqual(workflow.cached_target_results(self.cache_dir, changed), {})
+        # The webview's other neighbours in the extension still don't count
+        head = self.commit_change('src/a.ts')
+        self.assertEqual(workflow.target_fingerprints(with_inputs, head)['webview'], changed['webview'])
+
+    def test_only_passing_runs_are_stored_and_reused(self):
+        """Test that a failed run is never cached, and an entry not recorded as passing is never reused."""
+        self.assertIsNone(cache.load_target_result(self.cache_dir, 'extension', 'f1'))
+        self.assertFalse(cache.store_target_result(self.cache_dir, 'extension', 'f1', 80.0, 'pr', 'abc', False))
+        self.assertIsNone(cache.load_target_result(self.cache_dir, 'extension', 'f1'))
+        self.assertTrue(cache.store_target_result(self.cache_dir, 'extension', 'f1', 80.0, 'pr', 'abc', True))
+        self.assertEqual(cache.load_target_result(self.cache_dir, 'extension', 'f1')['coverage'], 80.0)
+
+        # An entry without the field, e.g. written by hand or by an older run, counts as failed
+        path = cache.target_entry_path(self.cache_dir, 'extension', 'f1')
+        with open(path) as f:
+            entry = json.load(f)
+        del entry['passed']
+        with open(path, 'w') as f:
+            json.dump(entry, f)
+        self.assertIsNone(cache.load_target_result(self.cache_dir, 'extension', 'f1'))
+
+        # A target without a recorded outcome counts as failed too
+        workflow.store_target_results(self.cache_dir, self.targets, {'extension': 'f2', 'webview': 'f3'},
+                                      {'extension': 80.0, 'webview': 60.0}, 'base', 'abc', {'extension': True})
+        self.assertEqual(set(workflow.cached_target_results(self.cache_dir, {'extension': 'f2', 'webview': 'f3'})),
+                         {'extension'})
+
+    def test_prune_keeps_the_newest_entries(self):
+        """Test that old entries of a target are pruned."""
+        for index in range(3):
+            cache.store_target_result(self.cache_dir, 'extension', f'g{index}', 70.0, 'base', None, True)
+            os.utime(cache.target_entry_path(self.cache_dir, 'extension', f'g{index}'), (index + 10, index + 10))
+        cache.prune_target_results(self.cache_dir, 'extension', keep=2)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.cache_dir, 'targets', 'extension'))),
+                         ['g1.json', 'g2.json'])
+
+    @patch('coverage_check.workflow.run_branch_coverage')
+    @patch('coverage_check.workflow.base_coverage_cache_key')
+    def test_base_reuses_pr_result_of_untouched_target(self, mock_key, mock_run):
+        """Test that a webview-only PR never runs the extension suite for the base branch."""
+        base = self.git('rev-parse', 'HEAD')
+        self.git('update-ref', 'refs/remotes/origin/main', base)
+        head = self.commit_change('webview-ui/src/b.ts')
+        workflow.store_target_results(self.cache_dir, self.targets, workflow.target_fingerprints(self.targets, head),
+                                      {'extension': 81.0, 'webview': 65.0}, 'pr', head,
+                                      {'extension': True, 'webview': True})
+
+        mock_key.return_value = 'key'
+        def run_base(*args, outcomes=None, **kwargs):
+            outcomes['webview'] = True
+            return {'webview': 60.0}
+        mock_run.side_effect = run_base
+        args = MagicMock(base_branch='main', cache_dir=self.cache_dir, no_cache=False, target_cache=True,
+                         test_impact=False, worktree=False, sequential=True, shards=1)
+        self.assertEqual(workflow.get_base_coverage(args, targets=self.targets), {'extension': 81.0, 'webview': 60.0})
+        self.assertEqual([target.name for target in mock_run.call_args.kwargs['targets']], ['webview'])
+        # The base webview result is cached under the base commit's fingerprint
+        base_webview = cache.target_fingerprint(base, self.targets[1], self.targets)
+        self.assertEqual(cache.load_target_result(self.cache_dir, 'webview', base_webview)['kind'], 'base')
+
+        # Both targets now hit, so the next PR against this base runs nothing
+        mock_run.reset_mock()
+        mock_key.return_value = 'key2'
+        self.assertEqual(workflow.get_base_coverage(args, targets=self.targets), {'extension': 81.0, 'webview': 60.0})
+        mock_run.assert_not_called()
+
+    @patch('coverage_check.workflow.run_branch_coverage')
+    @patch('coverage_check.workflow.base_coverage_cache_key')
+    def test_failed_base_run_is_not_cached(self, mock_key, mock_run):
+        """Test that a base target whose tests failed is run again next time instead of reused."""
+        base = self.git('rev-parse', 'HEAD')
+        self.git('update-ref', 'refs/remotes/origin/main', base)
+        def run_base(*args, outcomes=None, **kwargs):
+            outcomes.update(extension=True, webview=False)
+            return {'extension': 81.0, 'webview': 60.0}
+        mock_run.side_effect = run_base
+        mock_key.return_value = 'key'
+        args = MagicMock(base_branch='main', cache_dir=self.cache_dir, no_cache=False, target_cache=True,
+                         test_impact=False, worktree=False, sequential=True, shards=1)
+        workflow.get_base_coverage(args, targets=self.targets)
+        fingerprints = workflow.target_fingerprints(self.targets, base)
+        self.assertEqual(set(workflow.cached_target_results(self.cache_dir, fingerprints)), {'extension'})
+
+
+class TestArtifactIngestion(unittest.TestCase):
+    """Tests for finding, validating and aggregating the PR test job's artifacts."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        self.patcher = patch('sys.stdout', new=MagicMock())
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+
+    def test_shard_reports_are_merged_per_target(self):
+        """Test that coverage-final.json artifacts of shards merge, and overlapping summaries are passed over."""
+        target = targets.CoverageTarget('extension', ['npm', 'test'], artifact='shard-*/extension_coverage.txt',
+                                        artifact_reports=['shard-*/coverage/*.json'])
+        for shard, hits in enumerate(([1, 0, 0, 0], [0, 1, 1, 0])):
+            self.write(f'shard-{shard}/extension_coverage.txt', EXTENSION_REPORT)
+            self.write(f'shard-{shard}/coverage/coverage-final.json', {'src/a.ts': istanbul_file_entry('src/a.ts', hits)})
+            self.write(f'shard-{shard}/coverage/coverage-summary.json', {
+                'total': {'lines': {'covered': sum(hits), 'total': 4}},
+                'src/a.ts': {'lines': {'covered': sum(hits), 'total': 4}},
+            })
+
+        coverage, problems = artifacts.ingest_artifacts([target], workers=4)
+        self.assertEqual(problems, [])
+        self.assertEqual(coverage, {'extension': 75.0})
+        # Later readers of the coverage directory see the merged report
+        self.assertEqual(reports.structured_coverage_pct('coverage', names=['coverage-final.json']), 75.0)
+        self.assertEqual(reports.structured_coverage_pct('coverage'), 75.0)
+
+        # Summaries of disjoint files add up; overlapping ones can't be merged
+        summaries = targets.CoverageTarget('extension', ['npm', 'test'], artifact='shard-*/extension_coverage.txt',
+                                           artifact_reports=['shard-*/coverage/*.json'],
+                                           report_format='istanbul-summary')
+        coverage, problems = artifacts.ingest_artifacts([summaries])
+        self.assertEqual(coverage, {})
+        self.assertIn('overlapping reports', problems[0].message)
+
+    def test_console_output_is_the_fallback(self):
+        """Test that a target without structured reports takes the coverage of its one console output."""
+        extension = targets.CoverageTarget('extension', ['npm', 'test'], artifact='extension_coverage.txt')
+        webview = targets.CoverageTarget('webview', ['npm', 'test'], cwd='webview-ui', text_format='text',
+                                         artifact='webview-ui/*_coverage.txt')
+        self.write('extension_coverage.txt', EXTENSION_REPORT)
+        self.write('webview-ui/webview_coverage.txt', WEBVIEW_REPORT)
+        self.assertEqual(workflow.extract_pr_coverage_from_artifacts([extension, webview]),
+                         {'extension': 46.25, 'webview': 62.75})
+
+        self.write('webview-ui/second_coverage.txt', WEBVIEW_REPORT)
+        coverage, problems = artifacts.ingest_artifacts([extension, webview])
+        self.assertEqual(coverage, {'extension': 46.25})
+        self.assertIn('2 console outputs', problems[0].message)
+
+    def test_every_problem_is_reported_at_once(self):
+        """Test that missing and corrupt artifacts of every target are reported before the workflow fails."""
+        extension = targets.CoverageTarget('extension', ['npm', 'test'], artifact='extension_coverage.txt')
+        webview = targets.CoverageTarget('webview', ['npm', 'test'], cwd='webview-ui', text_format='text',
+                                         artifact='webview-ui/webview_coverage.txt')
+        lib = targets.CoverageTarget('lib', ['npm', 'test'], cwd='lib', artifact='lib/lib_coverage.txt')
+        self.write('webview-ui/webview_coverage.txt', WEBVIEW_REPORT)
+        self.write('webview-ui/coverage/coverage-final.json', '{"src/a.ts": {"s": ')
+        self.write('webview-ui/coverage/coverage-summary.json', '')
+        self.write('lib/lib_coverage.txt', 'tests failed before the coverage summary\n')
+
+        summary_path = os.path.join(self.temp_dir.name, 'summary.md')
+        with patch.dict(os.environ, {'GITHUB_STEP_SUMMARY': summary_path}), \
+                self.assertRaises(SystemExit) as exit_context:
+            workflow.extract_pr_coverage_from_artifacts([extension, webview, lib])
+        self.assertEqual(exit_context.exception.code, 1)
+
+        _, problems = artifacts.ingest_artifacts([extension, webview, lib])
+        self.assertEqual([(problem.target, problem.path) for problem in problems], [
+            ('extension', 'extension_coverage.txt'),
+            ('webview', os.path.join('webview-ui', 'coverage', 'coverage-summary.json')),
+            ('webview', os.path.join('webview-ui', 'coverage', 'coverage-final.json')),
+            ('lib', os.path.join('lib', 'lib_coverage.txt')),
+        ])
+        self.assertEqual(problems[0].message, 'no file matches')
+        self.assertEqual(problems[1].message, 'empty file')
+        with open(summary_path) as f:
+            summary = f.read()
+        self.assertEqual(summary.count('\n- '), 4)
+
+    def test_artifact_globs_stay_inside_the_repository(self):
+        with self.assertRaises(ValueError):
+            targets.CoverageTarget.from_dict({'name': 'x', 'command': ['npm', 'test'],
+                                              'artifact_reports': ['../elsewhere/*.json']})
+        target = targets.CoverageTarget('webview', ['npm', 'test'], cwd='webview-ui', report_format='istanbul')
+        self.assertEqual(target.artifact_reports, [os.path.join('webview-ui', 'coverage', 'coverage-final.json')])
+
+
 if __name__ == '__main__':
     unittest.main()
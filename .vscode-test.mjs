@@ -1,8 +1,13 @@
 import { defineConfig } from "@vscode/test-cli"
 import path from "path"
 
+// Set by .github/scripts/coverage_check to run one shard of the suite: its test files,
+// and a directory for the shard's own VS Code user data and coverage output
+const shardFiles = process.env.COVERAGE_SHARD_FILES?.split(path.delimiter)
+const shardDir = process.env.COVERAGE_SHARD_DIR
+
 export default defineConfig({
-	files: "{out/**/*.test.js,src/**/*.test.js,!src/test/e2e/**/*.test.js,!out/src/test/e2e/**/*.test.js}",
+	files: shardFiles ?? "{out/**/*.test.js,src/**/*.test.js,!src/test/e2e/**/*.test.js,!out/src/test/e2e/**/*.test.js}",
 	mocha: {
 		ui: "bdd",
 		timeout: 20000, // Maximum time (in ms) that a test can run before failing
@@ -14,5 +19,10 @@ export default defineConfig({
 	workspaceFolder: "test-workspace",
 	version: "stable",
 	extensionDevelopmentPath: path.resolve("./"),
-	launchArgs: ["--disable-extensions"],
+	launchArgs: ["--disable-extensions", ...(shardDir ? [`--user-data-dir=${path.join(shardDir, "user-data")}`] : [])],
+	coverage: {
+		// text-summary for the console, json-summary and json for .github/scripts/coverage_check
+		reporter: ["text-summary", "html", "json-summary", "json"],
+		...(shardDir && { output: path.join(shardDir, "coverage") }),
+	},
 })
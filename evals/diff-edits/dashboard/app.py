@@ -9,8 +9,14 @@ from datetime import datetime
 import os
 import json
 import difflib
+import time
 # import mimetypes # No longer needed here if guess_language_from_filepath handles it
 from utils import get_database_connection, guess_language_from_filepath # Import from utils
+from queries import (
+    ALL_RUNS_QUERY, RUN_QUERY, LATEST_RUN_QUERY, MODEL_PERFORMANCE_QUERY,
+    build_detailed_results_query
+)
+from live import LiveRunAggregator, MODEL_PERFORMANCE_COLUMNS
 
 # Page config
 st.set_page_config(
@@ -209,13 +215,7 @@ def load_all_runs():
     """Load all evaluation runs"""
     conn = get_database_connection()
     
-    query = """
-    SELECT run_id, description, created_at, system_prompt_hash
-    FROM runs 
-    ORDER BY created_at DESC
-    """
-    
-    return pd.read_sql_query(query, conn)
+    return pd.read_sql_query(ALL_RUNS_QUERY, conn)
 
 @st.cache_data
 def load_run_comparison(run_id):
@@ -223,40 +223,13 @@ def load_run_comparison(run_id):
     conn = get_database_connection()
     
     # Get the run details
-    run_query = f"""
-    SELECT run_id, description, created_at, system_prompt_hash
-    FROM runs 
-    WHERE run_id = '{run_id}'
-    """
-    run_data = pd.read_sql_query(run_query, conn)
+    run_data = pd.read_sql_query(RUN_QUERY, conn, params=[run_id])
     
     if run_data.empty:
         return None, None
     
     # Get model performance for this run
-    model_perf_query = f"""
-    SELECT 
-        res.model_id,
-        COUNT(*) as total_results,
-        AVG(CASE WHEN res.succeeded THEN 1.0 ELSE 0.0 END) as success_rate,
-        AVG(res.cost_usd) as avg_cost,
-        SUM(res.cost_usd) as total_cost,
-        AVG(res.time_to_first_token_ms) as avg_first_token_ms,
-        AVG(res.time_to_first_edit_ms) as avg_first_edit_ms,
-        AVG(res.time_round_trip_ms) as avg_round_trip_ms,
-        AVG(res.completion_tokens) as avg_completion_tokens,
-        AVG(res.num_edits) as avg_num_edits,
-        MIN(res.time_round_trip_ms) as min_round_trip_ms,
-        MAX(res.time_round_trip_ms) as max_round_trip_ms
-    FROM results res
-    JOIN cases c ON res.case_id = c.case_id
-    WHERE c.run_id = '{run_id}'
-      AND (res.error_enum NOT IN (1, 6, 7) OR res.error_enum IS NULL)  -- Exclude: no_tool_calls, wrong_tool_call, wrong_file_edited
-    GROUP BY res.model_id
-    ORDER BY success_rate DESC, avg_round_trip_ms ASC
-    """
-    
-    model_performance = pd.read_sql_query(model_perf_query, conn)
+    model_performance = pd.read_sql_query(MODEL_PERFORMANCE_QUERY, conn, params=[run_id])
     
     return run_data.iloc[0], model_performance
 
@@ -266,13 +239,7 @@ def load_latest_run_comparison():
     conn = get_database_connection()
     
     # Get the latest run
-    latest_run_query = """
-    SELECT run_id, description, created_at, system_prompt_hash
-    FROM runs 
-    ORDER BY created_at DESC 
-    LIMIT 1
-    """
-    latest_run = pd.read_sql_query(latest_run_query, conn)
+    latest_run = pd.read_sql_query(LATEST_RUN_QUERY, conn)
     
     if latest_run.empty:
         return None, None
@@ -284,37 +251,32 @@ def load_detailed_results(run_id, model_id=None, valid_only=False):
     """Load detailed results for drill-down analysis"""
     conn = get_database_connection()
     
-    where_clause = f"WHERE c.run_id = '{run_id}'"
-    if model_id:
-        where_clause += f" AND res.model_id = '{model_id}'"
-    
-    # Option to filter out invalid attempts
-    if valid_only:
-        where_clause += " AND (res.error_enum NOT IN (1, 6, 7) OR res.error_enum IS NULL)"
-    
-    query = f"""
-    SELECT 
-        res.*,
-        c.task_id,
-        c.description as case_description,
-        c.tokens_in_context,
-        sp.name as system_prompt_name,
-        pf.name as processing_functions_name,
-        orig_f.filepath as original_filepath,
-        orig_f.content as original_file_content,
-        edit_f.filepath as edited_filepath,
-        edit_f.content as edited_file_content
-    FROM results res
-    JOIN cases c ON res.case_id = c.case_id
-    LEFT JOIN system_prompts sp ON c.system_prompt_hash = sp.hash
-    LEFT JOIN processing_functions pf ON res.processing_functions_hash = pf.hash
-    LEFT JOIN files orig_f ON c.file_hash = orig_f.hash
-    LEFT JOIN files edit_f ON res.file_edited_hash = edit_f.hash
-    {where_clause}
-    ORDER BY res.created_at DESC
-    """
-    
-    return pd.read_sql_query(query, conn)
+    query, params = build_detailed_results_query(run_id, model_id, valid_only)
+    
+    return pd.read_sql_query(query, conn, params=params)
+
+def load_live_run_comparison(run_id):
+    """Fold results written since the last refresh into the live aggregates for a run"""
+    conn = get_database_connection()
+    
+    run_data = pd.read_sql_query(RUN_QUERY, conn, params=[run_id])
+    if run_data.empty:
+        return None, None
+    
+    # Keep the aggregator across reruns; start over when the selected run changes
+    aggregator = st.session_state.get('live_aggregator')
+    if aggregator is None or aggregator.run_id != run_id:
+        aggregator = LiveRunAggregator(run_id)
+        st.session_state.live_aggregator = aggregator
+    aggregator.poll(conn)
+    
+    model_performance = pd.DataFrame(aggregator.to_records(), columns=MODEL_PERFORMANCE_COLUMNS)
+    return run_data.iloc[0], model_performance
+
+def schedule_live_refresh(interval_seconds):
+    """Wait for the refresh interval, then rerun the script to poll for new results"""
+    time.sleep(interval_seconds)
+    st.rerun()
 
 def get_performance_grade(success_rate):
     """Get performance grade based on success rate"""
@@ -1091,14 +1053,40 @@ def main():
         </script>
         """
         st.components.v1.html(copy_button_html, height=50)
+        
+        # Live mode for runs that are still being written
+        st.markdown("---")
+        st.markdown("### 🔴 Live Mode")
+        live_mode = st.toggle("Tail this run as results arrive", key="live_mode")
+        refresh_interval = st.slider(
+            "Refresh interval (seconds)",
+            min_value=1,
+            max_value=60,
+            value=5,
+            key="live_refresh_interval",
+            disabled=not live_mode
+        )
     
     # Load data for selected run
-    current_run, model_performance = load_run_comparison(st.session_state.selected_run_id)
+    if live_mode:
+        current_run, model_performance = load_live_run_comparison(st.session_state.selected_run_id)
+    else:
+        current_run, model_performance = load_run_comparison(st.session_state.selected_run_id)
     
     if current_run is None or model_performance.empty:
+        if live_mode and current_run is not None:
+            st.info("Waiting for the first results of this run...")
+            schedule_live_refresh(refresh_interval)
         st.error("No data found for the selected run.")
         st.stop()
     
+    if live_mode:
+        aggregator = st.session_state.live_aggregator
+        st.caption(
+            f"🔴 Live: {aggregator.results_seen} results read, "
+            f"last refresh {datetime.now().strftime('%H:%M:%S')}, every {refresh_interval}s"
+        )
+    
     # Render main dashboard
     render_hero_section(current_run, model_performance)
     
@@ -1140,6 +1128,9 @@ def main():
         
         render_model_comparison_cards(model_performance)
         render_comparison_charts(model_performance)
+    
+    if live_mode:
+        schedule_live_refresh(refresh_interval)
 
 if __name__ == "__main__":
     main()
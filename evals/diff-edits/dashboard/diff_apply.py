@@ -0,0 +1,187 @@
+"""
+Python port of the SEARCH/REPLACE diff application in ../diff-apply.
+
+Used by replay.py to re-apply stored diffs offline. Each strategy takes
+(diff_content, original_content) and returns the new file content, raising
+DiffApplyError when a SEARCH block cannot be matched - the same contract as
+constructNewFileContent(diff, original, isFinal=true) in the TS versions.
+"""
+
+SEARCH_BLOCK_START = "------- SEARCH"
+SEARCH_BLOCK_END = "======="
+REPLACE_BLOCK_END = "+++++++ REPLACE"
+
+SEARCH_BLOCK_CHAR = "-"
+REPLACE_BLOCK_CHAR = "+"
+
+class DiffApplyError(Exception):
+    """Raised when a diff cannot be applied to the original content"""
+
+def _start_line_number(original_lines, start_index):
+    """Find the line number where start_index falls"""
+    line_num = 0
+    current_index = 0
+    while current_index < start_index and line_num < len(original_lines):
+        current_index += len(original_lines[line_num]) + 1  # +1 for \n
+        line_num += 1
+    return line_num
+
+def _line_span(original_lines, first_line, num_lines):
+    """Character [start, end) of num_lines lines starting at first_line"""
+    start = sum(len(line) + 1 for line in original_lines[:first_line])
+    end = start + sum(len(line) + 1 for line in original_lines[first_line:first_line + num_lines])
+    return start, end
+
+def line_trimmed_fallback_match(original_content, search_content, start_index):
+    """
+    Match search lines against the original ignoring leading/trailing whitespace.
+
+    Returns (start, end) character indexes, or None if not found.
+    """
+    original_lines = original_content.split("\n")
+    search_lines = search_content.split("\n")
+
+    # Trim trailing empty line if exists (from the trailing \n in search_content)
+    if search_lines[-1] == "":
+        search_lines.pop()
+
+    start_line = _start_line_number(original_lines, start_index)
+    trimmed_search = [line.strip() for line in search_lines]
+
+    for i in range(start_line, len(original_lines) - len(search_lines) + 1):
+        if all(original_lines[i + j].strip() == trimmed_search[j] for j in range(len(search_lines))):
+            return _line_span(original_lines, i, len(search_lines))
+
+    return None
+
+def block_anchor_fallback_match(original_content, search_content, start_index):
+    """
+    Match blocks of 3+ lines using the first and last lines as anchors.
+
+    Returns (start, end) character indexes, or None if not found.
+    """
+    original_lines = original_content.split("\n")
+    search_lines = search_content.split("\n")
+
+    # Only use this approach for blocks of 3+ lines
+    if len(search_lines) < 3:
+        return None
+
+    # Trim trailing empty line if exists
+    if search_lines[-1] == "":
+        search_lines.pop()
+
+    first_line_search = search_lines[0].strip()
+    last_line_search = search_lines[-1].strip()
+    block_size = len(search_lines)
+
+    start_line = _start_line_number(original_lines, start_index)
+
+    for i in range(start_line, len(original_lines) - block_size + 1):
+        if original_lines[i].strip() != first_line_search:
+            continue
+        if original_lines[i + block_size - 1].strip() != last_line_search:
+            continue
+        return _line_span(original_lines, i, block_size)
+
+    return None
+
+def _split_diff_lines(diff_content):
+    lines = diff_content.split("\n")
+
+    # If the last line looks like a partial marker but isn't recognized,
+    # remove it because it might be incomplete.
+    last_line = lines[-1]
+    if (
+        last_line.startswith((SEARCH_BLOCK_CHAR, "=", REPLACE_BLOCK_CHAR))
+        and last_line not in (SEARCH_BLOCK_START, SEARCH_BLOCK_END, REPLACE_BLOCK_END)
+    ):
+        lines.pop()
+    return lines
+
+def _construct_new_file_content(diff_content, original_content, matchers):
+    """
+    Apply SEARCH/REPLACE blocks in order, trying each matcher in turn after an exact match fails.
+
+    Mirrors constructNewFileContentV1 with isFinal=true.
+    """
+    result = []
+    last_processed_index = 0
+
+    current_search_content = ""
+    in_search = False
+    in_replace = False
+    search_match_index = -1
+    search_end_index = -1
+
+    for line in _split_diff_lines(diff_content):
+        if line == SEARCH_BLOCK_START:
+            in_search = True
+            current_search_content = ""
+            continue
+
+        if line == SEARCH_BLOCK_END:
+            in_search = False
+            in_replace = True
+
+            if not current_search_content:
+                # Empty search block: new file, or complete file replacement
+                search_match_index = 0
+                search_end_index = len(original_content)
+            else:
+                exact_index = original_content.find(current_search_content, last_processed_index)
+                if exact_index != -1:
+                    search_match_index = exact_index
+                    search_end_index = exact_index + len(current_search_content)
+                else:
+                    for matcher in matchers:
+                        match = matcher(original_content, current_search_content, last_processed_index)
+                        if match:
+                            search_match_index, search_end_index = match
+                            break
+                    else:
+                        raise DiffApplyError(
+                            f"The SEARCH block:\n{current_search_content.rstrip()}\n"
+                            "...does not match anything in the file or was searched out of order in the provided blocks."
+                        )
+
+            # Output everything up to the match location
+            result.append(original_content[last_processed_index:search_match_index])
+            continue
+
+        if line == REPLACE_BLOCK_END:
+            # Advance to after the matched section and reset for the next block
+            last_processed_index = search_end_index
+            in_search = False
+            in_replace = False
+            current_search_content = ""
+            search_match_index = -1
+            search_end_index = -1
+            continue
+
+        if in_search:
+            current_search_content += line + "\n"
+        elif in_replace and search_match_index != -1:
+            result.append(line + "\n")
+
+    # Append any remaining original content
+    if last_processed_index < len(original_content):
+        result.append(original_content[last_processed_index:])
+
+    return "".join(result)
+
+def apply_diff_06_06_25(diff_content, original_content):
+    """Exact match, then line-trimmed, then block-anchor fallback (diff-06-06-25 v1)"""
+    return _construct_new_file_content(
+        diff_content, original_content, [line_trimmed_fallback_match, block_anchor_fallback_match]
+    )
+
+def apply_diff_exact(diff_content, original_content):
+    """Exact matching only, with no whitespace-tolerant fallbacks"""
+    return _construct_new_file_content(diff_content, original_content, [])
+
+# Same keys as diffEditingFunctions in TestRunner.ts where a port exists
+DIFF_APPLY_STRATEGIES = {
+    "diff-06-06-25": apply_diff_06_06_25,
+    "exact": apply_diff_exact,
+}
@@ -0,0 +1,123 @@
+"""
+Incremental aggregates for tailing a run while the TS runner is still writing it.
+
+Each poll only reads results with a rowid newer than the last one seen and folds
+them into running per-model totals, so refreshing a large run costs one index
+range seek instead of re-aggregating the whole run.
+"""
+
+from queries import LIVE_RESULTS_QUERY
+
+# Same columns, in the same order, as MODEL_PERFORMANCE_QUERY
+MODEL_PERFORMANCE_COLUMNS = [
+    'model_id', 'total_results', 'success_rate', 'avg_cost', 'total_cost',
+    'avg_first_token_ms', 'avg_first_edit_ms', 'avg_round_trip_ms',
+    'avg_completion_tokens', 'avg_num_edits', 'min_round_trip_ms', 'max_round_trip_ms'
+]
+
+# Averaged metric -> (result column, output column). SQL AVG skips NULLs, so each keeps its own count.
+AVERAGED_METRICS = [
+    ('cost_usd', 'avg_cost'),
+    ('time_to_first_token_ms', 'avg_first_token_ms'),
+    ('time_to_first_edit_ms', 'avg_first_edit_ms'),
+    ('time_round_trip_ms', 'avg_round_trip_ms'),
+    ('completion_tokens', 'avg_completion_tokens'),
+    ('num_edits', 'avg_num_edits'),
+]
+
+# Exclude: no_tool_calls, wrong_tool_call, wrong_file_edited
+INVALID_ERROR_ENUMS = (1, 6, 7)
+
+class ModelAggregate:
+    """Running totals for one model, enough to reproduce MODEL_PERFORMANCE_QUERY"""
+
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self.total_results = 0
+        self.successes = 0
+        self.sums = {column: 0.0 for column, _ in AVERAGED_METRICS}
+        self.counts = {column: 0 for column, _ in AVERAGED_METRICS}
+        self.min_round_trip_ms = None
+        self.max_round_trip_ms = None
+
+    def add(self, result):
+        self.total_results += 1
+        if result['succeeded']:
+            self.successes += 1
+
+        for column, _ in AVERAGED_METRICS:
+            value = result[column]
+            if value is not None:
+                self.sums[column] += value
+                self.counts[column] += 1
+
+        round_trip = result['time_round_trip_ms']
+        if round_trip is not None:
+            if self.min_round_trip_ms is None or round_trip < self.min_round_trip_ms:
+                self.min_round_trip_ms = round_trip
+            if self.max_round_trip_ms is None or round_trip > self.max_round_trip_ms:
+                self.max_round_trip_ms = round_trip
+
+    def to_record(self):
+        record = {
+            'model_id': self.model_id,
+            'total_results': self.total_results,
+            'success_rate': self.successes / self.total_results if self.total_results else None,
+            # SUM over no non-NULL values is NULL in SQL
+            'total_cost': self.sums['cost_usd'] if self.counts['cost_usd'] else None,
+            'min_round_trip_ms': self.min_round_trip_ms,
+            'max_round_trip_ms': self.max_round_trip_ms,
+        }
+        for column, output in AVERAGED_METRICS:
+            record[output] = self.sums[column] / self.counts[column] if self.counts[column] else None
+        return record
+
+class LiveRunAggregator:
+    """Per-model aggregates for a single run, updated from new result rows only"""
+
+    def __init__(self, run_id, batch_size=5000):
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.last_rowid = 0
+        self.results_seen = 0
+        self.models = {}
+
+    def poll(self, conn):
+        """
+        Fold results written since the previous poll into the aggregates.
+
+        Returns the number of new result rows read.
+        """
+        new_rows = 0
+        while True:
+            cursor = conn.execute(LIVE_RESULTS_QUERY, (self.run_id, self.last_rowid, self.batch_size))
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+            for row in rows:
+                self.fold(dict(zip(columns, row)))
+            new_rows += len(rows)
+            if len(rows) < self.batch_size:
+                return new_rows
+
+    def fold(self, result):
+        """Add a single result row; invalid attempts advance the cursor but are not aggregated"""
+        self.last_rowid = max(self.last_rowid, result['rowid'])
+        self.results_seen += 1
+        if result['error_enum'] in INVALID_ERROR_ENUMS:
+            return
+
+        model = self.models.get(result['model_id'])
+        if model is None:
+            model = self.models[result['model_id']] = ModelAggregate(result['model_id'])
+        model.add(result)
+
+    def to_records(self):
+        """Per-model rows ordered like MODEL_PERFORMANCE_QUERY"""
+        records = [model.to_record() for model in self.models.values()]
+        # ORDER BY success_rate DESC, avg_round_trip_ms ASC (NULLs first in ascending order, as in SQLite)
+        records.sort(key=lambda r: (
+            -(r['success_rate'] or 0.0),
+            r['avg_round_trip_ms'] is not None,
+            r['avg_round_trip_ms'] or 0.0,
+        ))
+        return records
@@ -0,0 +1,158 @@
+"""
+Versioned index migrations for evals.db.
+
+schema.sql only creates the base tables, so databases written by older runs
+never pick up indexes added later. Each migration here is applied once and
+recorded in PRAGMA user_version. Statements use IF NOT EXISTS so they are safe
+to run against databases that already have some of the indexes.
+
+Usage (from the dashboard directory):
+    python migrations.py                 # migrate ../evals.db and run ANALYZE
+    python migrations.py --db path.db    # migrate another database
+    python migrations.py --status        # show the current and latest version
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'evals.db')
+
+# (version, description, statements). Append only - never edit a released migration.
+MIGRATIONS = [
+    (1, "cases lookup indexes for task_id and file_hash", [
+        # Covers the Bad Cases CTE: it reads task_id, description, file_hash and case_id from every case
+        "CREATE INDEX IF NOT EXISTS idx_cases_task_covering ON cases(task_id, description, file_hash, case_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cases_file_hash ON cases(file_hash)",
+    ]),
+    (2, "results error_enum index", [
+        "CREATE INDEX IF NOT EXISTS idx_results_error_enum ON results(error_enum)",
+    ]),
+    (3, "covering indexes for the per-run model aggregates", [
+        "CREATE INDEX IF NOT EXISTS idx_cases_run_case ON cases(run_id, case_id)",
+        """CREATE INDEX IF NOT EXISTS idx_results_case_model_metrics ON results(
+            case_id, model_id, error_enum, succeeded, run_id, result_id, cost_usd,
+            time_to_first_token_ms, time_to_first_edit_ms, time_round_trip_ms,
+            completion_tokens, num_edits
+        )""",
+        # Superseded by the two covering indexes above
+        "DROP INDEX IF EXISTS idx_cases_run",
+        "DROP INDEX IF EXISTS idx_results_case_model",
+    ]),
+    (4, "results (run_id, rowid) index for live tailing", [
+        # Entries are ordered by (run_id, rowid), so "run_id = ? AND rowid > ?" is a range seek
+        "CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id)",
+    ]),
+    (5, "persisted stratified result samples for approximate aggregates", [
+        """CREATE TABLE IF NOT EXISTS result_sample_strata (
+            run_id TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            population INTEGER NOT NULL,
+            max_rowid INTEGER NOT NULL,
+            PRIMARY KEY (run_id, model_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS result_samples (
+            run_id TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            result_rowid INTEGER NOT NULL,
+            succeeded BOOLEAN NOT NULL,
+            error_enum INTEGER,
+            cost_usd REAL,
+            time_round_trip_ms INTEGER,
+            PRIMARY KEY (run_id, model_id, result_rowid)
+        ) WITHOUT ROWID""",
+    ]),
+    (6, "compact per-run, per-model summaries for the trend view", [
+        """CREATE TABLE IF NOT EXISTS run_summaries (
+            run_id TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            run_created_at DATETIME,
+            total_results INTEGER NOT NULL,
+            valid_results INTEGER NOT NULL,
+            successes INTEGER NOT NULL,
+            total_cost REAL,
+            avg_cost REAL,
+            p50_round_trip_ms REAL,
+            p90_round_trip_ms REAL,
+            p99_round_trip_ms REAL,
+            max_rowid INTEGER NOT NULL,
+            PRIMARY KEY (run_id, model_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_run_summaries_model_time ON run_summaries(model_id, run_created_at)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """Return the migration version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending_migrations(conn):
+    """Return the migrations that have not been applied yet"""
+    current = get_schema_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+def apply_migrations(conn, analyze=True, log=print):
+    """
+    Apply every pending migration, each in its own transaction.
+
+    Runs ANALYZE afterwards so the query planner has statistics for the new indexes.
+    Returns the list of applied versions.
+    """
+    applied = []
+    for version, description, statements in pending_migrations(conn):
+        log(f"Applying migration {version}: {description}")
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept bound parameters; version is always an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+
+    if applied and analyze:
+        run_analyze(conn, log=log)
+
+    return applied
+
+def run_analyze(conn, log=print):
+    """Refresh planner statistics"""
+    log("Running ANALYZE")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply index migrations to the diff edit evals database")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to evals.db')
+    parser.add_argument('--status', action='store_true', help='Show the schema version and exit')
+    parser.add_argument('--no-analyze', action='store_true', help='Skip ANALYZE after migrating')
+    parser.add_argument('--analyze', action='store_true', help='Run ANALYZE even if nothing was migrated')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {os.path.abspath(args.db)}")
+        return 1
+
+    conn = sqlite3.connect(args.db)
+    try:
+        current = get_schema_version(conn)
+        if args.status:
+            print(f"Schema version: {current} (latest: {LATEST_VERSION})")
+            for version, description, _ in pending_migrations(conn):
+                print(f"  pending {version}: {description}")
+            return 0
+
+        applied = apply_migrations(conn, analyze=not args.no_analyze)
+        if not applied:
+            print(f"Already at latest version ({current})")
+            if args.analyze:
+                run_analyze(conn)
+        else:
+            print(f"Migrated from version {current} to {get_schema_version(conn)}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ import pandas as pd
 import json
 import os # Need to import os for load_case_raw_data
 from utils import get_database_connection, guess_language_from_filepath # Absolute import
+from queries import PROBLEMATIC_CASES_QUERY
 
 st.set_page_config(
     page_title="Case Health Inspector",
@@ -16,49 +17,7 @@ st.markdown("Identify test cases that are frequently problematic across differen
 @st.cache_data
 def load_problematic_cases_summary():
     conn = get_database_connection()
-    query = """
-    WITH case_attempts AS (
-        SELECT
-            c.task_id,
-            c.description AS case_description,
-            f_orig.filepath AS original_filepath, -- Get from files table
-            r.run_id,
-            r.model_id,
-            r.result_id,
-            (CASE WHEN (r.error_enum NOT IN (1, 6, 7) OR r.error_enum IS NULL) THEN 1 ELSE 0 END) AS is_valid_attempt,
-            (CASE WHEN (r.error_enum NOT IN (1, 6, 7) OR r.error_enum IS NULL) THEN r.succeeded ELSE NULL END) AS succeeded_on_valid
-        FROM cases c
-        JOIN results r ON c.case_id = r.case_id
-        LEFT JOIN files f_orig ON c.file_hash = f_orig.hash -- Join to get original filepath
-    ),
-    case_summary AS (
-        SELECT
-            task_id,
-            case_description,
-            original_filepath, -- This is now f_orig.filepath
-            COUNT(DISTINCT run_id) AS num_benchmark_runs,
-            COUNT(result_id) AS total_attempts,
-            SUM(is_valid_attempt) AS total_valid_attempts,
-            SUM(succeeded_on_valid) AS total_successful_valid_attempts
-        FROM case_attempts
-        GROUP BY task_id, case_description, original_filepath -- original_filepath is f_orig.filepath
-    )
-    SELECT
-        task_id,
-        case_description,
-        original_filepath, -- This is f_orig.filepath from case_summary
-        num_benchmark_runs,
-        total_attempts,
-        total_valid_attempts,
-        CAST(total_valid_attempts AS REAL) * 100.0 / total_attempts AS percent_valid_attempts,
-        CASE 
-            WHEN total_valid_attempts > 0 THEN CAST(total_successful_valid_attempts AS REAL) * 100.0 / total_valid_attempts
-            ELSE 0 
-        END AS success_rate_on_valid
-    FROM case_summary
-    ORDER BY percent_valid_attempts ASC, success_rate_on_valid ASC;
-    """
-    df = pd.read_sql_query(query, conn)
+    df = pd.read_sql_query(PROBLEMATIC_CASES_QUERY, conn)
     return df
 
 @st.cache_data
@@ -0,0 +1,104 @@
+import sqlite3
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+from utils import get_database_connection # Absolute import
+from queries import ALL_RUNS_QUERY
+from sampling import SAMPLE_SIZE, REFRESH_LOCK, refresh_samples, estimate_success_rates, exact_success_rates
+
+st.set_page_config(
+    page_title="Success Heatmap",
+    page_icon="🗺️",
+    layout="wide"
+)
+
+st.title("Cross-Run Success Heatmap")
+st.markdown("Success rate on valid results for every model in every run.")
+
+HEATMAP_COLUMNS = ['run_id', 'model_id', 'success_rate', 'margin', 'valid_results', 'population', 'sample_size', 'exact']
+
+def load_sampled_success_heatmap():
+    """Estimate every cell from the persisted samples, folding in any new results first"""
+    conn = get_database_connection()
+    with REFRESH_LOCK:
+        try:
+            refresh_samples(conn)
+        except sqlite3.OperationalError as e:
+            # e.g. the database is locked by a running eval; the existing samples are still usable
+            st.warning(f"Could not refresh the sampled results, showing the existing samples: {e}")
+        return pd.DataFrame(estimate_success_rates(conn), columns=HEATMAP_COLUMNS)
+
+@st.cache_data
+def load_exact_success_heatmap():
+    """Aggregate every result; slow on large databases, so only on demand"""
+    conn = get_database_connection()
+    return pd.DataFrame(exact_success_rates(conn), columns=HEATMAP_COLUMNS)
+
+@st.cache_data
+def load_run_labels():
+    conn = get_database_connection()
+    runs = pd.read_sql_query(ALL_RUNS_QUERY, conn)
+    # Oldest run on the left
+    runs = runs.iloc[::-1]
+    labels = {}
+    for _, run in runs.iterrows():
+        name = run['description'] if run['description'] else f"Run {run['run_id'][:8]}..."
+        labels[run['run_id']] = f"{name} ({run['created_at'][:10]})"
+    return labels
+
+def format_cell(row):
+    if pd.isna(row['success_rate']):
+        return ""
+    if row['exact'] or pd.isna(row['margin']):
+        return f"{row['success_rate']:.0%}"
+    return f"{row['success_rate']:.0%} ±{row['margin']:.0%}"
+
+def render_success_heatmap_page():
+    exact = st.toggle("Exact computation", value=False, help="Aggregate every result instead of the sampled estimate")
+
+    heatmap_df = load_exact_success_heatmap() if exact else load_sampled_success_heatmap()
+    if heatmap_df.empty:
+        st.warning("No results found. Run some evaluations first.")
+        return
+
+    if exact:
+        st.caption("Exact: aggregated over every result.")
+    else:
+        st.caption(
+            f"Approximate: estimated from up to {SAMPLE_SIZE} sampled results per run and model. "
+            "± is a 95% interval. Cells whose run and model fit in the sample are exact."
+        )
+
+    run_labels = load_run_labels()
+    run_order = [run_id for run_id in run_labels if run_id in set(heatmap_df['run_id'])]
+    heatmap_df['cell_text'] = heatmap_df.apply(format_cell, axis=1)
+
+    rates = heatmap_df.pivot(index='model_id', columns='run_id', values='success_rate').reindex(columns=run_order)
+    text = heatmap_df.pivot(index='model_id', columns='run_id', values='cell_text').reindex(columns=run_order)
+
+    fig = go.Figure(data=go.Heatmap(
+        z=rates.values,
+        x=[run_labels[run_id] for run_id in run_order],
+        y=rates.index.tolist(),
+        text=text.fillna("").values,
+        texttemplate="%{text}",
+        colorscale='RdYlGn',
+        zmin=0,
+        zmax=1,
+        hovertemplate="%{y}<br>%{x}<br>Success rate: %{text}<extra></extra>"
+    ))
+    fig.update_layout(
+        template='plotly_dark',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Azeret Mono, monospace"),
+        height=max(300, 60 * len(rates.index)),
+        xaxis=dict(tickangle=-30)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("Cell details", expanded=False):
+        st.dataframe(heatmap_df.drop(columns=['cell_text']), use_container_width=True)
+
+if __name__ == "__main__":
+    render_success_heatmap_page()
@@ -0,0 +1,93 @@
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+from utils import get_database_connection # Absolute import
+from trends import refresh_run_summaries, load_summary_models, load_model_trend, lttb, bucket_means
+
+st.set_page_config(
+    page_title="Trends",
+    page_icon="📈",
+    layout="wide"
+)
+
+st.title("Cross-Run Trends")
+st.markdown("How each model's metrics move across runs, served from per-run summaries.")
+
+TREND_METRICS = {
+    "Success rate": 'success_rate',
+    "p50 latency (ms)": 'p50_round_trip_ms',
+    "p90 latency (ms)": 'p90_round_trip_ms',
+    "p99 latency (ms)": 'p99_round_trip_ms',
+    "Avg cost ($)": 'avg_cost',
+}
+
+DOWNSAMPLING_METHODS = ["LTTB", "Bucketed means"]
+
+def load_trends(model_ids):
+    """One summary row per run for each model, oldest first"""
+    conn = get_database_connection()
+    return {model_id: load_model_trend(conn, model_id) for model_id in model_ids}
+
+def downsample(rows, metric, method, max_points):
+    """Return (xs, ys) with at most max_points points; xs are run timestamps"""
+    rows = [row for row in rows if row[metric] is not None]
+    xs = [pd.Timestamp(row['run_created_at']).timestamp() for row in rows]
+    ys = [row[metric] for row in rows]
+    if method == "LTTB":
+        indexes = lttb(xs, ys, max_points)
+        xs, ys = [xs[i] for i in indexes], [ys[i] for i in indexes]
+    else:
+        # Pool success rates over valid results so small runs don't dominate a bucket
+        weights = [row['valid_results'] for row in rows] if metric == 'success_rate' else None
+        xs, ys, _ = bucket_means(xs, ys, max_points, weights)
+    return pd.to_datetime(xs, unit='s'), ys
+
+def render_trends_page():
+    conn = get_database_connection()
+    # Only runs with results newer than their summary are re-aggregated
+    refresh_run_summaries(conn)
+    models = load_summary_models(conn)
+    if not models:
+        st.warning("No results found. Run some evaluations first.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metric_label = st.selectbox("Metric", list(TREND_METRICS))
+    with col2:
+        method = st.selectbox("Downsampling", DOWNSAMPLING_METHODS)
+    with col3:
+        max_points = st.slider("Max points per model", min_value=20, max_value=1000, value=200, step=20)
+    selected_models = st.multiselect("Models", models, default=models[:5])
+
+    if not selected_models:
+        st.info("Select at least one model.")
+        return
+
+    metric = TREND_METRICS[metric_label]
+    trends = load_trends(selected_models)
+
+    fig = go.Figure()
+    plotted = 0
+    for model_id, rows in trends.items():
+        xs, ys = downsample(rows, metric, method, max_points)
+        plotted += len(ys)
+        fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines+markers', name=model_id))
+
+    fig.update_layout(
+        template='plotly_dark',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Azeret Mono, monospace"),
+        height=500,
+        xaxis_title="Run",
+        yaxis_title=metric_label,
+        yaxis=dict(tickformat='.0%') if metric == 'success_rate' else dict()
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    total_runs = sum(len(rows) for rows in trends.values())
+    st.caption(f"Showing {plotted} of {total_runs} run summaries ({method}, up to {max_points} points per model).")
+
+if __name__ == "__main__":
+    render_trends_page()
@@ -0,0 +1,244 @@
+"""
+SQL used by the dashboard pages.
+
+The queries live here rather than inline in the Streamlit pages so they can be
+parameterized in one place and checked with EXPLAIN QUERY PLAN in the tests
+without importing Streamlit.
+"""
+
+# Exclude: no_tool_calls, wrong_tool_call, wrong_file_edited
+VALID_RESULT_FILTER = "(res.error_enum NOT IN (1, 6, 7) OR res.error_enum IS NULL)"
+
+ALL_RUNS_QUERY = """
+SELECT run_id, description, created_at, system_prompt_hash
+FROM runs
+ORDER BY created_at DESC
+"""
+
+RUN_QUERY = """
+SELECT run_id, description, created_at, system_prompt_hash
+FROM runs
+WHERE run_id = ?
+"""
+
+LATEST_RUN_QUERY = """
+SELECT run_id, description, created_at, system_prompt_hash
+FROM runs
+ORDER BY created_at DESC
+LIMIT 1
+"""
+
+MODEL_PERFORMANCE_QUERY = f"""
+SELECT
+    res.model_id,
+    COUNT(*) as total_results,
+    AVG(CASE WHEN res.succeeded THEN 1.0 ELSE 0.0 END) as success_rate,
+    AVG(res.cost_usd) as avg_cost,
+    SUM(res.cost_usd) as total_cost,
+    AVG(res.time_to_first_token_ms) as avg_first_token_ms,
+    AVG(res.time_to_first_edit_ms) as avg_first_edit_ms,
+    AVG(res.time_round_trip_ms) as avg_round_trip_ms,
+    AVG(res.completion_tokens) as avg_completion_tokens,
+    AVG(res.num_edits) as avg_num_edits,
+    MIN(res.time_round_trip_ms) as min_round_trip_ms,
+    MAX(res.time_round_trip_ms) as max_round_trip_ms
+FROM results res
+JOIN cases c ON res.case_id = c.case_id
+WHERE c.run_id = ?
+  AND {VALID_RESULT_FILTER}
+GROUP BY res.model_id
+ORDER BY success_rate DESC, avg_round_trip_ms ASC
+"""
+
+DETAILED_RESULTS_QUERY = """
+SELECT
+    res.*,
+    c.task_id,
+    c.description as case_description,
+    c.tokens_in_context,
+    sp.name as system_prompt_name,
+    pf.name as processing_functions_name,
+    orig_f.filepath as original_filepath,
+    orig_f.content as original_file_content,
+    edit_f.filepath as edited_filepath,
+    edit_f.content as edited_file_content
+FROM results res
+JOIN cases c ON res.case_id = c.case_id
+LEFT JOIN system_prompts sp ON c.system_prompt_hash = sp.hash
+LEFT JOIN processing_functions pf ON res.processing_functions_hash = pf.hash
+LEFT JOIN files orig_f ON c.file_hash = orig_f.hash
+LEFT JOIN files edit_f ON res.file_edited_hash = edit_f.hash
+{where_clause}
+ORDER BY res.created_at DESC
+"""
+
+PROBLEMATIC_CASES_QUERY = """
+WITH case_attempts AS (
+    SELECT
+        c.task_id,
+        c.description AS case_description,
+        f_orig.filepath AS original_filepath, -- Get from files table
+        r.run_id,
+        r.model_id,
+        r.result_id,
+        (CASE WHEN (r.error_enum NOT IN (1, 6, 7) OR r.error_enum IS NULL) THEN 1 ELSE 0 END) AS is_valid_attempt,
+        (CASE WHEN (r.error_enum NOT IN (1, 6, 7) OR r.error_enum IS NULL) THEN r.succeeded ELSE NULL END) AS succeeded_on_valid
+    FROM cases c
+    JOIN results r ON c.case_id = r.case_id
+    LEFT JOIN files f_orig ON c.file_hash = f_orig.hash -- Join to get original filepath
+),
+case_summary AS (
+    SELECT
+        task_id,
+        case_description,
+        original_filepath, -- This is now f_orig.filepath
+        COUNT(DISTINCT run_id) AS num_benchmark_runs,
+        COUNT(result_id) AS total_attempts,
+        SUM(is_valid_attempt) AS total_valid_attempts,
+        SUM(succeeded_on_valid) AS total_successful_valid_attempts
+    FROM case_attempts
+    GROUP BY task_id, case_description, original_filepath -- original_filepath is f_orig.filepath
+)
+SELECT
+    task_id,
+    case_description,
+    original_filepath, -- This is f_orig.filepath from case_summary
+    num_benchmark_runs,
+    total_attempts,
+    total_valid_attempts,
+    CAST(total_valid_attempts AS REAL) * 100.0 / total_attempts AS percent_valid_attempts,
+    CASE
+        WHEN total_valid_attempts > 0 THEN CAST(total_successful_valid_attempts AS REAL) * 100.0 / total_valid_attempts
+        ELSE 0
+    END AS success_rate_on_valid
+FROM case_summary
+ORDER BY percent_valid_attempts ASC, success_rate_on_valid ASC;
+"""
+
+# Results written to a run after the last rowid seen, for live tailing
+LIVE_RESULTS_QUERY = """
+SELECT
+    res.rowid,
+    res.model_id,
+    res.succeeded,
+    res.error_enum,
+    res.cost_usd,
+    res.time_to_first_token_ms,
+    res.time_to_first_edit_ms,
+    res.time_round_trip_ms,
+    res.completion_tokens,
+    res.num_edits
+FROM results res
+WHERE res.run_id = ?
+  AND res.rowid > ?
+ORDER BY res.rowid
+LIMIT ?
+"""
+
+# Exact success rate for every (run, model) cell, for when the sampled estimate is not enough
+EXACT_SUCCESS_BY_RUN_MODEL_QUERY = f"""
+SELECT
+    res.run_id,
+    res.model_id,
+    COUNT(*) as population,
+    SUM(CASE WHEN {VALID_RESULT_FILTER} THEN 1 ELSE 0 END) as valid_results,
+    AVG(CASE WHEN {VALID_RESULT_FILTER} THEN (CASE WHEN res.succeeded THEN 1.0 ELSE 0.0 END) END) as success_rate
+FROM results res
+GROUP BY res.run_id, res.model_id
+"""
+
+# Per-stratum totals over the persisted samples in result_samples
+SAMPLED_SUCCESS_BY_RUN_MODEL_QUERY = """
+SELECT
+    st.run_id,
+    st.model_id,
+    st.population,
+    COUNT(s.result_rowid) as sample_size,
+    SUM(CASE WHEN (s.error_enum NOT IN (1, 6, 7) OR s.error_enum IS NULL) THEN 1 ELSE 0 END) as sample_valid,
+    SUM(CASE WHEN (s.error_enum NOT IN (1, 6, 7) OR s.error_enum IS NULL) AND s.succeeded THEN 1 ELSE 0 END) as sample_successes
+FROM result_sample_strata st
+JOIN result_samples s ON s.run_id = st.run_id AND s.model_id = st.model_id
+GROUP BY st.run_id, st.model_id
+"""
+
+# Newest result written to a run; compared with run_summaries.max_rowid to find stale summaries
+RUN_LATEST_ROWID_QUERY = """
+SELECT MAX(res.rowid)
+FROM results res
+WHERE res.run_id = ?
+"""
+
+RUN_SUMMARY_WATERMARKS_QUERY = """
+SELECT run_id, MAX(max_rowid)
+FROM run_summaries
+GROUP BY run_id
+"""
+
+# Raw values summarized into run_summaries, one run at a time
+RUN_SUMMARY_SOURCE_QUERY = """
+SELECT
+    res.model_id,
+    res.succeeded,
+    res.error_enum,
+    res.cost_usd,
+    res.time_round_trip_ms
+FROM results res
+WHERE res.run_id = ?
+"""
+
+SUMMARY_MODELS_QUERY = """
+SELECT DISTINCT model_id
+FROM run_summaries
+ORDER BY model_id
+"""
+
+MODEL_TREND_QUERY = """
+SELECT
+    run_id,
+    run_created_at,
+    total_results,
+    valid_results,
+    CASE WHEN valid_results > 0 THEN CAST(successes AS REAL) / valid_results END as success_rate,
+    total_cost,
+    avg_cost,
+    p50_round_trip_ms,
+    p90_round_trip_ms,
+    p99_round_trip_ms
+FROM run_summaries
+WHERE model_id = ?
+ORDER BY run_created_at
+"""
+
+def build_detailed_results_query(run_id, model_id=None, valid_only=False):
+    """Build the drill-down query and its parameters"""
+    where_clause = "WHERE c.run_id = ?"
+    params = [run_id]
+    if model_id:
+        where_clause += " AND res.model_id = ?"
+        params.append(model_id)
+
+    # Option to filter out invalid attempts
+    if valid_only:
+        where_clause += f" AND {VALID_RESULT_FILTER}"
+
+    return DETAILED_RESULTS_QUERY.format(where_clause=where_clause), params
+
+def dashboard_queries():
+    """Every query the dashboard runs, as (name, sql, params) with placeholder parameters"""
+    detailed_sql, detailed_params = build_detailed_results_query("run", "model", valid_only=True)
+    return [
+        ("all_runs", ALL_RUNS_QUERY, []),
+        ("run", RUN_QUERY, ["run"]),
+        ("latest_run", LATEST_RUN_QUERY, []),
+        ("model_performance", MODEL_PERFORMANCE_QUERY, ["run"]),
+        ("detailed_results", detailed_sql, detailed_params),
+        ("problematic_cases", PROBLEMATIC_CASES_QUERY, []),
+        ("live_results", LIVE_RESULTS_QUERY, ["run", 0, 1000]),
+        ("exact_success_by_run_model", EXACT_SUCCESS_BY_RUN_MODEL_QUERY, []),
+        ("sampled_success_by_run_model", SAMPLED_SUCCESS_BY_RUN_MODEL_QUERY, []),
+        ("run_latest_rowid", RUN_LATEST_ROWID_QUERY, ["run"]),
+        ("run_summary_watermarks", RUN_SUMMARY_WATERMARKS_QUERY, []),
+        ("run_summary_source", RUN_SUMMARY_SOURCE_QUERY, ["run"]),
+        ("summary_models", SUMMARY_MODELS_QUERY, []),
+        ("model_trend", MODEL_TREND_QUERY, ["model"]),
+    ]
@@ -0,0 +1,256 @@
+"""
+Offline replay verifier for stored diff edit results.
+
+Re-applies the SEARCH/REPLACE diff from each result's parsed_tool_call_json to
+the case's original file content across a process pool, then checks:
+  - the re-applied outcome against the stored `succeeded` flag
+  - the diff stored under file_edited_hash against the parsed tool call diff
+
+Re-scoring a historical run under a different strategy from diff_apply.py only
+needs the database, not another round of API calls. Progress is checkpointed
+after every batch so an interrupted replay resumes where it stopped.
+
+Usage (from the dashboard directory):
+    python replay.py RUN_ID
+    python replay.py RUN_ID --strategy exact --workers 8 --report replay_report.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from diff_apply import DIFF_APPLY_STRATEGIES, DiffApplyError
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'evals.db')
+
+# Only attempts that reached the diff apply step are replayed, as in TestRunner.runDatabaseReplay:
+# no error, or 3 (diff_edit_error)
+REPLAY_RESULTS_QUERY = """
+SELECT
+    res.rowid,
+    res.result_id,
+    res.succeeded,
+    res.parsed_tool_call_json,
+    orig_f.content AS original_file_content,
+    edit_f.content AS stored_diff
+FROM results res
+JOIN cases c ON res.case_id = c.case_id
+LEFT JOIN files orig_f ON c.file_hash = orig_f.hash
+LEFT JOIN files edit_f ON res.file_edited_hash = edit_f.hash
+WHERE res.run_id = ?
+  AND res.rowid > ?
+  AND (res.error_enum IS NULL OR res.error_enum = 3)
+ORDER BY res.rowid
+LIMIT ?
+"""
+
+def content_hash(content):
+    """SHA-256 hex digest, matching DatabaseClient.generateHash"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def extract_diff(parsed_tool_call_json):
+    """Return the diff from the first parsed tool call, or None"""
+    if not parsed_tool_call_json:
+        return None
+    try:
+        tool_calls = json.loads(parsed_tool_call_json)
+    except json.JSONDecodeError:
+        return None
+    if not tool_calls or not isinstance(tool_calls, list):
+        return None
+    tool_input = tool_calls[0].get('input') or {}
+    return tool_input.get('diff')
+
+def replay_result(task):
+    """
+    Re-apply one stored diff. Runs in a worker process, so it only takes and returns plain data.
+
+    Args:
+        task: (rowid, result_id, strategy, succeeded, parsed_tool_call_json, original_file_content, stored_diff)
+
+    Returns:
+        Dict describing the outcome
+    """
+    rowid, result_id, strategy, succeeded, parsed_tool_call_json, original_content, stored_diff = task
+    outcome = {
+        'rowid': rowid,
+        'result_id': result_id,
+        'stored_succeeded': bool(succeeded),
+        'replayed_succeeded': None,
+        'output_hash': None,
+        'diff_matches_stored': None,
+        'error': None,
+        'status': 'skipped',
+    }
+
+    diff = extract_diff(parsed_tool_call_json)
+    if original_content is None or diff is None:
+        outcome['error'] = "missing original file or diff"
+        return outcome
+
+    if stored_diff is not None:
+        outcome['diff_matches_stored'] = stored_diff == diff
+
+    try:
+        new_content = DIFF_APPLY_STRATEGIES[strategy](diff, original_content)
+        outcome['replayed_succeeded'] = True
+        outcome['output_hash'] = content_hash(new_content)
+    except DiffApplyError as e:
+        outcome['replayed_succeeded'] = False
+        outcome['error'] = str(e).splitlines()[0]
+
+    consistent = outcome['replayed_succeeded'] == outcome['stored_succeeded'] and outcome['diff_matches_stored'] is not False
+    outcome['status'] = 'match' if consistent else 'mismatch'
+    return outcome
+
+def new_checkpoint(run_id, strategy):
+    return {
+        'run_id': run_id,
+        'strategy': strategy,
+        'last_rowid': 0,
+        'counts': {'match': 0, 'mismatch': 0, 'skipped': 0, 'newly_succeeded': 0, 'newly_failed': 0, 'diff_mismatch': 0},
+        'mismatches': [],
+        'elapsed_seconds': 0.0,
+    }
+
+def load_checkpoint(path, run_id, strategy):
+    """Load a checkpoint for the same run and strategy, or start a new one"""
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('run_id') == run_id and checkpoint.get('strategy') == strategy:
+            return checkpoint
+    return new_checkpoint(run_id, strategy)
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically so an interrupted write never corrupts it"""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def record_outcome(checkpoint, outcome):
+    counts = checkpoint['counts']
+    counts[outcome['status']] += 1
+    if outcome['diff_matches_stored'] is False:
+        counts['diff_mismatch'] += 1
+    if outcome['replayed_succeeded'] is not None and outcome['replayed_succeeded'] != outcome['stored_succeeded']:
+        counts['newly_succeeded' if outcome['replayed_succeeded'] else 'newly_failed'] += 1
+    if outcome['status'] == 'mismatch':
+        checkpoint['mismatches'].append(outcome)
+    checkpoint['last_rowid'] = max(checkpoint['last_rowid'], outcome['rowid'])
+
+def run_replay(conn, run_id, strategy="diff-06-06-25", workers=None, batch_size=500,
+               checkpoint_path=None, log=print):
+    """
+    Replay every valid attempt in a run, resuming from checkpoint_path if it exists.
+
+    Args:
+        conn: sqlite3 connection to evals.db
+        run_id: Run to replay
+        strategy: Key in DIFF_APPLY_STRATEGIES
+        workers: Process pool size (default: CPU count); 1 replays in-process
+        batch_size: Results read from the database and checkpointed at a time
+        checkpoint_path: JSON file to resume from and save progress to
+        log: Progress callback
+
+    Returns:
+        The final checkpoint dict, including counts, mismatches and throughput
+    """
+    if strategy not in DIFF_APPLY_STRATEGIES:
+        raise ValueError(f"Unknown diff apply strategy: {strategy}. Available: {', '.join(DIFF_APPLY_STRATEGIES)}")
+
+    checkpoint = load_checkpoint(checkpoint_path, run_id, strategy)
+    if checkpoint['last_rowid']:
+        log(f"Resuming {run_id} from rowid {checkpoint['last_rowid']}")
+
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.monotonic()
+    replayed = 0
+    try:
+        while True:
+            rows = conn.execute(REPLAY_RESULTS_QUERY, (run_id, checkpoint['last_rowid'], batch_size)).fetchall()
+            if not rows:
+                break
+
+            tasks = [(rowid, result_id, strategy, succeeded, tool_calls, original, stored_diff)
+                     for rowid, result_id, succeeded, tool_calls, original, stored_diff in rows]
+            if pool:
+                outcomes = pool.map(replay_result, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+            else:
+                outcomes = map(replay_result, tasks)
+
+            for outcome in outcomes:
+                record_outcome(checkpoint, outcome)
+            replayed += len(tasks)
+
+            checkpoint['elapsed_seconds'] += time.monotonic() - started
+            started = time.monotonic()
+            save_checkpoint(checkpoint_path, checkpoint)
+            log(f"Replayed {replayed} results (up to rowid {checkpoint['last_rowid']})")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    checkpoint['elapsed_seconds'] += time.monotonic() - started
+    total = sum(checkpoint['counts'][status] for status in ('match', 'mismatch', 'skipped'))
+    checkpoint['results_per_second'] = total / checkpoint['elapsed_seconds'] if checkpoint['elapsed_seconds'] else None
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+def print_report(report):
+    counts = report['counts']
+    print(f"\n=== Replay of {report['run_id']} with {report['strategy']} ===")
+    print(f"Matches:              {counts['match']}")
+    print(f"Mismatches:           {counts['mismatch']}")
+    print(f"Skipped:              {counts['skipped']}")
+    print(f"Newly succeeded:      {counts['newly_succeeded']}")
+    print(f"Newly failed:         {counts['newly_failed']}")
+    print(f"Stored diff mismatch: {counts['diff_mismatch']}")
+    if report.get('results_per_second'):
+        print(f"Throughput:           {report['results_per_second']:.1f} results/s")
+    for outcome in report['mismatches'][:20]:
+        print(f"  {outcome['result_id']}: stored={outcome['stored_succeeded']} "
+              f"replayed={outcome['replayed_succeeded']} diff_matches_stored={outcome['diff_matches_stored']}"
+              + (f" ({outcome['error']})" if outcome['error'] else ""))
+    if len(report['mismatches']) > 20:
+        print(f"  ... and {len(report['mismatches']) - 20} more")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-apply stored diffs for a run and verify the stored outcomes")
+    parser.add_argument('run_id', help='Run to replay')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to evals.db')
+    parser.add_argument('--strategy', default='diff-06-06-25', choices=sorted(DIFF_APPLY_STRATEGIES), help='Diff apply strategy')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Results per batch and checkpoint')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: replay_<run_id>_<strategy>.json)')
+    parser.add_argument('--report', default=None, help='Write the final report as JSON to this path')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {os.path.abspath(args.db)}")
+        return 1
+
+    checkpoint_path = args.checkpoint or f"replay_{args.run_id}_{args.strategy}.json"
+    conn = sqlite3.connect(args.db)
+    try:
+        report = run_replay(conn, args.run_id, args.strategy, args.workers, args.batch_size, checkpoint_path)
+    finally:
+        conn.close()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Approximate aggregates from persisted stratified samples.
+
+Every (run_id, model_id) pair is a stratum. result_samples keeps a uniform
+reservoir sample of up to SAMPLE_SIZE results per stratum and
+result_sample_strata records each stratum's population and the highest results
+rowid folded in. Refreshing only reads results written since the last refresh,
+and estimates only read the samples, so exploratory views cost the same no
+matter how large results grows.
+"""
+
+import math
+import random
+import threading
+
+from queries import EXACT_SUCCESS_BY_RUN_MODEL_QUERY, SAMPLED_SUCCESS_BY_RUN_MODEL_QUERY
+
+# Results kept per (run_id, model_id). At 400 the 95% margin on a success rate is at most ~5 points.
+SAMPLE_SIZE = 400
+
+# z-score for the 95% error bars
+Z_95 = 1.96
+
+SAMPLE_COLUMNS = ['succeeded', 'error_enum', 'cost_usd', 'time_round_trip_ms']
+
+# Every Streamlit session runs on its own thread over the one cached connection. Held around a
+# refresh and the reads that follow it; it lives here because page scripts are re-executed on every rerun.
+REFRESH_LOCK = threading.Lock()
+
+NEW_RESULTS_QUERY = """
+SELECT rowid, run_id, model_id, succeeded, error_enum, cost_usd, time_round_trip_ms
+FROM results
+WHERE rowid > ?
+ORDER BY rowid
+LIMIT ?
+"""
+
+def sampled_up_to(conn):
+    """Highest results rowid already folded into the samples"""
+    return conn.execute("SELECT COALESCE(MAX(max_rowid), 0) FROM result_sample_strata").fetchone()[0]
+
+def latest_result_rowid(conn):
+    return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM results").fetchone()[0]
+
+def _load_stratum(conn, run_id, model_id):
+    population, max_rowid = conn.execute(
+        "SELECT population, max_rowid FROM result_sample_strata WHERE run_id = ? AND model_id = ?",
+        (run_id, model_id)
+    ).fetchone() or (0, 0)
+    sample = conn.execute(
+        f"SELECT result_rowid, {', '.join(SAMPLE_COLUMNS)} FROM result_samples WHERE run_id = ? AND model_id = ?",
+        (run_id, model_id)
+    ).fetchall()
+    return {'population': population, 'max_rowid': max_rowid, 'sample': [tuple(row) for row in sample]}
+
+def _save_stratum(conn, run_id, model_id, stratum):
+    conn.execute(
+        "INSERT OR REPLACE INTO result_sample_strata (run_id, model_id, population, max_rowid) VALUES (?, ?, ?, ?)",
+        (run_id, model_id, stratum['population'], stratum['max_rowid'])
+    )
+    conn.execute("DELETE FROM result_samples WHERE run_id = ? AND model_id = ?", (run_id, model_id))
+    conn.executemany(
+        f"INSERT INTO result_samples (run_id, model_id, result_rowid, {', '.join(SAMPLE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(run_id, model_id) + row for row in stratum['sample']]
+    )
+
+def refresh_samples(conn, sample_size=SAMPLE_SIZE, batch_size=10000, rebuild=False, rng=None):
+    """
+    Fold results written since the last refresh into the per-stratum reservoirs.
+
+    Uses reservoir sampling (Algorithm R), so each stratum's sample stays uniform
+    over all of its results without rereading old ones. Pass rebuild=True after
+    results have been deleted.
+
+    Returns the number of new results read.
+    """
+    rng = rng or random.Random()
+    if rebuild:
+        with conn:
+            conn.execute("DELETE FROM result_samples")
+            conn.execute("DELETE FROM result_sample_strata")
+
+    last_rowid = sampled_up_to(conn)
+    if latest_result_rowid(conn) <= last_rowid:
+        return 0
+
+    strata = {}
+    read = 0
+    while True:
+        rows = conn.execute(NEW_RESULTS_QUERY, (last_rowid, batch_size)).fetchall()
+        for rowid, run_id, model_id, *values in rows:
+            key = (run_id, model_id)
+            stratum = strata.get(key)
+            if stratum is None:
+                stratum = strata[key] = _load_stratum(conn, run_id, model_id)
+
+            stratum['population'] += 1
+            stratum['max_rowid'] = max(stratum['max_rowid'], rowid)
+            sample_row = (rowid, *values)
+            if len(stratum['sample']) < sample_size:
+                stratum['sample'].append(sample_row)
+            else:
+                slot = rng.randrange(stratum['population'])
+                if slot < sample_size:
+                    stratum['sample'][slot] = sample_row
+        read += len(rows)
+        if rows:
+            last_rowid = rows[-1][0]
+        if len(rows) < batch_size:
+            break
+
+    with conn:
+        for (run_id, model_id), stratum in strata.items():
+            _save_stratum(conn, run_id, model_id, stratum)
+    return read
+
+def proportion_margin(successes, n, population, z=Z_95):
+    """
+    Margin of the Wilson score interval, with finite population correction.
+
+    Unlike the normal approximation, the interval does not collapse when every or
+    no sampled result succeeded. It is not centred on the sampled rate, so the
+    margin is the distance from that rate to the farther bound, which keeps
+    rate ± margin covering the whole interval.
+    """
+    if n == 0:
+        return None
+    if population <= 1 or n >= population:
+        return 0.0
+    p = successes / n
+    fpc = (population - n) / (population - 1)
+    # The correction shrinks the variance, i.e. the sample counts as n / fpc results
+    effective_n = n / fpc
+    z2 = z * z / effective_n
+    center = (p + z2 / 2) / (1 + z2)
+    half_width = z / (1 + z2) * math.sqrt(p * (1 - p) / effective_n + z2 / (4 * effective_n))
+    return max(p - (center - half_width), (center + half_width) - p)
+
+def estimate_success_rates(conn):
+    """
+    Estimated success rate on valid results for every (run, model) from the samples.
+
+    Returns a list of dicts with run_id, model_id, success_rate, margin (95% half-width),
+    valid_results (estimated), population, sample_size and exact.
+    """
+    estimates = []
+    for run_id, model_id, population, sample_size, sample_valid, sample_successes in conn.execute(SAMPLED_SUCCESS_BY_RUN_MODEL_QUERY):
+        exact = sample_size >= population
+        # The valid share of the stratum is itself estimated from the sample
+        valid_population = population * sample_valid / sample_size if sample_size else 0
+        estimates.append({
+            'run_id': run_id,
+            'model_id': model_id,
+            'success_rate': sample_successes / sample_valid if sample_valid else None,
+            'margin': proportion_margin(sample_successes, sample_valid, round(valid_population)),
+            'valid_results': valid_population if not exact else sample_valid,
+            'population': population,
+            'sample_size': sample_size,
+            'exact': exact,
+        })
+    return estimates
+
+def exact_success_rates(conn):
+    """Same shape as estimate_success_rates, computed over every result"""
+    return [
+        {
+            'run_id': run_id,
+            'model_id': model_id,
+            'success_rate': success_rate,
+            'margin': 0.0 if success_rate is not None else None,
+            'valid_results': valid_results,
+            'population': population,
+            'sample_size': population,
+            'exact': True,
+        }
+        for run_id, model_id, population, valid_results, success_rate in conn.execute(EXACT_SUCCESS_BY_RUN_MODEL_QUERY)
+    ]
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Tests for the dashboard's database helpers.
+
+These build a scratch database from ../database/schema.sql, so they run without
+Streamlit or an existing evals.db.
+"""
+
+import os
+import json
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path so we can import dashboard modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import migrations
+import queries
+from live import LiveRunAggregator, MODEL_PERFORMANCE_COLUMNS
+from diff_apply import DiffApplyError, apply_diff_06_06_25, apply_diff_exact
+from replay import run_replay
+import sampling
+import trends
+
+SCHEMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'schema.sql'))
+
+# Common table expressions in the dashboard queries; scanning these is expected
+CTE_NAMES = {'case_attempts', 'case_summary'}
+
+
+def create_database(num_runs=4, num_cases=60, models=('model-a', 'model-b', 'model-c')):
+    """Create an in-memory database with the base schema and some synthetic results."""
+    conn = sqlite3.connect(':memory:')
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+
+    for i in range(20):
+        conn.execute("INSERT INTO system_prompts (hash, name, content) VALUES (?, ?, ?)", (f"sp{i}", f"prompt{i}", "prompt"))
+        conn.execute(
+            "INSERT INTO processing_functions (hash, name, parsing_function, diff_edit_function) VALUES (?, ?, ?, ?)",
+            (f"pf{i}", f"funcs{i}", "parse", "diff")
+        )
+
+    for c in range(num_cases):
+        conn.execute("INSERT INTO files (hash, filepath, content) VALUES (?, ?, ?)", (f"file{c}", f"src/file{c}.ts", "x" * 500))
+
+    for r in range(num_runs):
+        run_id = f"run{r}"
+        conn.execute(
+            "INSERT INTO runs (run_id, description, created_at, system_prompt_hash) VALUES (?, ?, ?, ?)",
+            (run_id, f"Run {r}", f"2025-06-{r + 1:02d} 12:00:00", "sp0")
+        )
+        for c in range(num_cases):
+            case_id = f"{run_id}-case{c}"
+            conn.execute(
+                "INSERT INTO cases (case_id, run_id, description, system_prompt_hash, task_id, file_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                (case_id, run_id, f"case {c}", "sp0", f"task{c}", f"file{c}")
+            )
+            for m, model_id in enumerate(models):
+                error_enum = 1 if (c + m) % 7 == 0 else None
+                conn.execute(
+                    """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash,
+                       succeeded, error_enum, cost_usd, time_round_trip_ms, raw_model_output)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (f"{case_id}-{model_id}", run_id, case_id, model_id, "pf0",
+                     (c + m) % 3 != 0, error_enum, 0.001 * (m + 1), 1000 + c * 10, "output" * 100)
+                )
+    conn.commit()
+    return conn
+
+
+def full_scans(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN lines that scan a table without an index."""
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1) not in CTE_NAMES and 'USING' not in detail:
+            scans.append(detail)
+    return scans
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_database()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_apply_migrations_sets_version(self):
+        """Test that migrations are applied once and recorded in user_version."""
+        self.assertEqual(migrations.get_schema_version(self.conn), 0)
+
+        applied = migrations.apply_migrations(self.conn, log=lambda msg: None)
+        self.assertEqual(applied, [m[0] for m in migrations.MIGRATIONS])
+        self.assertEqual(migrations.get_schema_version(self.conn), migrations.LATEST_VERSION)
+
+        # A second run is a no-op
+        self.assertEqual(migrations.apply_migrations(self.conn, log=lambda msg: None), [])
+
+    def test_apply_migrations_runs_analyze(self):
+        """Test that ANALYZE populates planner statistics after migrating."""
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+        stats = self.conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+        self.assertGreater(stats, 0)
+
+    def test_partially_indexed_database(self):
+        """Test that migrations tolerate indexes that already exist."""
+        self.conn.execute("CREATE INDEX idx_results_error_enum ON results(error_enum)")
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+        self.assertEqual(migrations.get_schema_version(self.conn), migrations.LATEST_VERSION)
+
+    def test_dashboard_queries_use_indexes(self):
+        """Test that no dashboard query falls back to a full table scan once migrated."""
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+        for name, sql, params in queries.dashboard_queries():
+            with self.subTest(query=name):
+                self.assertEqual(full_scans(self.conn, sql, params), [])
+
+    def test_unmigrated_database_scans(self):
+        """Sanity check that the base schema does full scans the migrations remove."""
+        scans = []
+        for name, sql, params in queries.dashboard_queries():
+            try:
+                scans.extend(full_scans(self.conn, sql, params))
+            except sqlite3.OperationalError:
+                # Queries over tables that the migrations create
+                continue
+        self.assertTrue(scans)
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_database(num_runs=2, num_cases=10)
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_model_performance_excludes_invalid_results(self):
+        """Test that the per-model aggregate only counts valid attempts."""
+        rows = self.conn.execute(queries.MODEL_PERFORMANCE_QUERY, ["run0"]).fetchall()
+        self.assertEqual(len(rows), 3)
+        invalid = self.conn.execute(
+            "SELECT COUNT(*) FROM results WHERE run_id = 'run0' AND error_enum IN (1, 6, 7)"
+        ).fetchone()[0]
+        self.assertEqual(sum(row[1] for row in rows), 30 - invalid)
+
+    def test_detailed_results_parameters(self):
+        """Test that drill-down filters are passed as parameters rather than interpolated."""
+        sql, params = queries.build_detailed_results_query("run0", "model-a' OR '1'='1")
+        self.assertEqual(self.conn.execute(sql, params).fetchall(), [])
+
+        sql, params = queries.build_detailed_results_query("run0", "model-a")
+        self.assertEqual(len(self.conn.execute(sql, params).fetchall()), 10)
+
+
+class TestLiveRunAggregator(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_database(num_runs=2, num_cases=30)
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def assert_matches_exact(self, aggregator, run_id):
+        exact = self.conn.execute(queries.MODEL_PERFORMANCE_QUERY, [run_id]).fetchall()
+        live = [tuple(record[column] for column in MODEL_PERFORMANCE_COLUMNS) for record in aggregator.to_records()]
+        self.assertEqual(len(live), len(exact))
+        for live_row, exact_row in zip(live, exact):
+            self.assertEqual(live_row[0], exact_row[0])
+            for live_value, exact_value in zip(live_row[1:], exact_row[1:]):
+                if exact_value is None:
+                    self.assertIsNone(live_value)
+                else:
+                    self.assertAlmostEqual(live_value, exact_value)
+
+    def test_poll_matches_exact_aggregates(self):
+        """Test that the live aggregates equal the SQL aggregates for the same run."""
+        aggregator = LiveRunAggregator("run1", batch_size=7)
+        self.assertEqual(aggregator.poll(self.conn), 90)
+        self.assert_matches_exact(aggregator, "run1")
+
+    def test_poll_reads_only_new_results(self):
+        """Test that a second poll only folds in rows written after the first one."""
+        aggregator = LiveRunAggregator("run1")
+        aggregator.poll(self.conn)
+        self.assertEqual(aggregator.poll(self.conn), 0)
+
+        self.conn.execute("INSERT INTO cases (case_id, run_id, description, system_prompt_hash, task_id) VALUES ('late', 'run1', 'late', 'sp0', 'late')")
+        self.conn.execute(
+            """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash, succeeded, time_round_trip_ms)
+               VALUES ('late-result', 'run1', 'late', 'model-a', 'pf0', 1, 50)"""
+        )
+        self.conn.execute(
+            """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash, succeeded, error_enum)
+               VALUES ('late-invalid', 'run1', 'late', 'model-b', 'pf0', 0, 7)"""
+        )
+        self.conn.commit()
+
+        self.assertEqual(aggregator.poll(self.conn), 2)
+        self.assertEqual(aggregator.results_seen, 92)
+        self.assert_matches_exact(aggregator, "run1")
+
+
+def make_diff(search, replace):
+    return f"------- SEARCH\n{search}=======\n{replace}+++++++ REPLACE"
+
+
+class TestDiffApply(unittest.TestCase):
+    original = "def add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b\n"
+
+    def test_exact_match(self):
+        """Test that an exact SEARCH block is replaced in place."""
+        diff = make_diff("    return a + b\n", "    return b + a\n")
+        self.assertEqual(apply_diff_exact(diff, self.original), self.original.replace("a + b", "b + a"))
+
+    def test_line_trimmed_fallback(self):
+        """Test that whitespace differences fall back to line-trimmed matching."""
+        diff = make_diff("  return a - b  \n", "    return b - a\n")
+        self.assertEqual(apply_diff_06_06_25(diff, self.original), self.original.replace("a - b", "b - a"))
+        with self.assertRaises(DiffApplyError):
+            apply_diff_exact(diff, self.original)
+
+    def test_block_anchor_fallback(self):
+        """Test that 3+ line blocks match on their first and last lines."""
+        diff = make_diff("def add(a, b):\n    return a+b  # differs\n\n", "def add(a, b):\n    return sum((a, b))\n\n")
+        self.assertEqual(
+            apply_diff_06_06_25(diff, self.original),
+            "def add(a, b):\n    return sum((a, b))\n\ndef sub(a, b):\n    return a - b\n"
+        )
+
+    def test_no_match(self):
+        """Test that an unmatched SEARCH block raises."""
+        with self.assertRaises(DiffApplyError):
+            apply_diff_06_06_25(make_diff("missing()\n", "found()\n"), self.original)
+
+    def test_empty_search_replaces_file(self):
+        """Test that an empty SEARCH block replaces the whole file."""
+        self.assertEqual(apply_diff_06_06_25(make_diff("", "new\n"), self.original), "new\n")
+
+
+class TestReplay(unittest.TestCase):
+    original = "line one\nline two\nline three\n"
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.conn = create_database(num_runs=1, num_cases=0)
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+        self.conn.execute("INSERT INTO files (hash, filepath, content) VALUES ('orig', 'a.txt', ?)", (self.original,))
+        self.conn.execute(
+            "INSERT INTO cases (case_id, run_id, description, system_prompt_hash, task_id, file_hash) VALUES ('c', 'run0', 'd', 'sp0', 't', 'orig')"
+        )
+        diffs = [
+            ("ok", make_diff("line two\n", "line 2\n"), True, None),
+            ("trimmed", make_diff("  line three\n", "line 3\n"), True, None),
+            ("bad", make_diff("line four\n", "line 4\n"), False, 3),
+            ("wrong-flag", make_diff("line one\n", "line 1\n"), False, 3),
+            ("invalid", make_diff("line one\n", "line 1\n"), False, 1),
+        ]
+        for result_id, diff, succeeded, error_enum in diffs:
+            self.conn.execute("INSERT INTO files (hash, filepath, content) VALUES (?, ?, ?)", (f"diff-{result_id}", "diff", diff))
+            tool_calls = json.dumps([{"name": "replace_in_file", "input": {"path": "a.txt", "diff": diff}}])
+            self.conn.execute(
+                """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash, succeeded,
+                   error_enum, file_edited_hash, parsed_tool_call_json) VALUES (?, 'run0', 'c', 'model-a', 'pf0', ?, ?, ?, ?)""",
+                (result_id, succeeded, error_enum, f"diff-{result_id}", tool_calls)
+            )
+        self.conn.commit()
+        self.checkpoint_path = os.path.join(self.temp_dir.name, 'checkpoint.json')
+
+    def tearDown(self):
+        self.conn.close()
+        self.temp_dir.cleanup()
+
+    def test_replay_reports_mismatches(self):
+        """Test that replay flags results whose stored outcome disagrees with the re-applied diff."""
+        report = run_replay(self.conn, "run0", workers=2, batch_size=2, checkpoint_path=self.checkpoint_path, log=lambda msg: None)
+        self.assertEqual(report['counts']['match'], 3)
+        self.assertEqual(report['counts']['mismatch'], 1)
+        self.assertEqual(report['counts']['newly_succeeded'], 1)
+        self.assertEqual([m['result_id'] for m in report['mismatches']], ['wrong-flag'])
+        self.assertTrue(os.path.exists(self.checkpoint_path))
+
+    def test_replay_with_other_strategy(self):
+        """Test that re-scoring with exact matching fails the whitespace-tolerant result."""
+        report = run_replay(self.conn, "run0", strategy="exact", workers=1, log=lambda msg: None)
+        self.assertEqual(report['counts']['newly_failed'], 1)
+
+    def test_replay_resumes_from_checkpoint(self):
+        """Test that a second replay with the same checkpoint does no more work."""
+        run_replay(self.conn, "run0", workers=1, checkpoint_path=self.checkpoint_path, log=lambda msg: None)
+        messages = []
+        report = run_replay(self.conn, "run0", workers=1, checkpoint_path=self.checkpoint_path, log=messages.append)
+        self.assertTrue(messages[0].startswith("Resuming"))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(report['counts']['match'] + report['counts']['mismatch'], 4)
+
+
+class TestSampling(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_database(num_runs=3, num_cases=120)
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_small_strata_are_exact(self):
+        """Test that strata smaller than the sample size reproduce the exact rates."""
+        sampling.refresh_samples(self.conn, sample_size=500)
+        exact = {(r['run_id'], r['model_id']): r for r in sampling.exact_success_rates(self.conn)}
+        estimates = sampling.estimate_success_rates(self.conn)
+        self.assertEqual(len(estimates), 9)
+        for estimate in estimates:
+            self.assertTrue(estimate['exact'])
+            self.assertEqual(estimate['margin'], 0.0)
+            self.assertAlmostEqual(estimate['success_rate'], exact[(estimate['run_id'], estimate['model_id'])]['success_rate'])
+
+    def test_estimates_have_error_bars(self):
+        """Test that sampled estimates carry a margin that covers the exact rate."""
+        sampling.refresh_samples(self.conn, sample_size=60, rng=random.Random(1))
+        exact = {(r['run_id'], r['model_id']): r for r in sampling.exact_success_rates(self.conn)}
+        for estimate in sampling.estimate_success_rates(self.conn):
+            self.assertFalse(estimate['exact'])
+            self.assertEqual(estimate['sample_size'], 60)
+            self.assertEqual(estimate['population'], 120)
+            self.assertGreater(estimate['margin'], 0)
+            # Generous bound so the test is not flaky: twice the 95% half-width
+            truth = exact[(estimate['run_id'], estimate['model_id'])]['success_rate']
+            self.assertLessEqual(abs(estimate['success_rate'] - truth), 2 * estimate['margin'])
+
+    def test_margin_of_unanimous_sample_is_not_zero(self):
+        """Test that a sample where every or no result succeeded still gets an interval."""
+        for successes in (0, 50):
+            margin = sampling.proportion_margin(successes, 50, 200)
+            self.assertGreater(margin, 0)
+            self.assertLess(margin, 0.1)
+        self.assertAlmostEqual(sampling.proportion_margin(0, 50, 200), sampling.proportion_margin(50, 50, 200))
+        # The correction still narrows it as the sample approaches the population
+        self.assertLess(sampling.proportion_margin(0, 50, 60), sampling.proportion_margin(0, 50, 200))
+        self.assertEqual(sampling.proportion_margin(0, 50, 50), 0.0)
+
+    def test_refresh_is_incremental(self):
+        """Test that a refresh only reads results added since the previous one."""
+        self.assertEqual(sampling.refresh_samples(self.conn, sample_size=60), 1080)
+        self.assertEqual(sampling.refresh_samples(self.conn, sample_size=60), 0)
+
+        self.conn.execute(
+            """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash, succeeded)
+               VALUES ('late', 'run0', 'run0-case0', 'model-new', 'pf0', 1)"""
+        )
+        self.conn.commit()
+        self.assertEqual(sampling.refresh_samples(self.conn, sample_size=60), 1)
+        cells = {(e['run_id'], e['model_id']): e for e in sampling.estimate_success_rates(self.conn)}
+        self.assertEqual(cells[('run0', 'model-new')]['success_rate'], 1.0)
+        self.assertEqual(cells[('run0', 'model-a')]['population'], 120)
+
+
+class TestTrends(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_database()
+        migrations.apply_migrations(self.conn, log=lambda msg: None)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_summaries_match_model_performance(self):
+        """Test that run summaries agree with the per-run model performance query."""
+        self.assertEqual(trends.refresh_run_summaries(self.conn), ['run0', 'run1', 'run2', 'run3'])
+        exact = {
+            row[0]: row for row in self.conn.execute(queries.MODEL_PERFORMANCE_QUERY, ('run2',))
+        }
+        for row in trends.load_model_trend(self.conn, 'model-b'):
+            self.assertEqual(row['total_results'], 60)
+            if row['run_id'] == 'run2':
+                # The performance query counts valid results only
+                self.assertEqual(row['valid_results'], exact['model-b'][1])
+                self.assertAlmostEqual(row['success_rate'], exact['model-b'][2])
+                self.assertAlmostEqual(row['avg_cost'], exact['model-b'][3])
+        run_dates = [row['run_created_at'] for row in trends.load_model_trend(self.conn, 'model-b')]
+        self.assertEqual(run_dates, sorted(run_dates))
+
+    def test_refresh_only_resummarizes_changed_runs(self):
+        """Test that a refresh skips runs whose results have not changed."""
+        trends.refresh_run_summaries(self.conn)
+        self.assertEqual(trends.refresh_run_summaries(self.conn), [])
+
+        self.conn.execute(
+            """INSERT INTO results (result_id, run_id, case_id, model_id, processing_functions_hash, succeeded)
+               VALUES ('late', 'run1', 'run1-case0', 'model-new', 'pf0', 1)"""
+        )
+        self.conn.commit()
+        self.assertEqual(trends.refresh_run_summaries(self.conn), ['run1'])
+        self.assertIn('model-new', trends.load_summary_models(self.conn))
+
+    def test_lttb(self):
+        """Test that LTTB keeps the end points and returns the requested number of points."""
+        xs = list(range(1000))
+        ys = [(x % 50) * (-1) ** (x // 50) for x in xs]
+        indexes = trends.lttb(xs, ys, 40)
+        self.assertEqual(len(indexes), 40)
+        self.assertEqual((indexes[0], indexes[-1]), (0, 999))
+        self.assertEqual(indexes, sorted(set(indexes)))
+        self.assertEqual(trends.lttb(xs[:10], ys[:10], 40), list(range(10)))
+
+    def test_bucket_means_pools_weights(self):
+        """Test that bucketed means weight each point and drop empty buckets."""
+        xs, ys, counts = trends.bucket_means([0, 1, 2, 10], [1.0, 1.0, 0.0, 0.5], 2, weights=[1, 3, 4, 2])
+        self.assertEqual(xs, [1.0, 10.0])
+        self.assertAlmostEqual(ys[0], 0.5)
+        self.assertEqual(ys[1], 0.5)
+        self.assertEqual(counts, [3, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
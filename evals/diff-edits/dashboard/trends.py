@@ -0,0 +1,158 @@
+"""
+Cross-run trends served from the compact run_summaries table.
+
+run_summaries holds one row per (run, model) with counts, cost and latency
+percentiles. Summaries are rebuilt only for runs whose newest result rowid has
+moved, so charting hundreds of runs reads a few hundred summary rows rather
+than every result. The series are then downsampled server-side (LTTB or
+bucketed means) so only a bounded number of points reach plotly.
+"""
+
+from live import INVALID_ERROR_ENUMS
+from queries import (
+    RUN_LATEST_ROWID_QUERY, RUN_SUMMARY_WATERMARKS_QUERY, RUN_SUMMARY_SOURCE_QUERY,
+    SUMMARY_MODELS_QUERY, MODEL_TREND_QUERY
+)
+
+TREND_COLUMNS = [
+    'run_id', 'run_created_at', 'total_results', 'valid_results', 'success_rate', 'total_cost',
+    'avg_cost', 'p50_round_trip_ms', 'p90_round_trip_ms', 'p99_round_trip_ms'
+]
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list (numpy's default method)"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize_run(conn, run_id, run_created_at, max_rowid):
+    """Replace the run_summaries rows for one run"""
+    models = {}
+    for model_id, succeeded, error_enum, cost_usd, round_trip_ms in conn.execute(RUN_SUMMARY_SOURCE_QUERY, (run_id,)):
+        model = models.setdefault(model_id, {'total': 0, 'valid': 0, 'successes': 0, 'costs': [], 'latencies': []})
+        model['total'] += 1
+        if error_enum in INVALID_ERROR_ENUMS:
+            continue
+        model['valid'] += 1
+        if succeeded:
+            model['successes'] += 1
+        if cost_usd is not None:
+            model['costs'].append(cost_usd)
+        if round_trip_ms is not None:
+            model['latencies'].append(round_trip_ms)
+
+    rows = []
+    for model_id, model in models.items():
+        latencies = sorted(model['latencies'])
+        costs = model['costs']
+        rows.append((
+            run_id, model_id, run_created_at, model['total'], model['valid'], model['successes'],
+            sum(costs) if costs else None,
+            sum(costs) / len(costs) if costs else None,
+            percentile(latencies, 0.5), percentile(latencies, 0.9), percentile(latencies, 0.99),
+            max_rowid,
+        ))
+
+    with conn:
+        conn.execute("DELETE FROM run_summaries WHERE run_id = ?", (run_id,))
+        conn.executemany(
+            """INSERT INTO run_summaries (
+                run_id, model_id, run_created_at, total_results, valid_results, successes, total_cost,
+                avg_cost, p50_round_trip_ms, p90_round_trip_ms, p99_round_trip_ms, max_rowid
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+
+def refresh_run_summaries(conn):
+    """
+    Summarize runs that are new or have results newer than their summary.
+
+    Returns the list of run_ids that were (re)summarized.
+    """
+    watermarks = dict(conn.execute(RUN_SUMMARY_WATERMARKS_QUERY).fetchall())
+    refreshed = []
+    for run_id, created_at in conn.execute("SELECT run_id, created_at FROM runs").fetchall():
+        latest = conn.execute(RUN_LATEST_ROWID_QUERY, (run_id,)).fetchone()[0]
+        if latest is None or watermarks.get(run_id) == latest:
+            continue
+        summarize_run(conn, run_id, created_at, latest)
+        refreshed.append(run_id)
+    return refreshed
+
+def load_summary_models(conn):
+    return [row[0] for row in conn.execute(SUMMARY_MODELS_QUERY)]
+
+def load_model_trend(conn, model_id):
+    """Per-run summary rows for one model, oldest first, as dicts keyed by TREND_COLUMNS"""
+    return [dict(zip(TREND_COLUMNS, row)) for row in conn.execute(MODEL_TREND_QUERY, (model_id,))]
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indexes of at most `threshold` points that preserve the visual
+    shape of the series, always including the first and last point.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third vertex of the triangle; for the last bucket that is the last point
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best_index, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs(
+                (xs[previous] - avg_x) * (ys[i] - ys[previous])
+                - (xs[previous] - xs[i]) * (avg_y - ys[previous])
+            )
+            if area > best_area:
+                best_index, best_area = i, area
+        selected.append(best_index)
+        previous = best_index
+
+    selected.append(n - 1)
+    return selected
+
+def bucket_means(xs, ys, max_points, weights=None):
+    """
+    Split the x range into max_points equal-width buckets and average each one.
+
+    Returns (bucket_xs, bucket_ys, bucket_counts); empty buckets are dropped.
+    Weights (e.g. valid result counts for success rates) make each mean a pooled rate.
+    """
+    if not xs:
+        return [], [], []
+    weights = weights or [1] * len(xs)
+    x_min, x_max = min(xs), max(xs)
+    width = (x_max - x_min) / max_points or 1
+    buckets = {}
+    for x, y, w in zip(xs, ys, weights):
+        index = min(int((x - x_min) / width), max_points - 1)
+        bucket = buckets.setdefault(index, [0.0, 0.0, 0.0, 0])
+        bucket[0] += x
+        bucket[1] += y * w
+        bucket[2] += w
+        bucket[3] += 1
+    out_xs, out_ys, counts = [], [], []
+    for index in sorted(buckets):
+        sum_x, weighted_y, total_weight, count = buckets[index]
+        out_xs.append(sum_x / count)
+        out_ys.append(weighted_y / total_weight if total_weight else None)
+        counts.append(count)
+    return out_xs, out_ys, counts
@@ -2,6 +2,7 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import os
+from migrations import apply_migrations
 
 @st.cache_resource
 def get_database_connection():
@@ -15,7 +16,14 @@ def get_database_connection():
     if not os.path.exists(db_path):
         st.error(f"Database not found. Expected at: {os.path.abspath(db_path)}")
         st.stop()
-    return sqlite3.connect(db_path, check_same_thread=False)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    # Bring older databases up to the current index set before any dashboard query runs
+    try:
+        apply_migrations(conn)
+    except sqlite3.OperationalError as e:
+        # e.g. the database is locked by a running eval; the dashboard still works without the indexes
+        st.warning(f"Could not apply database index migrations: {e}")
+    return conn
 
 def guess_language_from_filepath(filepath):
     """Guess the language for syntax highlighting from filepath."""
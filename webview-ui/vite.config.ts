@@ -37,6 +37,8 @@ export default defineConfig({
 		coverage: {
 			provider: "v8",
 			reportOnFailure: true,
+			// text for the console, json-summary and json for .github/scripts/coverage_check
+			reporter: ["text", "html", "json-summary", "json"],
 		},
 	},
 	build: {